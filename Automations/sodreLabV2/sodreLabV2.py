@@ -21,6 +21,10 @@ import schedule
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
+import hashlib
+import numbers
+import pyarrow as pa
+import pyarrow.parquet as pq
 # Nota: Não é mais necessário carregar variáveis de ambiente, pois a API do Sodre é pública
 
 def detectar_maquina():
@@ -805,6 +809,15 @@ MUNICIPIOS_POR_ESTADO = {
     ]
 }
 
+# Abas do relatório global publicadas também em Parquet (aba -> sufixo do arquivo).
+# Este bloco e publicar_sidecars_parquet são iguais nos três scrapers de propósito:
+# cada um é implantado sozinho, sem importar módulos do dashboard. Manter em
+# sincronia entre eles e com ABAS_RELATORIO em match_concorrentes.py.
+SIDECARS_PARQUET = {
+    'Dados Completos': 'dados_completos',
+    'EntradaSaida': 'entrada_saida',
+}
+
 class LabScraperV2:
     """Classe para fazer scraping dos dados de laboratórios do Sodre"""
     
@@ -2130,6 +2143,64 @@ class LabScraperV2:
         wb.save(self.global_report_file)
         logging.info(f"Relatório global atualizado: {self.global_report_file}")
     
+    def publicar_sidecars_parquet(self) -> List[str]:
+        """
+        Publica as abas consumidas pelo dashboard ('Dados Completos' e 'EntradaSaida')
+        como arquivos Parquet ao lado do relatório global, já com CNPJ_Normalizado.
+
+        Cada sidecar grava no metadado 'fonte_sha256' o hash do .xlsx de origem; o
+        dashboard só usa o sidecar quando esse hash confere com o Excel baixado e,
+        caso contrário, continua lendo o Excel.
+
+        Returns:
+            Lista com os caminhos dos sidecars gravados
+        """
+        if not os.path.exists(self.global_report_file):
+            return []
+
+        with open(self.global_report_file, 'rb') as f:
+            fonte_sha256 = hashlib.sha256(f.read()).hexdigest()
+
+        base = os.path.splitext(self.global_report_file)[0]
+        with pd.ExcelFile(self.global_report_file, engine='openpyxl') as xls:
+            abas = [aba for aba in SIDECARS_PARQUET if aba in xls.sheet_names]
+            dados = {aba: xls.parse(aba) for aba in abas}
+
+        publicados = []
+        for aba, df in dados.items():
+            # Mesma normalização que o dashboard aplica ao ler o Excel
+            # (normalizar_cnpjs com vazio_se_zerado=True): CNPJ lido como número não
+            # leva o '.0' e vazio ou só zeros vira ''
+            coluna_cnpj = next((c for c in df.columns if str(c).upper() == 'CNPJ'), None)
+            if coluna_cnpj:
+                texto = df[coluna_cnpj].map(
+                    lambda v: '' if pd.isna(v) else str(int(v)) if isinstance(v, numbers.Real) and not isinstance(v, bool) else str(v)
+                ).astype(str)
+                cnpjs = texto.str.replace(r'\D', '', regex=True).str.zfill(14).str[-14:]
+                df['CNPJ_Normalizado'] = cnpjs.where(cnpjs != '00000000000000', '')
+
+            # Colunas texto com tipos misturados (ex.: telefone numérico e texto) viram str
+            for col in df.columns[df.dtypes == object]:
+                try:
+                    pa.array(df[col], from_pandas=True)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+            tabela = pa.Table.from_pandas(df, preserve_index=False)
+            tabela = tabela.replace_schema_metadata({
+                **(tabela.schema.metadata or {}),
+                b'fonte_sha256': fonte_sha256.encode(),
+                b'aba': aba.encode('utf-8'),
+            })
+            destino = f"{base}_{SIDECARS_PARQUET[aba]}.parquet"
+            tmp = f"{destino}.tmp"
+            pq.write_table(tabela, tmp)
+            os.replace(tmp, destino)
+            publicados.append(destino)
+
+        logging.info(f"Sidecars Parquet publicados: {', '.join(os.path.basename(p) for p in publicados)}")
+        return publicados
+
     def verificar_churn_processado(self, data_str: str) -> bool:
         """
         Verifica se o churn já foi processado para uma determinada data
@@ -2350,6 +2421,16 @@ class LabScraperV2:
             pipeline_sucesso = False
             erros_pipeline.append(f"Resumo Credenciamentos: {e}")
         
+        # Sidecars Parquet para o dashboard (falha aqui não invalida o pipeline:
+        # sem sidecar válido o dashboard simplesmente lê o Excel)
+        print("📦 Publicando sidecars Parquet para o dashboard...")
+        try:
+            publicados = self.publicar_sidecars_parquet()
+            print(f"   ✓ {len(publicados)} sidecar(s) publicado(s)\n")
+        except Exception as e:
+            print(f"   ⚠️  Erro ao publicar sidecars Parquet: {e}\n")
+            logging.error(f"Erro ao publicar sidecars Parquet: {e}")
+        
         # ====== ETAPA 5: MARCAR PIPELINE COMO COMPLETO (APENAS SE SUCESSO) ======
         if pipeline_sucesso:
             self.marcar_pipeline_completo(today)
@@ -2451,6 +2532,13 @@ def main():
             # Gerar resumo de credenciamentos
             scraper.gerar_resumo_credenciamentos()
             print("Resumo de credenciamentos gerado com sucesso!")
+            
+            # Publicar sidecars Parquet lidos pelo dashboard
+            try:
+                scraper.publicar_sidecars_parquet()
+                print("Sidecars Parquet publicados com sucesso!")
+            except Exception as e:
+                logging.warning(f"Não foi possível publicar sidecars Parquet: {e}")
         else:
             print(f"Arquivo não encontrado: {daily_file}")
             print("Execute o script normalmente para coletar os dados primeiro.")
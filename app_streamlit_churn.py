@@ -13,19 +13,34 @@ import os
 import time
 import json
 import logging
-from typing import Optional, List, Dict, Any, Tuple
+import hashlib
+import copy
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, List, Dict, Any, Tuple, Callable
+from collections import OrderedDict
 from io import BytesIO
 from dataclasses import dataclass
 from urllib.parse import quote_plus
 import warnings
 import html as html_utils
 warnings.filterwarnings('ignore')
+# Copy-on-Write: o dataset preparado é um único objeto compartilhado entre sessões
+# (AtualizadorDataset); recortes e cópias rasas derivadas dele só copiam os blocos
+# efetivamente alterados, então nenhuma sessão consegue modificar o original
+pd.set_option('mode.copy_on_write', True)
 
 # Configurar logger
 logger = logging.getLogger(__name__)
 # Importar configurações
 from config_churn import *
-from pandas.tseries.offsets import BDay
+from match_concorrentes import construir_tabela_match, hash_arquivo, obter_tabela_match
+from dataset_preparado import RiskEngine, carregar_dataset_preparado, data_referencia, preparar_dataset
+from normalizacao import (
+    normalizar_cnpj, normalizar_cnpjs, normalizar_nome, normalizar_nomes, normalizar_termo, normalizar_termos,
+    somente_digitos, somente_digitos_serie
+)
 # Importar sistema de autenticação Microsoft
 from auth_microsoft import MicrosoftAuth, AuthManager, create_login_page, create_user_header
 
@@ -186,6 +201,18 @@ WORDING_V2 = {
 # ============================================
 # FUNÇÕES DE INTEGRAÇÃO SHAREPOINT/ONEDRIVE
 # ============================================
+_REMOTO_AUTOMATIONS = "/personal/washington_gouvea_synvia_com_/Documents/Data Analysis/Churn PCLs/Automations"
+REMOTO_EXCEL_GRALAB = f"{_REMOTO_AUTOMATIONS}/cunha/relatorio_completo_laboratorios_gralab.xlsx"
+REMOTO_EXCEL_SODRE = f"{_REMOTO_AUTOMATIONS}/sodre/relatorio_completo_laboratorios_sodre.xlsx"
+REMOTO_EXCEL_DB = f"{_REMOTO_AUTOMATIONS}/db/relatorio_completo_laboratorios_db.xlsx"
+# Abas dos relatórios dos concorrentes lidas pelo dashboard (aba -> sufixo do sidecar
+# Parquet que os scrapers publicam ao lado do .xlsx)
+ABAS_CONCORRENTE = {
+    'Dados Completos': 'dados_completos',
+    'EntradaSaida': 'entrada_saida',
+}
+REMOTO_MATRIZ_CS = f"Data Analysis/Churn PCLs/{VIP_CSV_FILE}"
+REMOTO_LABORATORIES = f"Data Analysis/Churn PCLs/{LABORATORIES_FILE}"
 def _get_graph_config() -> Optional[Dict[str, Any]]:
     """Extrai configurações do Graph API dos secrets do Streamlit."""
     try:
@@ -224,6 +251,104 @@ def _is_valid_parquet(path: str) -> bool:
         return len(df.columns) > 0
     except:
         return False
+def _artefatos_dashboard(cfg: Dict[str, Any]) -> List[str]:
+    """Caminhos remotos de todos os artefatos consumidos pelo dashboard."""
+    arquivo_churn = cfg.get("arquivo") or "Data Analysis/Churn PCLs/churn_analysis_latest.csv"
+    remote_dir = os.path.dirname(arquivo_churn)
+    remote_meta = f"{remote_dir}/fechamentos_meta.json" if remote_dir else "fechamentos_meta.json"
+    remote_preparado = f"{remote_dir}/{DATASET_PREPARADO_FILE}" if remote_dir else DATASET_PREPARADO_FILE
+    try:
+        arquivo_prices = st.secrets.get('files', {}).get('prices', PRICES_REMOTE_PATH)
+    except Exception:
+        arquivo_prices = PRICES_REMOTE_PATH
+    return [
+        p.replace("\\", "/") for p in [
+            arquivo_churn,
+            remote_meta,
+            remote_preparado,
+            REMOTO_MATRIZ_CS,
+            REMOTO_LABORATORIES,
+            arquivo_prices,
+            REMOTO_EXCEL_GRALAB,
+            REMOTO_EXCEL_SODRE,
+            REMOTO_EXCEL_DB,
+            *_remotos_sidecar(REMOTO_EXCEL_GRALAB).values(),
+            *_remotos_sidecar(REMOTO_EXCEL_SODRE).values(),
+            *_remotos_sidecar(REMOTO_EXCEL_DB).values(),
+        ]
+    ]
+
+
+def _remotos_sidecar(remoto_excel: str) -> Dict[str, str]:
+    """Aba -> caminho remoto do sidecar Parquet publicado ao lado do Excel do concorrente."""
+    base = os.path.splitext(remoto_excel)[0]
+    return {aba: f"{base}_{sufixo}.parquet" for aba, sufixo in ABAS_CONCORRENTE.items()}
+
+
+def _gravar_local_se_mudou(local_path: str, content: bytes) -> None:
+    """Grava o arquivo local só quando o conteúdo mudou; senão apenas renova o mtime."""
+    if os.path.exists(local_path) and os.path.getsize(local_path) == len(content):
+        with open(local_path, "rb") as f:
+            if f.read() == content:
+                os.utime(local_path, None)
+                return
+    tmp_path = f"{local_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, local_path)
+
+
+def versao_dataset() -> str:
+    """
+    Identificador da versão do dataset preparado: hash do conteúdo dos arquivos que
+    alimentam preparar_dados (tabela de churn, matriz VIP e preços) e do dia útil de
+    referência da régua de risco (Vol_Hoje, MMs, Delta_* e Risco_Diario mudam com ele
+    mesmo sem arquivo novo).
+    """
+    cfg = _get_graph_config() or {}
+    arquivo_churn = os.path.basename(cfg.get("arquivo") or "") or "churn_analysis_latest.csv"
+    arquivos = [arquivo_churn, "churn_analysis_latest.csv", CHURN_ANALYSIS_FILE, VIP_CSV_FILE, PRICES_FILE]
+    partes = []
+    for nome in dict.fromkeys(arquivos):
+        partes.append(f"{nome}:{hash_arquivo(os.path.join(OUTPUT_DIR, nome)) or '-'}")
+    partes.append(f"data_referencia:{data_referencia()}")
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()[:16]
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def sincronizar_artefatos_sharepoint() -> Dict[str, str]:
+    """
+    Sincroniza todos os artefatos do dashboard em ~2 round trips: um $batch de
+    metadados e downloads paralelos apenas dos arquivos cujo cTag/eTag mudou.
+
+    Os arquivos ficam em OUTPUT_DIR com mtime renovado, de modo que os
+    baixar_* subsequentes são atendidos localmente dentro do CACHE_TTL.
+
+    Returns:
+        Dicionário caminho remoto -> caminho local dos artefatos sincronizados
+    """
+    cfg = _get_graph_config()
+    if not cfg or not (cfg.get("tenant_id") and cfg.get("client_id") and cfg.get("client_secret")):
+        return {}
+    try:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        from churn_sp_connector import obter_connector
+
+        connector = obter_connector(st.secrets)
+        conteudos = connector.download_lote(_artefatos_dashboard(cfg))
+        sincronizados = {}
+        for remoto, content in conteudos.items():
+            if content is None:
+                continue
+            local_path = os.path.join(OUTPUT_DIR, os.path.basename(remoto))
+            _gravar_local_se_mudou(local_path, content)
+            sincronizados[remoto] = local_path
+        return sincronizados
+    except Exception as e:
+        logger.warning(f"Falha na sincronização em lote do SharePoint: {e}")
+        return {}
+
+
 def should_download_sharepoint(arquivo_remoto: str = None, force: bool = False) -> bool:
     """Verifica se deve baixar arquivo do SharePoint."""
     if force:
@@ -281,17 +406,17 @@ def baixar_sharepoint(arquivo_remoto: str = None, force: bool = False) -> Option
     try:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
      
-        # Usar ChurnSPConnector
-        from churn_sp_connector import ChurnSPConnector
+        # Usar ChurnSPConnector (instância compartilhada do processo)
+        from churn_sp_connector import obter_connector
      
-        connector = ChurnSPConnector(config=st.secrets)
+        connector = obter_connector(st.secrets)
      
         # Determinar arquivo remoto
         if arquivo_remoto is None:
             arquivo_remoto = cfg.get("arquivo", "Data Analysis/Churn PCLs/churn_analysis_latest.csv")
      
-        # Baixar arquivo
-        content = connector.download(arquivo_remoto)
+        # Baixar arquivo (corpo só é transferido se o cTag/eTag mudou)
+        content = connector.download_cached(arquivo_remoto)
      
         # Salvar localmente
         base_name = os.path.basename(arquivo_remoto)
@@ -327,8 +452,8 @@ def baixar_excel_gralab(force: bool = False) -> Optional[str]:
     Returns:
         Caminho local do arquivo baixado ou None se falhar
     """
-    arquivo_remoto = "/personal/washington_gouvea_synvia_com_/Documents/Data Analysis/Churn PCLs/Automations/cunha/relatorio_completo_laboratorios_gralab.xlsx"
-    base_name = "relatorio_completo_laboratorios_gralab.xlsx"
+    arquivo_remoto = REMOTO_EXCEL_GRALAB
+    base_name = os.path.basename(REMOTO_EXCEL_GRALAB)
     arquivo_local = os.path.join(OUTPUT_DIR, base_name)
     
     # Verificar cache (4 horas = 14400 segundos)
@@ -349,13 +474,13 @@ def baixar_excel_gralab(force: bool = False) -> Optional[str]:
     try:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         
-        # Usar ChurnSPConnector
-        from churn_sp_connector import ChurnSPConnector
+        # Usar ChurnSPConnector (instância compartilhada do processo)
+        from churn_sp_connector import obter_connector
         
-        connector = ChurnSPConnector(config=st.secrets)
+        connector = obter_connector(st.secrets)
         
-        # Baixar arquivo
-        content = connector.download(arquivo_remoto)
+        # Baixar arquivo (corpo só é transferido se o cTag/eTag mudou)
+        content = connector.download_cached(arquivo_remoto)
         
         # Salvar localmente
         with open(arquivo_local, "wb") as f:
@@ -385,8 +510,8 @@ def baixar_excel_sodre(force: bool = False) -> Optional[str]:
     Returns:
         Caminho local do arquivo baixado ou None se falhar
     """
-    arquivo_remoto = "/personal/washington_gouvea_synvia_com_/Documents/Data Analysis/Churn PCLs/Automations/sodre/relatorio_completo_laboratorios_sodre.xlsx"
-    base_name = "relatorio_completo_laboratorios_sodre.xlsx"
+    arquivo_remoto = REMOTO_EXCEL_SODRE
+    base_name = os.path.basename(REMOTO_EXCEL_SODRE)
     arquivo_local = os.path.join(OUTPUT_DIR, base_name)
     
     # Verificar cache (4 horas = 14400 segundos)
@@ -407,13 +532,13 @@ def baixar_excel_sodre(force: bool = False) -> Optional[str]:
     try:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         
-        # Usar ChurnSPConnector
-        from churn_sp_connector import ChurnSPConnector
+        # Usar ChurnSPConnector (instância compartilhada do processo)
+        from churn_sp_connector import obter_connector
         
-        connector = ChurnSPConnector(config=st.secrets)
+        connector = obter_connector(st.secrets)
         
-        # Baixar arquivo
-        content = connector.download(arquivo_remoto)
+        # Baixar arquivo (corpo só é transferido se o cTag/eTag mudou)
+        content = connector.download_cached(arquivo_remoto)
         
         # Salvar localmente
         with open(arquivo_local, "wb") as f:
@@ -443,8 +568,8 @@ def baixar_excel_db(force: bool = False) -> Optional[str]:
     Returns:
         Caminho local do arquivo baixado ou None se falhar
     """
-    arquivo_remoto = "/personal/washington_gouvea_synvia_com_/Documents/Data Analysis/Churn PCLs/Automations/db/relatorio_completo_laboratorios_db.xlsx"
-    base_name = "relatorio_completo_laboratorios_db.xlsx"
+    arquivo_remoto = REMOTO_EXCEL_DB
+    base_name = os.path.basename(REMOTO_EXCEL_DB)
     arquivo_local = os.path.join(OUTPUT_DIR, base_name)
     
     # Verificar cache (4 horas = 14400 segundos)
@@ -465,13 +590,13 @@ def baixar_excel_db(force: bool = False) -> Optional[str]:
     try:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         
-        # Usar ChurnSPConnector
-        from churn_sp_connector import ChurnSPConnector
+        # Usar ChurnSPConnector (instância compartilhada do processo)
+        from churn_sp_connector import obter_connector
         
-        connector = ChurnSPConnector(config=st.secrets)
+        connector = obter_connector(st.secrets)
         
-        # Baixar arquivo
-        content = connector.download(arquivo_remoto)
+        # Baixar arquivo (corpo só é transferido se o cTag/eTag mudou)
+        content = connector.download_cached(arquivo_remoto)
         
         # Salvar localmente
         with open(arquivo_local, "wb") as f:
@@ -491,6 +616,43 @@ def baixar_excel_db(force: bool = False) -> Optional[str]:
             return arquivo_local
         return None
 
+def baixar_sidecars_concorrente(remoto_excel: str, force: bool = False) -> Dict[str, str]:
+    """
+    Baixa os sidecars Parquet (uma por aba) publicados ao lado do Excel do concorrente.
+
+    Args:
+        remoto_excel: Caminho remoto do Excel (REMOTO_EXCEL_*)
+        force: Força download mesmo se cache válido
+
+    Returns:
+        Dicionário aba -> caminho local; abas sem sidecar disponível ficam de fora
+    """
+    cfg = _get_graph_config()
+    sem_graph = not cfg or not (cfg.get("tenant_id") and cfg.get("client_id") and cfg.get("client_secret"))
+    connector = None
+    locais = {}
+    for aba, remoto in _remotos_sidecar(remoto_excel).items():
+        arquivo_local = os.path.join(OUTPUT_DIR, os.path.basename(remoto))
+        existe = os.path.exists(arquivo_local)
+        # Mesmo cache de 4 horas dos Excel dos concorrentes
+        if sem_graph or (not force and existe and time.time() - os.path.getmtime(arquivo_local) < 14400):
+            if existe:
+                locais[aba] = arquivo_local
+            continue
+        try:
+            if connector is None:
+                from churn_sp_connector import obter_connector
+                connector = obter_connector(st.secrets)
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            _gravar_local_se_mudou(arquivo_local, connector.download_cached(remoto))
+            locais[aba] = arquivo_local
+        except Exception as e:
+            # Sidecar ainda não publicado pelo scraper: a aba será lida do Excel
+            logger.debug(f"Sidecar {os.path.basename(remoto)} indisponível: {e}")
+            if existe:
+                locais[aba] = arquivo_local
+    return locais
+
 def show_overlay_loader(title: str = "Carregando...", subtitle: str = "Por favor, aguarde enquanto processamos os dados."):
     """
     Função helper para criar o overlay loader facilmente.
@@ -827,27 +989,13 @@ class KPIMetrics:
 class DataManager:
     """Gerenciador de dados com cache inteligente."""
     @staticmethod
-    def normalizar_cnpj(cnpj: str) -> str:
-        """Remove formatação do CNPJ (pontos, traços, barras)"""
-        if pd.isna(cnpj) or cnpj == '':
-            return ''
-        # Converter numéricos para string sem decimais (evita sufixo '.0')
-        if isinstance(cnpj, (int, float)):
-            try:
-                cnpj = str(int(cnpj))
-            except Exception:
-                cnpj = str(cnpj)
-        # Remove tudo exceto dígitos
-        cnpj_limpo = ''.join(filter(str.isdigit, str(cnpj)))
-        # Garantir 14 dígitos
-        if len(cnpj_limpo) < 14:
-            cnpj_limpo = cnpj_limpo.zfill(14)
-        elif len(cnpj_limpo) > 14:
-            cnpj_limpo = cnpj_limpo[-14:]
-        return cnpj_limpo
+    def carregar_dados_churn() -> Optional[pd.DataFrame]:
+        """Carrega dados de análise de churn com cache inteligente (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('churn')
+        return DataManager._carregar_dados_churn()
     @staticmethod
     @st.cache_data(ttl=CACHE_TTL)
-    def carregar_dados_churn() -> Optional[pd.DataFrame]:
+    def _carregar_dados_churn() -> Optional[pd.DataFrame]:
         """Carrega dados de análise de churn com cache inteligente."""
         try:
             # PRIMEIRO: Tentar baixar do SharePoint/OneDrive
@@ -885,177 +1033,72 @@ class DataManager:
             st.error(f"❌ Erro ao carregar dados: {e}")
             return None
     @staticmethod
-    def preparar_dados(df: pd.DataFrame) -> pd.DataFrame:
-        """Prepara e limpa os dados carregados - Atualizado para coerência entre telas."""
-        if df is None or df.empty:
-            return pd.DataFrame()
-        
-        # VALIDAÇÃO: Remover duplicatas baseadas em CNPJ antes de qualquer processamento
-        if 'CNPJ_PCL' in df.columns:
-            # Criar CNPJ_Normalizado temporariamente para deduplicação se ainda não existir
-            if 'CNPJ_Normalizado' not in df.columns:
-                df['CNPJ_Normalizado'] = df['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-            # Remover duplicatas mantendo o primeiro registro
-            df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-        elif 'CNPJ_Normalizado' in df.columns:
-            # Se já existe CNPJ_Normalizado mas não CNPJ_PCL, usar CNPJ_Normalizado
-            df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-        
-        # Removido bloco de debug da sidebar para manter interface limpa
-        # Garantir tipos de dados corretos
-        if 'Data_Analise' in df.columns:
-            df['Data_Analise'] = pd.to_datetime(df['Data_Analise'], errors='coerce')
-        # Calcular volume total se não existir (até o mês atual)
-        try:
-            # Função inline para evitar dependência circular
-            meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-            ano_atual = pd.Timestamp.today().year
-            limite_mes = pd.Timestamp.today().month if 2025 == ano_atual else 12
-            meses_limite = meses_ordem[:limite_mes]
-            sufixo = str(2025)[-2:]
-            meses_2025_dyn = [m for m in meses_limite if f'N_Coletas_{m}_{sufixo}' in df.columns]
-        except Exception:
-            meses_2025_dyn = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out']
-        colunas_meses = [f'N_Coletas_{mes}_25' for mes in meses_2025_dyn]
-        if 'Volume_Total_2025' not in df.columns:
-            df['Volume_Total_2025'] = df[colunas_meses].sum(axis=1, skipna=True) if colunas_meses else 0
-        # Adicionar coluna CNPJ normalizado para match com dados VIP
-        if 'CNPJ_PCL' in df.columns:
-            df['CNPJ_Normalizado'] = df['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-        # Filtro Active == True para coerência
-        if 'Active' in df.columns:
-            df = df[df['Active'] == True]
-
-        # 2. INTEGRAÇÃO GLOBAL VIP (Para uso nas abas que mostram tudo)
-        try:
-            df_vip = DataManager.carregar_dados_vip()
-            
-            if df_vip is not None and not df_vip.empty:
-                if 'CNPJ_Normalizado' not in df_vip.columns:
-                     df_vip['CNPJ_Normalizado'] = df_vip['CNPJ'].apply(DataManager.normalizar_cnpj)
-                
-                # Garantir que não há duplicatas no df_vip antes do merge
-                df_vip = df_vip.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-                
-                # Colunas para trazer
-                cols_vip = ['CNPJ_Normalizado', 'Rede', 'Ranking', 'Ranking Rede']
-                cols_vip = [c for c in cols_vip if c in df_vip.columns]
-                
-                # Merge mantendo TODOS os laboratórios (Left Join)
-                df = df.merge(df_vip[cols_vip], on='CNPJ_Normalizado', how='left', suffixes=('', '_vip'))
-                
-                # Remover duplicatas após merge (caso o df original já tivesse duplicatas)
-                df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-                
-                # Consolidar Rede
-                if 'Rede' not in df.columns and 'Rede_vip' in df.columns:
-                    df['Rede'] = df['Rede_vip']
-                elif 'Rede' in df.columns and 'Rede_vip' in df.columns:
-                    df['Rede'] = df['Rede'].fillna(df['Rede_vip'])
-                
-                # Criar flags
-                df['VIP'] = np.where(df['Ranking'].notna(), 'Sim', 'Não')
-                df['Rede'] = df['Rede'].fillna('-')
-            else:
-                df['VIP'] = 'Não'
-                df['Rede'] = '-'
-        except Exception as e:
-            # Log erro silencioso para não travar app
-            print(f"Erro integração VIP: {e}")
-            df['VIP'] = 'Não'
-            df['Rede'] = '-'
-
-        # === Nova régua de risco diário ===
-        colunas_novas = [
-            "Vol_Hoje", "Vol_D1", "MM7", "MM30", "MM90", "DOW_Media",
-            "Delta_D1", "Delta_MM7", "Delta_MM30", "Delta_MM90",
-            "Risco_Diario", "Recuperacao"
-        ]
-        try:
-            registros = []
-            for _, r in df.iterrows():
-                res = RiskEngine.classificar(r)
-                registros.append(res if res else {c: None for c in colunas_novas})
-            df_risk = pd.DataFrame(registros, index=df.index)
-            for c in colunas_novas:
-                df[c] = df_risk.get(c)
-        except Exception:
-            for c in colunas_novas:
-                if c not in df.columns:
-                    df[c] = None
-        # Opcional: preservar a coluna antiga para auditoria
-        if 'Status_Risco' in df.columns and 'Risco_Diario' in df.columns:
-            df.rename(columns={'Status_Risco': 'Status_Risco_Legado'}, inplace=True)
-
-        # Normalizar colunas de recoletas
-        recoleta_cols = [c for c in df.columns if c.startswith('Recoletas_')]
-        for col in recoleta_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-        for col in ['Total_Recoletas_2024', 'Total_Recoletas_2025']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
-
-        # Garantir colunas de preço mesmo quando não presentes no arquivo (fallback SharePoint)
-        price_cols_expected: List[str] = []
-        price_prefixes: List[str] = []
-        for cfg in PRICE_CATEGORIES.values():
-            prefix = cfg['prefix']
-            price_prefixes.append(prefix)
-            price_cols_expected.extend([
-                f'Preco_{prefix}_Total',
-                f'Preco_{prefix}_Coleta',
-                f'Preco_{prefix}_Exame'
-            ])
-        extra_price_cols = ['Voucher_Commission', 'Data_Preco_Atualizacao']
-        precisa_precos = any(col not in df.columns for col in price_cols_expected) or any(
-            col not in df.columns for col in extra_price_cols
-        )
-        if precisa_precos:
-            df_prices_extra = DataManager.carregar_prices()
-            if df_prices_extra is not None and not df_prices_extra.empty and '_laboratory' in df_prices_extra.columns:
-                df_prices_extra = df_prices_extra.copy()
-                df_prices_extra['_laboratory'] = df_prices_extra['_laboratory'].astype(str)
-                merge_col = None
-                for candidate in ['_id', 'Laboratory_ID', 'LaboratoryId', 'LaboratoryID', 'Lab_ID', 'LabId', 'id']:
-                    if candidate in df.columns:
-                        merge_col = candidate
-                        df[merge_col] = df[merge_col].astype(str)
-                        break
-                if merge_col:
-                    lookup = df_prices_extra.set_index('_laboratory')
-                    mapping_cache = {}
-                    for col in price_cols_expected + extra_price_cols:
-                        if col in lookup.columns:
-                            mapping_cache[col] = lookup[col].to_dict()
-                    for col, mapping in mapping_cache.items():
-                        if col not in df.columns:
-                            df[col] = np.nan
-                        df[col] = df[col].fillna(df[merge_col].map(mapping))
-                else:
-                    st.warning("⚠️ Não foi possível vincular preços aos laboratórios (ID ausente).")
-
-        for col in price_cols_expected:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+    def carregar_dados_preparados() -> Tuple[Optional[pd.DataFrame], str]:
+        """
+        Retorna o dataset já preparado para a versão atual dos arquivos.
 
-        if 'Voucher_Commission' in df.columns:
-            df['Voucher_Commission'] = pd.to_numeric(df['Voucher_Commission'], errors='coerce')
+        O resultado de preparar_dados é compartilhado entre sessões: depois da primeira
+        carga, as sessões recebem a referência publicada pelo AtualizadorDataset, que
+        prepara versões novas em segundo plano e só então faz a troca. Apenas a
+        primeira carga do processo (sem versão publicada) bloqueia a sessão.
+        Trate o DataFrame retornado como somente leitura.
 
-        if 'Data_Preco_Atualizacao' in df.columns:
-            df['Data_Preco_Atualizacao'] = pd.to_datetime(df['Data_Preco_Atualizacao'], errors='coerce', utc=True)
-            try:
-                df['Data_Preco_Atualizacao'] = df['Data_Preco_Atualizacao'].dt.tz_convert(TIMEZONE)
-            except Exception:
-                pass
+        Returns:
+            (DataFrame preparado ou None, id da versão)
+        """
+        atualizador = _obter_atualizador_dataset()
+        atual = atualizador.atual()
+        if atual is not None:
+            return atual[1], atual[0]
+        # Garante que o download/sincronização em andamento terminou antes de versionar
+        aguardar_prefetch('churn')
+        versao = versao_dataset()
+        df = DataManager._preparar_dados_versao(versao)
+        atualizador.publicar(versao, df, somente_se_vazio=True)
+        return df, versao
+    @staticmethod
+    @st.cache_resource(show_spinner=False, max_entries=2)
+    def _preparar_dados_versao(versao: str) -> Optional[pd.DataFrame]:
+        """
+        Carrega e prepara o dataset uma única vez por versão (compartilhado entre sessões).
 
+        Usa o artefato pré-preparado publicado pelo gerador quando ele corresponde aos
+        arquivos locais; senão lê a tabela de churn e roda preparar_dados.
+        """
+        df = DataManager.carregar_dataset_preparado()
+        if df is not None:
+            return df
+        df_raw = DataManager.carregar_dados_churn()
+        if df_raw is None:
+            return None
+        return DataManager.preparar_dados(df_raw)
+    @staticmethod
+    def carregar_dataset_preparado() -> Optional[pd.DataFrame]:
+        """Dataset preparado pelo gerador (Feather convertido para pandas), se valer para os arquivos locais."""
+        inicio = time.perf_counter()
+        df = carregar_dataset_preparado(
+            os.path.join(OUTPUT_DIR, DATASET_PREPARADO_FILE),
+            lambda nome: hash_arquivo(os.path.join(OUTPUT_DIR, nome)),
+        )
+        if df is not None:
+            logger.info(f"Dataset pré-preparado carregado em {time.perf_counter() - inicio:.2f}s ({len(df)} linhas)")
         return df
     @staticmethod
+    def preparar_dados(df: pd.DataFrame) -> pd.DataFrame:
+        """Prepara e limpa os dados carregados - Atualizado para coerência entre telas."""
+        return preparar_dataset(
+            df,
+            carregar_vip=DataManager.carregar_dados_vip,
+            carregar_prices=DataManager.carregar_prices,
+            avisar=st.warning,
+        )
+    @staticmethod
     @st.cache_data(ttl=CACHE_TTL)
     def carregar_matriz_cs_normalizada() -> Optional[pd.DataFrame]:
         """Carrega dados da matriz CS normalizada com cache inteligente."""
         try:
             # PRIMEIRO: Tentar baixar do SharePoint/OneDrive
-            arquivo_vip_remoto = "Data Analysis/Churn PCLs/matriz_cs_normalizada.csv"
+            arquivo_vip_remoto = REMOTO_MATRIZ_CS
             arquivo_sharepoint = baixar_sharepoint(arquivo_remoto=arquivo_vip_remoto)
             if arquivo_sharepoint and os.path.exists(arquivo_sharepoint):
                 # Tentar ler como CSV
@@ -1073,7 +1116,7 @@ class DataManager:
                         return None
                     # Ler CNPJ como string para preservar zeros à esquerda
                     df['CNPJ'] = df['CNPJ'].astype(str)
-                    df['CNPJ_Normalizado'] = df['CNPJ'].apply(DataManager.normalizar_cnpj)
+                    df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ'])
                     # Toast removido - será exibido onde a função é chamada
                     return df
                 except Exception as e:
@@ -1100,7 +1143,7 @@ class DataManager:
                 )
                 # Garantir que CNPJ seja string e normalizar
                 df['CNPJ'] = df['CNPJ'].astype(str)
-                df['CNPJ_Normalizado'] = df['CNPJ'].apply(DataManager.normalizar_cnpj)
+                df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ'])
                 # Toast removido - será exibido onde a função é chamada
                 return df
             return None
@@ -1108,12 +1151,17 @@ class DataManager:
             # Error removido - será tratado onde a função é chamada
             return None
     @staticmethod
-    @st.cache_data(ttl=VIP_CACHE_TTL)
     def carregar_dados_vip() -> Optional[pd.DataFrame]:
+        """Carrega dados VIP do CSV normalizado com cache (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('vip')
+        return DataManager._carregar_dados_vip()
+    @staticmethod
+    @st.cache_data(ttl=VIP_CACHE_TTL)
+    def _carregar_dados_vip() -> Optional[pd.DataFrame]:
         """Carrega dados VIP do CSV normalizado com cache."""
         try:
             # Tentar baixar matriz CS do SharePoint
-            arquivo_vip_remoto = "Data Analysis/Churn PCLs/matriz_cs_normalizada.csv"
+            arquivo_vip_remoto = REMOTO_MATRIZ_CS
             arquivo_sharepoint = baixar_sharepoint(arquivo_remoto=arquivo_vip_remoto, force=False)
             if arquivo_sharepoint and os.path.exists(arquivo_sharepoint):
                 # Ler arquivo VIP
@@ -1133,7 +1181,7 @@ class DataManager:
                     return None
                 # Ler CNPJ como string para preservar zeros à esquerda
                 df_vip['CNPJ'] = df_vip['CNPJ'].astype(str)
-                df_vip['CNPJ_Normalizado'] = df_vip['CNPJ'].apply(DataManager.normalizar_cnpj)
+                df_vip['CNPJ_Normalizado'] = normalizar_cnpjs(df_vip['CNPJ'])
                 # Remover duplicatas baseadas em CNPJ_Normalizado (manter primeiro registro)
                 df_vip = df_vip.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
                 # Toast removido - será exibido onde a função é chamada
@@ -1159,7 +1207,7 @@ class DataManager:
                 )
                 # Garantir que CNPJ seja string e normalizar
                 df_vip['CNPJ'] = df_vip['CNPJ'].astype(str)
-                df_vip['CNPJ_Normalizado'] = df_vip['CNPJ'].apply(DataManager.normalizar_cnpj)
+                df_vip['CNPJ_Normalizado'] = normalizar_cnpjs(df_vip['CNPJ'])
                 # Remover duplicatas baseadas em CNPJ_Normalizado (manter primeiro registro)
                 df_vip = df_vip.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
                 # Toast removido - será exibido onde a função é chamada
@@ -1184,12 +1232,17 @@ class DataManager:
         except Exception as e:
             st.warning(f"Não foi possível salvar dados VIP localmente: {e}")
     @staticmethod
-    @st.cache_data(ttl=CACHE_TTL)
     def carregar_laboratories() -> Optional[pd.DataFrame]:
+        """Carrega dados de laboratories.csv com cache inteligente (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('laboratories')
+        return DataManager._carregar_laboratories()
+    @staticmethod
+    @st.cache_data(ttl=CACHE_TTL)
+    def _carregar_laboratories() -> Optional[pd.DataFrame]:
         """Carrega dados de laboratories.csv com cache inteligente."""
         try:
             # PRIMEIRO: Tentar baixar do SharePoint/OneDrive
-            arquivo_labs_remoto = "Data Analysis/Churn PCLs/laboratories.csv"
+            arquivo_labs_remoto = REMOTO_LABORATORIES
             arquivo_sharepoint = baixar_sharepoint(arquivo_remoto=arquivo_labs_remoto)
             
             if arquivo_sharepoint and os.path.exists(arquivo_sharepoint):
@@ -1199,10 +1252,10 @@ class DataManager:
                     # Normalizar CNPJ para permitir matching
                     if 'cnpj' in df_labs.columns:
                         df_labs['cnpj'] = df_labs['cnpj'].astype(str)
-                        df_labs['CNPJ_Normalizado'] = df_labs['cnpj'].apply(DataManager.normalizar_cnpj)
+                        df_labs['CNPJ_Normalizado'] = normalizar_cnpjs(df_labs['cnpj'])
                     elif 'CNPJ' in df_labs.columns:
                         df_labs['CNPJ'] = df_labs['CNPJ'].astype(str)
-                        df_labs['CNPJ_Normalizado'] = df_labs['CNPJ'].apply(DataManager.normalizar_cnpj)
+                        df_labs['CNPJ_Normalizado'] = normalizar_cnpjs(df_labs['CNPJ'])
                     
                     return df_labs
                 except Exception as e:
@@ -1217,10 +1270,10 @@ class DataManager:
                 # Normalizar CNPJ para permitir matching
                 if 'cnpj' in df_labs.columns:
                     df_labs['cnpj'] = df_labs['cnpj'].astype(str)
-                    df_labs['CNPJ_Normalizado'] = df_labs['cnpj'].apply(DataManager.normalizar_cnpj)
+                    df_labs['CNPJ_Normalizado'] = normalizar_cnpjs(df_labs['cnpj'])
                 elif 'CNPJ' in df_labs.columns:
                     df_labs['CNPJ'] = df_labs['CNPJ'].astype(str)
-                    df_labs['CNPJ_Normalizado'] = df_labs['CNPJ'].apply(DataManager.normalizar_cnpj)
+                    df_labs['CNPJ_Normalizado'] = normalizar_cnpjs(df_labs['CNPJ'])
                 
                 return df_labs
             
@@ -1230,8 +1283,13 @@ class DataManager:
             return None
     
     @staticmethod
-    @st.cache_data(ttl=CACHE_TTL)
     def carregar_prices(force: bool = False) -> Optional[pd.DataFrame]:
+        """Carrega dados de prices.csv com fallback para SharePoint (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('prices')
+        return DataManager._carregar_prices(force=force)
+    @staticmethod
+    @st.cache_data(ttl=CACHE_TTL)
+    def _carregar_prices(force: bool = False) -> Optional[pd.DataFrame]:
         """Carrega dados de prices.csv com fallback para SharePoint."""
         try:
             arquivo_local = os.path.join(OUTPUT_DIR, PRICES_FILE)
@@ -1255,10 +1313,52 @@ class DataManager:
         return None
     
     @staticmethod
-    @st.cache_data(ttl=14400)  # Cache de 4 horas
+    def _ler_abas_concorrente(arquivo_excel: str, remoto_excel: str) -> Dict[str, pd.DataFrame]:
+        """
+        Lê as abas de ABAS_CONCORRENTE de um relatório de concorrente.
+
+        Usa o sidecar Parquet de cada aba quando o hash do Excel de origem gravado
+        no sidecar confere com o Excel baixado; as demais abas são lidas do Excel
+        (apenas elas, sem carregar o workbook inteiro) com o CNPJ normalizado aqui.
+        """
+        import pyarrow.parquet as pq
+
+        fonte_sha256 = hash_arquivo(arquivo_excel)
+        abas = {}
+        for aba, caminho in baixar_sidecars_concorrente(remoto_excel).items():
+            try:
+                metadata = pq.read_schema(caminho).metadata or {}
+                if fonte_sha256 and metadata.get(b'fonte_sha256', b'').decode() == fonte_sha256:
+                    abas[aba] = pd.read_parquet(caminho)
+            except Exception as e:
+                logger.warning(f"Sidecar Parquet inválido ({os.path.basename(caminho)}): {e}")
+
+        faltantes = [aba for aba in ABAS_CONCORRENTE if aba not in abas]
+        if faltantes:
+            logger.debug(f"{os.path.basename(arquivo_excel)}: lendo do Excel as abas {faltantes}")
+            with pd.ExcelFile(arquivo_excel, engine='openpyxl') as xls:
+                for aba in faltantes:
+                    if aba not in xls.sheet_names:
+                        continue
+                    df = xls.parse(aba)
+                    # Procurar coluna de CNPJ (case insensitive)
+                    coluna_cnpj = next((col for col in df.columns if str(col).upper() == 'CNPJ'), None)
+                    if coluna_cnpj:
+                        # Mesma regra dos sidecars e de match_concorrentes: número sem '.0', vazio/zerado -> ''
+                        df['CNPJ_Normalizado'] = normalizar_cnpjs(df[coluna_cnpj], vazio_se_zerado=True)
+                    abas[aba] = df
+        return abas
+
+    @staticmethod
     def carregar_dados_gralab() -> Optional[Dict[str, pd.DataFrame]]:
+        """Carrega as abas do concorrente Gralab usadas pelo dashboard (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('gralab')
+        return DataManager._carregar_dados_gralab()
+    @staticmethod
+    @st.cache_data(ttl=14400)  # Cache de 4 horas
+    def _carregar_dados_gralab() -> Optional[Dict[str, pd.DataFrame]]:
         """
-        Carrega dados do Excel do concorrente Gralab com todas as abas.
+        Carrega as abas do concorrente Gralab usadas pelo dashboard (ABAS_CONCORRENTE).
         
         Returns:
             Dicionário com DataFrames das abas ou None se falhar
@@ -1270,33 +1370,22 @@ class DataManager:
             if not arquivo_excel or not os.path.exists(arquivo_excel):
                 return None
             
-            # Ler todas as abas do Excel
-            todas_abas = pd.read_excel(arquivo_excel, sheet_name=None, engine='openpyxl')
-            
-            # Normalizar CNPJ em todas as abas que tenham coluna CNPJ ou Cnpj
-            for nome_aba, df in todas_abas.items():
-                # Procurar coluna de CNPJ (case insensitive)
-                coluna_cnpj = None
-                for col in df.columns:
-                    if col.upper() == 'CNPJ':
-                        coluna_cnpj = col
-                        break
-                
-                if coluna_cnpj:
-                    df[coluna_cnpj] = df[coluna_cnpj].astype(str)
-                    df['CNPJ_Normalizado'] = df[coluna_cnpj].apply(DataManager.normalizar_cnpj)
-            
-            return todas_abas
+            return DataManager._ler_abas_concorrente(arquivo_excel, REMOTO_EXCEL_GRALAB)
             
         except Exception as e:
             # Erro silencioso - será tratado onde a função é chamada
             return None
     
     @staticmethod
-    @st.cache_data(ttl=14400)  # Cache de 4 horas
     def carregar_dados_sodre() -> Optional[Dict[str, pd.DataFrame]]:
+        """Carrega as abas do concorrente Sodre usadas pelo dashboard (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('sodre')
+        return DataManager._carregar_dados_sodre()
+    @staticmethod
+    @st.cache_data(ttl=14400)  # Cache de 4 horas
+    def _carregar_dados_sodre() -> Optional[Dict[str, pd.DataFrame]]:
         """
-        Carrega dados do Excel do concorrente Sodre com todas as abas.
+        Carrega as abas do concorrente Sodre usadas pelo dashboard (ABAS_CONCORRENTE).
         
         Returns:
             Dicionário com DataFrames das abas ou None se falhar
@@ -1308,33 +1397,22 @@ class DataManager:
             if not arquivo_excel or not os.path.exists(arquivo_excel):
                 return None
             
-            # Ler todas as abas do Excel
-            todas_abas = pd.read_excel(arquivo_excel, sheet_name=None, engine='openpyxl')
-            
-            # Normalizar CNPJ em todas as abas que tenham coluna CNPJ ou Cnpj
-            for nome_aba, df in todas_abas.items():
-                # Procurar coluna de CNPJ (case insensitive)
-                coluna_cnpj = None
-                for col in df.columns:
-                    if col.upper() == 'CNPJ':
-                        coluna_cnpj = col
-                        break
-                
-                if coluna_cnpj:
-                    df[coluna_cnpj] = df[coluna_cnpj].astype(str)
-                    df['CNPJ_Normalizado'] = df[coluna_cnpj].apply(DataManager.normalizar_cnpj)
-            
-            return todas_abas
+            return DataManager._ler_abas_concorrente(arquivo_excel, REMOTO_EXCEL_SODRE)
             
         except Exception as e:
             # Erro silencioso - será tratado onde a função é chamada
             return None
     
     @staticmethod
-    @st.cache_data(ttl=14400)  # Cache de 4 horas
     def carregar_dados_db() -> Optional[Dict[str, pd.DataFrame]]:
+        """Carrega as abas do concorrente DB Toxicológico usadas pelo dashboard (aguarda o prefetch em andamento, se houver)."""
+        aguardar_prefetch('db')
+        return DataManager._carregar_dados_db()
+    @staticmethod
+    @st.cache_data(ttl=14400)  # Cache de 4 horas
+    def _carregar_dados_db() -> Optional[Dict[str, pd.DataFrame]]:
         """
-        Carrega dados do Excel do concorrente DB Toxicológico com todas as abas.
+        Carrega as abas do concorrente DB Toxicológico usadas pelo dashboard (ABAS_CONCORRENTE).
         
         Returns:
             Dicionário com DataFrames das abas ou None se falhar
@@ -1346,208 +1424,431 @@ class DataManager:
             if not arquivo_excel or not os.path.exists(arquivo_excel):
                 return None
             
-            # Ler todas as abas do Excel
-            todas_abas = pd.read_excel(arquivo_excel, sheet_name=None, engine='openpyxl')
-            
-            # Normalizar CNPJ em todas as abas que tenham coluna CNPJ ou Cnpj
-            for nome_aba, df in todas_abas.items():
-                # Procurar coluna de CNPJ (case insensitive)
-                coluna_cnpj = None
-                for col in df.columns:
-                    if col.upper() == 'CNPJ':
-                        coluna_cnpj = col
-                        break
-                
-                if coluna_cnpj:
-                    df[coluna_cnpj] = df[coluna_cnpj].astype(str)
-                    df['CNPJ_Normalizado'] = df[coluna_cnpj].apply(DataManager.normalizar_cnpj)
-            
-            return todas_abas
+            return DataManager._ler_abas_concorrente(arquivo_excel, REMOTO_EXCEL_DB)
             
         except Exception as e:
             # Erro silencioso - será tratado onde a função é chamada
             return None
 
 
-class RiskEngine:
-    """Calcula MM7/MM30/MM90, D-1, DOW e classifica o risco diário (nova régua)."""
+_REMOTOS_CONCORRENTES = {
+    'gralab': REMOTO_EXCEL_GRALAB,
+    'sodre': REMOTO_EXCEL_SODRE,
+    'db': REMOTO_EXCEL_DB,
+}
+
 
-    @staticmethod
-    def _serie_diaria_from_json(json_str: str) -> pd.Series:
-        """Converte 'Dados_Diarios_2025' (dict 'YYYY-MM' -> {dia:coletas}) em série diária."""
-        if pd.isna(json_str) or str(json_str).strip() in ("", "{}", "null"):
-            return pd.Series(dtype="float")
-        import json
+_BAIXAR_CONCORRENTES = {
+    'gralab': baixar_excel_gralab,
+    'sodre': baixar_excel_sodre,
+    'db': baixar_excel_db,
+}
+
+
+def _carregar_concorrente(nome: str) -> Optional[Dict[str, pd.DataFrame]]:
+    return {
+        'gralab': DataManager.carregar_dados_gralab,
+        'sodre': DataManager.carregar_dados_sodre,
+        'db': DataManager.carregar_dados_db,
+    }[nome]()
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _tabela_match_versao(versao: str, assinatura_concorrentes: str, _df: pd.DataFrame) -> pd.DataFrame:
+    """Tabela de match de CNPJs compartilhada entre sessões para a versão do dataset e dos relatórios."""
+    cnpjs = _df['CNPJ_Normalizado'] if 'CNPJ_Normalizado' in _df.columns else _df['CNPJ_PCL']
+    arquivos = {
+        nome: os.path.join(OUTPUT_DIR, os.path.basename(remoto))
+        for nome, remoto in _REMOTOS_CONCORRENTES.items()
+    }
+    return obter_tabela_match(
+        cnpjs, arquivos, os.path.join(OUTPUT_DIR, TABELA_MATCH_FILE),
+        carregar_dados=lambda nome, _arquivo: _carregar_concorrente(nome),
+    )
+
+
+def obter_tabela_match_cnpj(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tabela de match (match_concorrentes) entre df e os três concorrentes, indexada por
+    CNPJ. Montada uma vez por versão do dataset/relatórios (e reaproveitada do disco
+    quando nenhuma fonte mudou); sem versão definida, monta uma tabela avulsa.
+    """
+    versao = st.session_state.get('versao_dados')
+    if versao:
+        # Só garante os Excel locais (prefetch concluído; baixar_* é um stat dentro do
+        # cache de 4 h) e assina os arquivos: as abas são carregadas apenas se
+        # _tabela_match_versao não tiver a tabela desta assinatura
+        partes = []
+        for nome, baixar in _BAIXAR_CONCORRENTES.items():
+            aguardar_prefetch(nome)
+            arquivo = baixar()
+            partes.append((hash_arquivo(arquivo) if arquivo else None) or '-')
+        return _tabela_match_versao(versao, "|".join(partes), df)
+    concorrentes = {nome: _carregar_concorrente(nome) for nome in _REMOTOS_CONCORRENTES}
+    cnpjs = df['CNPJ_Normalizado'] if 'CNPJ_Normalizado' in df.columns else df['CNPJ_PCL']
+    return construir_tabela_match(cnpjs, concorrentes)
+
+
+class PrefetcherArtefatos:
+    """
+    Pré-carrega todos os artefatos do dashboard em paralelo no início da sessão.
+
+    Um event loop asyncio roda numa thread daemon: primeiro sincroniza os arquivos
+    do SharePoint (um $batch + downloads paralelos) e depois dispara o parse de
+    cada artefato num ThreadPoolExecutor limitado. Cada artefato publica um
+    Future; os loaders do DataManager aguardam esse Future antes de consultar o
+    st.cache_data, que a essa altura já está preenchido.
+    """
+
+    def __init__(self, max_workers: int = PREFETCH_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="prefetch-loop", daemon=True).start()
+        self._lock = threading.Lock()
+        self._futuros: Dict[str, Future] = {}
+        self._inicio = 0.0
+
+    def iniciar(self, loaders: Dict[str, Callable[[], Any]], forcar: bool = False) -> None:
+        """Agenda o prefetch se ainda não rodou dentro do CACHE_TTL (ou se forcar=True)."""
+        with self._lock:
+            if not forcar and self._futuros and time.time() - self._inicio < CACHE_TTL:
+                return
+            self._inicio = time.time()
+            self._futuros = {nome: Future() for nome in loaders}
+            futuros = dict(self._futuros)
+        asyncio.run_coroutine_threadsafe(self._executar(loaders, futuros), self._loop)
+
+    async def _executar(self, loaders: Dict[str, Callable[[], Any]], futuros: Dict[str, Future]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._pool, sincronizar_artefatos_sharepoint)
+        except Exception as e:
+            logger.warning(f"Prefetch: falha na sincronização em lote: {e}")
+
+        async def _carregar(nome: str, loader: Callable[[], Any]) -> None:
+            inicio = time.perf_counter()
+            try:
+                resultado = await loop.run_in_executor(self._pool, loader)
+                futuros[nome].set_result(resultado)
+                logger.info(f"Prefetch '{nome}' concluído em {time.perf_counter() - inicio:.2f}s")
+            except Exception as e:
+                futuros[nome].set_exception(e)
+
+        await asyncio.gather(*(_carregar(nome, loader) for nome, loader in loaders.items()))
+
+    def aguardar(self, nome: str, timeout: float = PREFETCH_TIMEOUT) -> None:
+        """Bloqueia até o artefato em prefetch ficar pronto (erros são ignorados: o loader refaz)."""
+        with self._lock:
+            futuro = self._futuros.get(nome)
+        if futuro is None or futuro.done():
+            return
         try:
-            j = json.loads(json_str)
+            futuro.result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.warning(f"Prefetch '{nome}' excedeu {timeout}s; carregando diretamente")
         except Exception:
-            return pd.Series(dtype="float")
-        rows = []
-        for ym, dias in j.items():
+            pass
+
+    def pronto(self, nome: str) -> bool:
+        """Indica se o artefato já foi carregado com sucesso pelo prefetch."""
+        with self._lock:
+            futuro = self._futuros.get(nome)
+        return bool(futuro and futuro.done() and futuro.exception() is None)
+
+
+@st.cache_resource(show_spinner=False)
+def _obter_prefetcher() -> PrefetcherArtefatos:
+    """Prefetcher único por processo (compartilhado entre sessões)."""
+    return PrefetcherArtefatos()
+
+
+def iniciar_prefetch(forcar: bool = False) -> None:
+    """Dispara o carregamento concorrente de todos os artefatos do dashboard."""
+    _obter_prefetcher().iniciar({
+        'churn': DataManager._carregar_dados_churn,
+        'vip': DataManager._carregar_dados_vip,
+        'prices': DataManager._carregar_prices,
+        'laboratories': DataManager._carregar_laboratories,
+        'gralab': DataManager._carregar_dados_gralab,
+        'sodre': DataManager._carregar_dados_sodre,
+        'db': DataManager._carregar_dados_db,
+    }, forcar=forcar)
+
+
+def aguardar_prefetch(nome: str) -> None:
+    """Aguarda o Future do artefato, se um prefetch estiver em andamento."""
+    try:
+        _obter_prefetcher().aguardar(nome)
+    except Exception:
+        pass
+
+
+def _caches_por_artefato() -> Dict[str, List[Callable]]:
+    """Nome do arquivo no SharePoint -> funções cacheadas (st.cache_data/st.cache_resource) que dependem dele."""
+    cfg = _get_graph_config() or {}
+    arquivo_churn = cfg.get("arquivo") or "churn_analysis_latest.csv"
+    return {
+        os.path.basename(arquivo_churn): [
+            DataManager._carregar_dados_churn, _metricas_semanal_versao, _metricas_mensal_versao
+        ],
+        "fechamentos_meta.json": [_metricas_semanal_versao],
+        VIP_CSV_FILE: [DataManager._carregar_dados_vip, DataManager.carregar_matriz_cs_normalizada],
+        LABORATORIES_FILE: [DataManager._carregar_laboratories],
+        PRICES_FILE: [DataManager._carregar_prices],
+        os.path.basename(REMOTO_EXCEL_GRALAB): [DataManager._carregar_dados_gralab],
+        os.path.basename(REMOTO_EXCEL_SODRE): [DataManager._carregar_dados_sodre],
+        os.path.basename(REMOTO_EXCEL_DB): [DataManager._carregar_dados_db],
+        **{
+            os.path.basename(remoto): [loader]
+            for remoto_excel, loader in (
+                (REMOTO_EXCEL_GRALAB, DataManager._carregar_dados_gralab),
+                (REMOTO_EXCEL_SODRE, DataManager._carregar_dados_sodre),
+                (REMOTO_EXCEL_DB, DataManager._carregar_dados_db),
+            )
+            for remoto in _remotos_sidecar(remoto_excel).values()
+        },
+    }
+
+
+def invalidar_artefatos(nomes: List[str]) -> List[str]:
+    """
+    Invalida apenas os caches ligados aos arquivos alterados e re-sincroniza.
+
+    Returns:
+        Nomes de arquivos que de fato tinham caches associados
+    """
+    mapa = _caches_por_artefato()
+    afetados = [nome for nome in nomes if nome in mapa]
+    if not afetados:
+        return []
+    for nome in afetados:
+        for func in mapa[nome]:
+            func.clear()
+    sincronizar_artefatos_sharepoint.clear()
+    iniciar_prefetch(forcar=True)
+    _obter_atualizador_dataset().solicitar()
+    logger.info(f"Caches invalidados por publicação no SharePoint: {', '.join(afetados)}")
+    return afetados
+
+
+class DeltaWatcher:
+    """
+    Observa a pasta "Churn PCLs" via delta query do drive (deltaLink persistido em
+    disco) e invalida os caches do dashboard somente quando um arquivo muda.
+    """
+
+    def __init__(self, intervalo: int = DELTA_POLL_INTERVAL):
+        self.intervalo = intervalo
+        self.ultima_verificacao: Optional[datetime] = None
+        self.ultima_alteracao: Optional[datetime] = None
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="delta-watcher", daemon=True)
+        self._thread.start()
+
+    def _loop(self) -> None:
+        while not self._parar.wait(self.intervalo):
             try:
-                y, m = ym.split("-")
-            except Exception:
-                continue
-            for d_str, v in dias.items():
-                try:
-                    d = int(d_str)
-                    rows.append((pd.Timestamp(int(y), int(m), d), int(v)))
-                except Exception:
-                    continue
-        if not rows:
-            return pd.Series(dtype="float")
-        s = pd.Series({d: v for d, v in rows}).sort_index()
-        return s
+                self.verificar()
+            except Exception as e:
+                logger.warning(f"DeltaWatcher: falha ao consultar alterações: {e}")
 
-    @staticmethod
-    def _last_business_day(reference: Optional[pd.Timestamp] = None) -> pd.Timestamp:
-        """Retorna a última data útil (considerando TIMEZONE)."""
-        if reference is None:
-            reference = pd.Timestamp.now(tz=TIMEZONE)
-        else:
-            if reference.tzinfo is None:
-                reference = reference.tz_localize(TIMEZONE)
-            else:
-                reference = reference.tz_convert(TIMEZONE)
-        reference = reference.normalize()
-        reference_naive = reference.tz_localize(None)
-        while reference_naive.weekday() >= 5:
-            reference_naive = (reference_naive - BDay(1))
-        return reference_naive
+    def verificar(self) -> List[str]:
+        """Consulta o delta uma vez e invalida os caches afetados."""
+        cfg = _get_graph_config()
+        if not cfg or not (cfg.get("tenant_id") and cfg.get("client_id") and cfg.get("client_secret")):
+            return []
+        from churn_sp_connector import obter_connector
 
-    @staticmethod
-    def _serie_business_day(s: pd.Series, ref_date: pd.Timestamp) -> pd.Series:
-        """Reindexa série para frequência de dias úteis até ref_date."""
-        if s.empty:
-            return s
-        s = s.sort_index()
-        start = s.index.min()
-        if ref_date < start:
-            ref_date = start
-        idx = pd.bdate_range(start, ref_date)
-        if len(idx) == 0:
-            idx = pd.DatetimeIndex([ref_date])
-        return s.reindex(idx, fill_value=0)
+        connector = obter_connector(st.secrets)
+        itens = connector.alteracoes_desde(SHAREPOINT_CHURN_FOLDER)
+        self.ultima_verificacao = datetime.now()
+        afetados = invalidar_artefatos(sorted({item.get("name", "") for item in itens}))
+        if afetados:
+            self.ultima_alteracao = self.ultima_verificacao
+        return afetados
+
+    def parar(self) -> None:
+        self._parar.set()
+
+
+@st.cache_resource(show_spinner=False)
+def _obter_delta_watcher() -> DeltaWatcher:
+    """Watcher único por processo (compartilhado entre sessões)."""
+    return DeltaWatcher()
 
-    @staticmethod
-    def _rolling_means(s: pd.Series, ref_date: pd.Timestamp) -> dict:
-        """MM7/MM30/MM90, D-1, média por DOW e contadores auxiliares."""
-        if s.empty:
-            return dict(MM7=0, MM30=0, MM90=0, D1=0, DOW=0, HOJE=0, zeros_consec=0, quedas50_consec=0)
-        if ref_date not in s.index:
-            return dict(MM7=0, MM30=0, MM90=0, D1=0, DOW=0, HOJE=0, zeros_consec=0, quedas50_consec=0)
-
-        hoje = float(s.loc[ref_date])
-        serie_ate_ref = s.loc[:ref_date]
-        if len(serie_ate_ref) > 1:
-            d1 = float(serie_ate_ref.iloc[-2])
-        else:
-            d1 = 0.0
-        mm7 = float(serie_ate_ref.tail(7).mean())
-        mm30 = float(serie_ate_ref.tail(30).mean())
-        mm90 = float(serie_ate_ref.tail(90).mean())
-        dow = int(ref_date.weekday())
-        dow_vals = serie_ate_ref[serie_ate_ref.index.weekday == dow]
-        dow_mean = float(dow_vals.tail(90).mean()) if len(dow_vals) else 0.0
-        zeros_consec = 0
-        for valor in serie_ate_ref[::-1]:
-            if valor == 0:
-                zeros_consec += 1
-            else:
-                break
 
-        def _is_queda50(idx):
-            mm7_local = s.loc[:idx].tail(7).mean()
-            return s.loc[idx] < 0.5 * mm7_local if mm7_local > 0 else False
+class AtualizadorDataset:
+    """
+    Mantém a referência process-wide para o dataset preparado e o reconstrói em
+    segundo plano quando uma versão nova é publicada.
+
+    Uma thread daemon acorda quando solicitada (DeltaWatcher, botão de atualizar),
+    a cada CACHE_TTL e logo após a meia-noite em TIMEZONE, sincroniza os artefatos,
+    calcula a versão (arquivos + dia útil de referência da régua de risco) e, se ela
+    mudou, roda preparar_dados fora das sessões. A troca da referência é atômica: até lá
+    as sessões continuam recebendo a versão anterior, sem overlay de carregamento.
+    """
+
+    def __init__(self, intervalo: int = CACHE_TTL):
+        self.intervalo = intervalo
+        self.em_andamento = False
+        self.ultima_troca: Optional[datetime] = None
+        self.ultimo_erro: Optional[str] = None
+        self._lock = threading.Lock()
+        self._atual: Optional[Tuple[str, pd.DataFrame]] = None
+        self._pedido = threading.Event()
+        self._forcar = False
+        self._thread = threading.Thread(target=self._loop, name="dataset-refresh", daemon=True)
+        self._thread.start()
+
+    def atual(self) -> Optional[Tuple[str, pd.DataFrame]]:
+        """(versão, DataFrame) publicado no momento, ou None antes da primeira carga."""
+        return self._atual
+
+    def publicar(self, versao: str, df: Optional[pd.DataFrame], somente_se_vazio: bool = False) -> bool:
+        """Troca a referência publicada (atômica para as sessões que leem atual())."""
+        if df is None:
+            return False
+        with self._lock:
+            if somente_se_vazio and self._atual is not None:
+                return False
+            self._atual = (versao, df)
+            self.ultima_troca = datetime.now()
+        return True
 
-        ultimos = s.loc[:ref_date].tail(3)
-        quedas50_consec = sum([_is_queda50(idx) for idx in ultimos.index])
-        return dict(MM7=mm7, MM30=mm30, MM90=mm90, D1=d1, DOW=dow_mean, HOJE=hoje,
-                    zeros_consec=zeros_consec, quedas50_consec=quedas50_consec)
+    def solicitar(self, forcar: bool = False) -> None:
+        """Pede uma reconstrução; forcar=True prepara de novo mesmo sem versão nova."""
+        if forcar:
+            self._forcar = True
+        self._pedido.set()
 
     @staticmethod
-    def _to_float(value: Any) -> Optional[float]:
-        """Converte valor para float com tratamento de NaN."""
-        try:
-            if pd.isna(value):
-                return None
-        except TypeError:
-            pass
+    def _segundos_ate_virada() -> float:
+        """Segundos até logo após a próxima meia-noite em TIMEZONE (quando data_referencia() pode mudar)."""
+        agora = pd.Timestamp.now(tz=TIMEZONE)
+        virada = (agora + pd.Timedelta(days=1)).normalize()
+        return max(1.0, (virada - agora).total_seconds() + 1)
+
+    def _loop(self) -> None:
+        while True:
+            self._pedido.wait(min(self.intervalo, self._segundos_ate_virada()))
+            self._pedido.clear()
+            forcar, self._forcar = self._forcar, False
+            try:
+                self.reconstruir(forcar=forcar)
+            except Exception as e:
+                self.ultimo_erro = str(e)
+                logger.warning(f"AtualizadorDataset: falha ao preparar nova versão: {e}")
+
+    def reconstruir(self, forcar: bool = False) -> bool:
+        """Prepara a versão atual dos arquivos e publica se for nova. Retorna se houve troca."""
+        self.em_andamento = True
         try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
+            # Re-sincroniza os artefatos se o CACHE_TTL venceu (no-op caso contrário)
+            iniciar_prefetch()
+            aguardar_prefetch('churn')
+            # A versão inclui o dia útil de referência: na virada do dia ela muda
+            # mesmo sem arquivo novo e a régua de risco é recalculada
+            versao = versao_dataset()
+            atual = self._atual
+            if atual is not None and atual[0] == versao and not forcar:
+                return False
+            inicio = time.perf_counter()
+            if forcar:
+                DataManager._preparar_dados_versao.clear()
+            df = DataManager._preparar_dados_versao(versao)
+            if not self.publicar(versao, df):
+                return False
+            self.ultimo_erro = None
+            logger.info(
+                f"Dataset versão {versao} preparado em segundo plano em "
+                f"{time.perf_counter() - inicio:.2f}s e publicado"
+            )
+            return True
+        finally:
+            self.em_andamento = False
 
-    @staticmethod
-    def classificar(row: pd.Series) -> dict:
-        """Aplica as regras do anexo e retorna métricas + 'Risco_Diario' e 'Recuperacao'."""
-        s = RiskEngine._serie_diaria_from_json(row.get("Dados_Diarios_2025", "{}"))
-        if s.empty:
-            return {}
-        ref_date = RiskEngine._last_business_day()
-        s = RiskEngine._serie_business_day(s, ref_date)
-        if s.empty:
-            return {}
-        m = RiskEngine._rolling_means(s, ref_date)
-        hoje, d1 = m["HOJE"], m["D1"]
-        mm7, mm30, mm90, dow = m["MM7"], m["MM30"], m["MM90"], m["DOW"]
-
-        def pct(a, b):
-            return (a - b) / b * 100 if b and b != 0 else 0.0
-
-        # Lógica híbrida para Delta D-1: usar MM7 como fallback quando D-1 = 0
-        if d1 > 0:
-            d_vs_d1 = pct(hoje, d1)
-        elif d1 == 0 and hoje == 0:
-            d_vs_d1 = 0.0
-        elif d1 == 0 and hoje > 0:
-            # Fallback: usar MM7 como referência quando D-1 está zerado
-            d_vs_d1 = pct(hoje, mm7) if mm7 > 0 else 0.0
-        else:
-            d_vs_d1 = 0.0
-        
-        d_vs_mm7 = pct(hoje, mm7)
-        d_vs_mm30 = pct(hoje, mm30)
-        d_vs_mm90 = pct(hoje, mm90)
-
-        mm7_br = RiskEngine._to_float(row.get("MM7_BR"))
-        mm7_uf = RiskEngine._to_float(row.get("MM7_UF"))
-        mm7_cidade = RiskEngine._to_float(row.get("MM7_CIDADE"))
-        contexto_mm = [mm for mm in [mm7_br, mm7_uf, mm7_cidade] if mm is not None and mm > 0]
-
-        reducoes = []
-        for mm_ctx in contexto_mm:
-            reducao = 1 - (hoje / mm_ctx) if mm_ctx > 0 else 0
-            reducoes.append(max(0.0, reducao))
-        maior_reducao = max(reducoes) if reducoes else 0.0
-        reducao_zero_absoluto = any(mm_ctx > 0 and hoje == 0 for mm_ctx in contexto_mm)
-
-        risco = "🟢 Normal"
-        limiar_medio = REDUCAO_MEDIO_RISCO
-        limiar_alto = REDUCAO_ALTO_RISCO
-
-        if reducao_zero_absoluto or maior_reducao >= 1.0 or m["zeros_consec"] >= 7 or m["quedas50_consec"] >= 3:
-            risco = "⚫ Crítico"
-        elif maior_reducao >= limiar_alto:
-            risco = "🔴 Alto"
-        elif maior_reducao >= limiar_medio:
-            risco = "🟠 Moderado"
-        elif maior_reducao > 0:
-            risco = "🟡 Atenção"
-        else:
-            risco = "🟢 Normal"
 
-        recuperacao = False
-        ultimos_4 = s.loc[:ref_date].tail(4)
-        if len(ultimos_4) == 4 and hoje >= mm7 and (ultimos_4.iloc[:3].mean() < 0.9 * mm7):
-            recuperacao = True
-        return {
-            "Vol_Hoje": int(hoje), "Vol_D1": int(d1),
-            "MM7": round(mm7, 3), "MM30": round(mm30, 3), "MM90": round(mm90, 3), "DOW_Media": round(dow, 1),
-            "Delta_D1": round(d_vs_d1, 1), "Delta_MM7": round(d_vs_mm7, 1),
-            "Delta_MM30": round(d_vs_mm30, 1), "Delta_MM90": round(d_vs_mm90, 1),
-            "Risco_Diario": risco, "Recuperacao": recuperacao
-        }
+@st.cache_resource(show_spinner=False)
+def _obter_atualizador_dataset() -> AtualizadorDataset:
+    """Atualizador único por processo (compartilhado entre sessões)."""
+    return AtualizadorDataset()
+
+
+SESSAO_ATIVA_SEGUNDOS = 1800  # Sessão sem rerun há mais que isso não conta como ativa
+_SESSOES_VISTAS: Dict[str, float] = {}
+_TAMANHO_DATASETS: "OrderedDict[str, float]" = OrderedDict()
+_MEMORIA_LOCK = threading.Lock()
+
+
+def registrar_sessao() -> None:
+    """Marca a sessão corrente como ativa (base do cálculo de memória por sessão)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except Exception:
+        ctx = None
+    if ctx is None:
+        return
+    with _MEMORIA_LOCK:
+        _SESSOES_VISTAS[ctx.session_id] = time.time()
+
+
+def _tamanho_dataset_mb(versao: str, df: pd.DataFrame) -> float:
+    """memory_usage(deep=True) do dataset compartilhado, calculado uma vez por versão."""
+    with _MEMORIA_LOCK:
+        if versao in _TAMANHO_DATASETS:
+            return _TAMANHO_DATASETS[versao]
+    tamanho = float(df.memory_usage(index=True, deep=True).sum()) / 2**20
+    with _MEMORIA_LOCK:
+        _TAMANHO_DATASETS[versao] = tamanho
+        while len(_TAMANHO_DATASETS) > 4:
+            _TAMANHO_DATASETS.popitem(last=False)
+    return tamanho
+
+
+def _tamanho_estado_sessao_mb() -> float:
+    """Bytes dos DataFrames/Series/arrays guardados no st.session_state da sessão corrente."""
+    total = 0
+    for valor in list(st.session_state.values()):
+        if isinstance(valor, pd.DataFrame):
+            total += int(valor.memory_usage(index=True, deep=False).sum())
+        elif isinstance(valor, pd.Series):
+            total += int(valor.memory_usage(index=True, deep=False))
+        elif isinstance(valor, np.ndarray):
+            total += valor.nbytes
+    return total / 2**20
+
+
+def metricas_memoria() -> Dict[str, Any]:
+    """
+    Memória do processo vista pela sessão corrente: RSS, dataset compartilhado,
+    sessões ativas, média por sessão (RSS menos o dataset, dividido pelas sessões)
+    e o que a própria sessão guarda no session_state. Valores em MB.
+    """
+    agora = time.time()
+    with _MEMORIA_LOCK:
+        for sessao, visto in list(_SESSOES_VISTAS.items()):
+            if agora - visto > SESSAO_ATIVA_SEGUNDOS:
+                del _SESSOES_VISTAS[sessao]
+        sessoes = len(_SESSOES_VISTAS)
+    try:
+        import psutil
+        rss_mb = psutil.Process().memory_info().rss / 2**20
+    except Exception:
+        rss_mb = None
+    atual = _obter_atualizador_dataset().atual()
+    compartilhado_mb = _tamanho_dataset_mb(*atual) if atual is not None else 0.0
+    por_sessao = None
+    if rss_mb is not None and sessoes:
+        por_sessao = max(0.0, rss_mb - compartilhado_mb) / sessoes
+    return {
+        'rss_mb': rss_mb,
+        'dataset_compartilhado_mb': compartilhado_mb,
+        'sessoes_ativas': sessoes,
+        'mb_por_sessao': por_sessao,
+        'estado_sessao_mb': _tamanho_estado_sessao_mb(),
+    }
 
 
 class VIPManager:
@@ -1558,7 +1859,7 @@ class VIPManager:
         if df_vip is None or df_vip.empty or not cnpj:
             return None
      
-        cnpj_normalizado = DataManager.normalizar_cnpj(cnpj)
+        cnpj_normalizado = normalizar_cnpj(cnpj)
         if not cnpj_normalizado:
             return None
      
@@ -1580,7 +1881,7 @@ class VIPManager:
         if df_labs is None or df_labs.empty or not cnpj:
             return None
         
-        cnpj_normalizado = DataManager.normalizar_cnpj(cnpj)
+        cnpj_normalizado = normalizar_cnpj(cnpj)
         if not cnpj_normalizado:
             return None
         
@@ -2079,14 +2380,8 @@ def calcular_queda_percentual(valor_atual: Optional[float], valor_anterior: Opti
     return max(0.0, -variacao)
 
 
-def _normalizar_cnpj_str(cnpj: Optional[str]) -> str:
-    if cnpj is None:
-        return ""
-    return ''.join(filter(str.isdigit, str(cnpj)))
-
-
 def _build_detalhe_url(cnpj: Optional[str]) -> str:
-    cnpj_norm = _normalizar_cnpj_str(cnpj)
+    cnpj_norm = somente_digitos(cnpj)
     if not cnpj_norm:
         return ""
     return f"?{DETALHE_QUERY_PARAM}={quote_plus(cnpj_norm)}"
@@ -2101,9 +2396,9 @@ def preparar_dataframe_risco(df: pd.DataFrame) -> pd.DataFrame:
     """Garante colunas derivadas para a lista de risco."""
     if df is None or df.empty:
         return df
-    work = df.copy()
+    work = df.copy(deep=False)
     if 'CNPJ_Normalizado' not in work.columns and 'CNPJ_PCL' in work.columns:
-        work['CNPJ_Normalizado'] = work['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
+        work['CNPJ_Normalizado'] = normalizar_cnpjs(work['CNPJ_PCL'])
 
     for col in [
         'WoW_Semana_Atual',
@@ -2316,8 +2611,7 @@ def aplicar_filtro_variacao_generica(
 # FUNÇÕES DE FECHAMENTO SEMANAL E MENSAL
 # ============================================
 
-@st.cache_data(ttl=300)
-def calcular_metricas_fechamento_semanal(df: pd.DataFrame) -> Dict[str, Any]:
+def _calcular_metricas_fechamento_semanal(df: pd.DataFrame) -> Dict[str, Any]:
     """
     Calcula métricas para fechamento semanal do mês corrente.
     
@@ -2562,7 +2856,7 @@ def calcular_metricas_fechamento_semanal(df: pd.DataFrame) -> Dict[str, Any]:
                                 # Buscar CNPJ normalizado
                                 cnpj_norm = row.get('CNPJ_Normalizado', '')
                                 if not cnpj_norm and 'CNPJ_PCL' in row:
-                                    cnpj_norm = DataManager.normalizar_cnpj(row.get('CNPJ_PCL', ''))
+                                    cnpj_norm = normalizar_cnpj(row.get('CNPJ_PCL', ''))
                                 
                                 metricas['labs_com_queda_wow'].append({
                                     'nome': row.get('Nome_Fantasia_PCL', 'N/A'),
@@ -2599,8 +2893,7 @@ def calcular_metricas_fechamento_semanal(df: pd.DataFrame) -> Dict[str, Any]:
     return metricas
 
 
-@st.cache_data(ttl=300)
-def calcular_metricas_fechamento_mensal(df: pd.DataFrame) -> Dict[str, Any]:
+def _calcular_metricas_fechamento_mensal(df: pd.DataFrame) -> Dict[str, Any]:
     """
     Calcula métricas para fechamento mensal consolidado.
     
@@ -2724,7 +3017,7 @@ def calcular_metricas_fechamento_mensal(df: pd.DataFrame) -> Dict[str, Any]:
                 # Buscar CNPJ normalizado
                 cnpj_norm = row.get('CNPJ_Normalizado', '')
                 if not cnpj_norm and 'CNPJ_PCL' in row:
-                    cnpj_norm = DataManager.normalizar_cnpj(row.get('CNPJ_PCL', ''))
+                    cnpj_norm = normalizar_cnpj(row.get('CNPJ_PCL', ''))
                 
                 lab_info = {
                     'nome': row.get('Nome_Fantasia_PCL', 'N/A'),
@@ -2847,18 +3140,101 @@ def formatar_tabela_storytelling(df, config_colunas):
     )
 
 
-def _navegar_para_analise_detalhada(cnpj: Optional[str]):
-    """Atualiza o estado para abrir a Análise Detalhada do laboratório selecionado."""
-    if not cnpj:
-        return
-    cnpj_str = ''.join(filter(str.isdigit, str(cnpj))) or str(cnpj)
-    st.session_state['lab_cnpj_selecionado'] = cnpj_str
-    st.session_state['page'] = "📋 Análise Detalhada"
-    st.session_state['busca_avancada'] = cnpj_str
-    st.rerun()
+def renderizar_tabela_paginada(
+    df: pd.DataFrame,
+    key: str,
+    column_config: Optional[Dict[str, Any]] = None,
+    estilo: Optional[Callable[[pd.DataFrame], Any]] = None,
+    selecionavel: bool = True
+) -> pd.DataFrame:
+    """
+    Tabela de laboratórios paginada no servidor.
 
+    Ordenação é feita sobre o DataFrame inteiro; apenas a página visível é enviada
+    ao navegador (e, se informado, estilizada por `estilo`, ex.: um Styler). A
+    formatação fica no column_config. Com `selecionavel`, a seleção de linha abre
+    a Análise Detalhada do laboratório.
 
-def _processar_query_param_detalhes():
+    Returns:
+        DataFrame da página exibida
+    """
+    column_config = column_config or {}
+    total = len(df)
+
+    def _rotulo(coluna: str) -> str:
+        cfg = column_config.get(coluna)
+        return (cfg.get('label') if isinstance(cfg, dict) else None) or coluna
+
+    opcoes_tamanho = sorted({50, 100, 250, 500, TABELA_LINHAS_POR_PAGINA})
+    col_ordem, col_sentido, col_tamanho, col_pagina = st.columns([3, 1, 1, 1])
+    ordenar_por = col_ordem.selectbox(
+        "Ordenar por",
+        options=[None] + list(df.columns),
+        format_func=lambda c: "Ordem padrão" if c is None else _rotulo(c),
+        key=f"{key}_ordem"
+    )
+    decrescente = col_sentido.toggle("Decrescente", value=False, key=f"{key}_desc", disabled=ordenar_por is None)
+    tamanho = col_tamanho.selectbox(
+        "Linhas por página",
+        options=opcoes_tamanho,
+        index=opcoes_tamanho.index(TABELA_LINHAS_POR_PAGINA),
+        key=f"{key}_tamanho"
+    )
+    n_paginas = max(1, -(-total // tamanho))
+    pagina = int(col_pagina.number_input("Página", min_value=1, max_value=n_paginas, value=1, step=1, key=f"{key}_pagina"))
+    pagina = min(pagina, n_paginas)
+
+    posicoes = np.arange(total)
+    if ordenar_por is not None:
+        try:
+            posicoes = (
+                df[ordenar_por].reset_index(drop=True)
+                .sort_values(ascending=not decrescente, na_position='last', kind='mergesort')
+                .index.to_numpy()
+            )
+        except TypeError:
+            # Coluna com tipos mistos: ordenar pela representação textual
+            posicoes = (
+                df[ordenar_por].astype(str).reset_index(drop=True)
+                .sort_values(ascending=not decrescente, kind='mergesort')
+                .index.to_numpy()
+            )
+    inicio = (pagina - 1) * tamanho
+    df_pagina = df.iloc[posicoes[inicio:inicio + tamanho]].reset_index(drop=True)
+    dados = estilo(df_pagina) if estilo is not None else df_pagina
+
+    # Chave por página/ordem: a seleção não "migra" para outra linha ao trocar de página
+    chave_tabela = f"{key}_{ordenar_por}_{decrescente}_{tamanho}_{pagina}"
+    if selecionavel:
+        evento = st.dataframe(
+            dados,
+            width='stretch',
+            hide_index=True,
+            column_config=column_config,
+            selection_mode="single-row",
+            on_select="rerun",
+            key=chave_tabela
+        )
+        _processar_evento_selecao(evento, df_pagina)
+    else:
+        st.dataframe(dados, width='stretch', hide_index=True, column_config=column_config, key=chave_tabela)
+    if total:
+        st.caption(f"Exibindo {inicio + 1:,}–{inicio + len(df_pagina):,} de {total:,} laboratórios · página {pagina} de {n_paginas}")
+    return df_pagina
+
+
+def _navegar_para_analise_detalhada(cnpj: Optional[str]):
+    """Atualiza o estado para abrir a Análise Detalhada do laboratório selecionado."""
+    if not cnpj:
+        return
+    cnpj_str = somente_digitos(cnpj) or str(cnpj)
+    st.session_state['lab_cnpj_selecionado'] = cnpj_str
+    st.session_state['page'] = "📋 Análise Detalhada"
+    st.session_state['busca_avancada'] = cnpj_str
+    st.rerun()
+
+
+def _processar_query_param_detalhes():
     """Detecta query param de detalhe e direciona para a análise detalhada."""
     try:
         params = st.experimental_get_query_params()
@@ -2867,7 +3243,7 @@ def _processar_query_param_detalhes():
     cnpj_param = params.get(DETALHE_QUERY_PARAM)
     if not cnpj_param:
         return
-    cnpj_val = _normalizar_cnpj_str(cnpj_param[0])
+    cnpj_val = somente_digitos(cnpj_param[0])
     st.experimental_set_query_params()
     if cnpj_val:
         _navegar_para_analise_detalhada(cnpj_val)
@@ -2890,10 +3266,202 @@ def _processar_evento_selecao(evento, df_display: pd.DataFrame):
     if cnpj_val:
         _navegar_para_analise_detalhada(cnpj_val)
 
+# Chamadas/cálculos dos caches de métricas de fechamento (taxa de acerto = 1 - cálculos/chamadas)
+_ESTATISTICAS_METRICAS = {
+    'semanal': {'chamadas': 0, 'calculos': 0},
+    'mensal': {'chamadas': 0, 'calculos': 0},
+}
+_ESTATISTICAS_METRICAS_LOCK = threading.Lock()
+
+
+def _registrar_estatistica_metricas(nome: str, campo: str):
+    with _ESTATISTICAS_METRICAS_LOCK:
+        _ESTATISTICAS_METRICAS[nome][campo] += 1
+
+
+def estatisticas_cache_metricas() -> Dict[str, Dict[str, Any]]:
+    """Chamadas, cálculos e taxa de acerto dos caches de métricas de fechamento."""
+    with _ESTATISTICAS_METRICAS_LOCK:
+        resultado = {}
+        for nome, est in _ESTATISTICAS_METRICAS.items():
+            chamadas, calculos = est['chamadas'], est['calculos']
+            resultado[nome] = {
+                'chamadas': chamadas,
+                'calculos': calculos,
+                'taxa_acerto': (1 - calculos / chamadas) if chamadas else None,
+            }
+        return resultado
+
+
+def chave_filtros(filtros: Dict[str, Any], *campos: str, **extras: Any) -> Tuple:
+    """Tupla normalizada (ordenada, listas viram tuplas ordenadas) dos filtros que definem um recorte."""
+    itens = {campo: filtros.get(campo) for campo in campos}
+    itens.update(extras)
+
+    def _normalizar(valor):
+        if isinstance(valor, (list, tuple, set)):
+            return tuple(sorted(str(v) for v in valor))
+        return valor
+
+    return tuple(sorted((campo, _normalizar(valor)) for campo, valor in itens.items()))
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=32, show_spinner=False)
+def _metricas_semanal_versao(versao: str, chave: Tuple, dia: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    """Métricas semanais por (versão do dataset, filtros, dia) - o frame não entra no hash."""
+    _registrar_estatistica_metricas('semanal', 'calculos')
+    return _calcular_metricas_fechamento_semanal(_df)
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=32, show_spinner=False)
+def _metricas_mensal_versao(versao: str, chave: Tuple, dia: str, _df: pd.DataFrame) -> Dict[str, Any]:
+    """Métricas mensais por (versão do dataset, filtros, dia) - o frame não entra no hash."""
+    _registrar_estatistica_metricas('mensal', 'calculos')
+    return _calcular_metricas_fechamento_mensal(_df)
+
+
+def _metricas_versionadas(nome: str, cacheada: Callable, calcular: Callable,
+                          df: pd.DataFrame, chave: Optional[Tuple]) -> Dict[str, Any]:
+    versao = st.session_state.get('versao_dados')
+    if chave is None or not versao:
+        return calcular(df)
+    _registrar_estatistica_metricas(nome, 'chamadas')
+    metricas = cacheada(versao, chave, datetime.now().strftime('%Y-%m-%d'), df)
+    logger.debug(f"Cache métricas {nome}: {estatisticas_cache_metricas()[nome]}")
+    # As telas ajustam o dicionário retornado; o objeto cacheado fica intacto
+    return copy.deepcopy(metricas)
+
+
+def calcular_metricas_fechamento_semanal(df: pd.DataFrame, chave: Optional[Tuple] = None) -> Dict[str, Any]:
+    """
+    Métricas do fechamento semanal, cacheadas por (versão do dataset, chave de filtros).
+
+    Args:
+        df: DataFrame com dados de churn (recorte definido por chave)
+        chave: tupla de chave_filtros que identifica o recorte; sem ela calcula direto
+    """
+    return _metricas_versionadas('semanal', _metricas_semanal_versao,
+                                 _calcular_metricas_fechamento_semanal, df, chave)
+
+
+def calcular_metricas_fechamento_mensal(df: pd.DataFrame, chave: Optional[Tuple] = None) -> Dict[str, Any]:
+    """
+    Métricas do fechamento mensal, cacheadas por (versão do dataset, chave de filtros).
+
+    Args:
+        df: DataFrame com dados de churn (recorte definido por chave)
+        chave: tupla de chave_filtros que identifica o recorte; sem ela calcula direto
+    """
+    return _metricas_versionadas('mensal', _metricas_mensal_versao,
+                                 _calcular_metricas_fechamento_mensal, df, chave)
+
+
+def invalidar_metricas_fechamento():
+    """Descarta as métricas de fechamento cacheadas (nova publicação de dados/metadados)."""
+    _metricas_semanal_versao.clear()
+    _metricas_mensal_versao.clear()
+
+
 # ============================================
 # ABA 1: FECHAMENTO SEMANAL (TÁTICO)
 # ============================================
 
+class MatrizSemanal:
+    """
+    Volumes semanais por laboratório (Semanas_Mes_Atual) em formato de matriz.
+
+    Montada uma vez por versão do dataset: linhas = laboratórios (na ordem do frame
+    de origem), colunas = chaves ISO (iso_year, iso_week) ordenadas. Selecionar uma
+    semana vira uma leitura de colunas, sem json.loads/iterrows a cada rerun.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        coluna = df['Semanas_Mes_Atual'] if 'Semanas_Mes_Atual' in df.columns else pd.Series([None] * len(df), index=df.index)
+        mapas = [self._map_weeks(val) for val in coluna.tolist()]
+        self.chaves: List[Tuple[Any, Any]] = sorted({ky for mapa in mapas for ky in mapa}, key=lambda x: (x[0], x[1]))
+        self.posicao_chave: Dict[Tuple[Any, Any], int] = {ky: j for j, ky in enumerate(self.chaves)}
+        n, m = len(df), len(self.chaves)
+        # volume_util (0 quando ausente/vazio), volume_semana_anterior (NaN quando ausente),
+        # presença da semana no JSON do lab e volume_util da semana anterior existente no JSON do lab
+        self.util = np.zeros((n, m), dtype=float)
+        self.anterior = np.full((n, m), np.nan)
+        self.presente = np.zeros((n, m), dtype=bool)
+        self.util_predecessora = np.full((n, m), np.nan)
+        for i, mapa in enumerate(mapas):
+            colunas = sorted(self.posicao_chave[ky] for ky in mapa)
+            for j in colunas:
+                info = mapa[self.chaves[j]]
+                self.presente[i, j] = True
+                self.util[i, j] = float(info.get('volume_util', 0) or 0)
+                vol_ant = info.get('volume_semana_anterior')
+                if vol_ant is not None:
+                    self.anterior[i, j] = float(vol_ant)
+            for j_prev, j in zip(colunas, colunas[1:]):
+                self.util_predecessora[i, j] = self.util[i, j_prev]
+
+    @staticmethod
+    def _map_weeks(val) -> Dict[Tuple[Any, Any], dict]:
+        try:
+            semanas_json = json.loads(val) if isinstance(val, str) else (val if isinstance(val, list) else [])
+        except Exception:
+            return {}
+        mapa = {}
+        for s in semanas_json:
+            ky = (s.get('iso_year'), s.get('iso_week'))
+            if ky[0] and ky[1]:
+                mapa[ky] = s
+        return mapa
+
+    def volumes(self, df_src: pd.DataFrame, chave_sel: Tuple[int, int],
+                chave_prev: Optional[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Volumes (semana selecionada, semana anterior) para as linhas de df_src.
+
+        A semana anterior vem de volume_semana_anterior; se vazia/zero, da semana
+        chave_prev do lab ou, se o lab não a tiver, da semana imediatamente anterior
+        presente no JSON do próprio lab.
+        """
+        linhas = self.index.get_indexer(df_src.index)
+        n = len(linhas)
+        j_sel = self.posicao_chave.get(chave_sel)
+        if j_sel is not None:
+            vol_atual = self.util[linhas, j_sel]
+            vol_ant = self.anterior[linhas, j_sel]
+            predecessora = self.util_predecessora[linhas, j_sel]
+        else:
+            vol_atual = np.zeros(n)
+            vol_ant = np.full(n, np.nan)
+            predecessora = np.full(n, np.nan)
+        j_prev = self.posicao_chave.get(chave_prev) if chave_prev else None
+        if j_prev is not None:
+            candidato = np.where(self.presente[linhas, j_prev], self.util[linhas, j_prev], predecessora)
+        else:
+            candidato = predecessora
+        substituir = (np.isnan(vol_ant) | (vol_ant == 0)) & ~np.isnan(candidato) & (candidato != 0)
+        vol_ant = np.where(substituir, candidato, vol_ant)
+        return vol_atual, np.nan_to_num(vol_ant, nan=0.0)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _matriz_semanal_versao(versao: str, id_frame: int, _df: pd.DataFrame) -> MatrizSemanal:
+    """MatrizSemanal compartilhada entre sessões para a versão do dataset (e o frame preparado dela)."""
+    return MatrizSemanal(_df)
+
+
+def obter_matriz_semanal(df: pd.DataFrame) -> MatrizSemanal:
+    """
+    Retorna a MatrizSemanal para df. Usa a da versão atual quando df é o dataset
+    preparado compartilhado; para outros frames monta uma matriz avulsa.
+    """
+    versao = st.session_state.get('versao_dados')
+    if versao and df.index.is_unique:
+        matriz = _matriz_semanal_versao(versao, id(df), df)
+        if matriz.index is df.index:
+            return matriz
+    return MatrizSemanal(df)
+
+
 def renderizar_aba_fechamento_semanal(
     df: pd.DataFrame,
     metrics: KPIMetrics,
@@ -2906,7 +3474,9 @@ def renderizar_aba_fechamento_semanal(
     # -------------------------------------------------------------
     # Seleção de fechamento semanal (sem "tempo real")
     # -------------------------------------------------------------
-    metricas_sem = calcular_metricas_fechamento_semanal(df)
+    metricas_sem = calcular_metricas_fechamento_semanal(
+        df, chave=chave_filtros(filtros, 'uf_selecionada', 'portes')
+    )
     met = metricas_sem
     
     # Detectar se estamos na primeira semana do mês
@@ -3018,45 +3588,18 @@ def renderizar_aba_fechamento_semanal(
             except Exception:
                 prev_key = None
 
-        def _map_weeks(val):
-            try:
-                semanas_json = json.loads(val) if isinstance(val, str) else (val if isinstance(val, list) else [])
-            except Exception:
-                return {}
-            mapa = {}
-            for s in semanas_json:
-                ky = (s.get('iso_year'), s.get('iso_week'))
-                if ky[0] and ky[1]:
-                    mapa[ky] = s
-            return mapa
-
         df_out = df_src.copy()
-        vols_atual = []
-        vols_ant = []
-        for _, row in df_out.iterrows():
-            semanas_map = _map_weeks(row.get('Semanas_Mes_Atual', '[]'))
-            atual_info = semanas_map.get((iso_y_sel, iso_w_sel), {})
-            vol_atual = atual_info.get('volume_util', 0) or 0
-            vol_ant = atual_info.get('volume_semana_anterior')
-            
-            # MELHORAR: Se não encontrou, buscar na última semana do JSON (pode ser do mês anterior)
-            if (vol_ant is None or vol_ant == 0):
-                if prev_key and prev_key in semanas_map:
-                    vol_ant = semanas_map[prev_key].get('volume_util', 0) or vol_ant
-                else:
-                    # Fallback: buscar a semana imediatamente anterior no JSON
-                    todas_semanas = sorted(semanas_map.items(), key=lambda x: (x[0][0], x[0][1]))
-                    idx_atual = next((i for i, (k, _) in enumerate(todas_semanas) if k == (iso_y_sel, iso_w_sel)), None)
-                    if idx_atual is not None and idx_atual > 0:
-                        vol_ant = todas_semanas[idx_atual - 1][1].get('volume_util', 0) or vol_ant
-            
-            vols_atual.append(float(vol_atual))
-            vols_ant.append(float(vol_ant) if vol_ant is not None else 0.0)
+        matriz = matriz_semanal
+        if not df_src.index.isin(matriz.index).all():
+            matriz = MatrizSemanal(df_src)
+        vols_atual, vols_ant = matriz.volumes(df_src, (iso_y_sel, iso_w_sel), prev_key)
 
         df_out['WoW_Semana_Atual'] = vols_atual
         df_out['WoW_Semana_Anterior'] = vols_ant
-        return df_out, sum(vols_atual), sum(vols_ant)
+        return df_out, float(vols_atual.sum()), float(vols_ant.sum())
 
+    # Matriz lab × semana ISO da base completa (df é um recorte dela por UF/porte)
+    matriz_semanal = obter_matriz_semanal(df_total if df_total is not None else df)
     df_semana_view, total_semana_atual, total_semana_anterior = _aplicar_semana(df, semana_escolhida, semana_anterior_meta)
     df = df_semana_view
     if 'WoW_Semana_Atual' in df.columns and 'WoW_Semana_Anterior' in df.columns:
@@ -3073,7 +3616,7 @@ def renderizar_aba_fechamento_semanal(
 
     # 1. Cálculos Específicos da Aba
     if 'CNPJ_Normalizado' not in df.columns and 'CNPJ_PCL' in df.columns:
-        df['CNPJ_Normalizado'] = df['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
+        df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ_PCL'])
 
     # Reforçar filtro de porte (garantia mesmo se chamado sem df_view filtrado)
     portes_sel = filtros.get('portes')
@@ -3381,16 +3924,7 @@ def renderizar_aba_fechamento_semanal(
         cols_display_risco = [c for c in cols_risco_view if c in df_risco_display.columns]
         df_risco_display = df_risco_display[cols_display_risco].reset_index(drop=True)
         
-        evento_risco = st.dataframe(
-            df_risco_display,
-            use_container_width=True,
-            hide_index=True,
-            column_config=col_config,
-            selection_mode="single-row",
-            on_select="rerun",
-            key="tbl_risco_sem"
-        )
-        _processar_evento_selecao(evento_risco, df_risco_display)
+        renderizar_tabela_paginada(df_risco_display, key="tbl_risco_sem", column_config=col_config)
         st.caption("Selecione a caixa ao lado do laboratório para abrir automaticamente a Análise Detalhada.")
         
     # Botão de exportação Excel (apenas colunas de exibição)
@@ -3659,16 +4193,7 @@ def renderizar_aba_fechamento_semanal(
             "Ano_Maxima": st.column_config.TextColumn("Ano Máxima", help="Ano da máxima de coletas"),
         })
         
-        evento_recente = st.dataframe(
-            df_perda_recente_display,
-            use_container_width=True,
-            hide_index=True,
-            column_config=col_config_extended,
-            selection_mode="single-row",
-            on_select="rerun",
-            key="tbl_perda_recente"
-        )
-        _processar_evento_selecao(evento_recente, df_perda_recente_display)
+        renderizar_tabela_paginada(df_perda_recente_display, key="tbl_perda_recente", column_config=col_config_extended)
         st.caption("Use a caixa de seleção para abrir automaticamente a Análise Detalhada.")
         
         # Botão de exportação Excel (apenas colunas de exibição)
@@ -3773,16 +4298,7 @@ def renderizar_aba_fechamento_semanal(
         df_antigas_display = adicionar_coluna_detalhes(df_antigas, 'CNPJ_Normalizado')
         df_antigas_display = df_antigas_display[cols_perda_antigas].reset_index(drop=True)
         
-        evento_antiga = st.dataframe(
-            df_antigas_display,
-            use_container_width=True,
-            hide_index=True,
-            column_config=col_config_extended,
-            selection_mode="single-row",
-            on_select="rerun",
-            key="tbl_perda_antiga"
-        )
-        _processar_evento_selecao(evento_antiga, df_antigas_display)
+        renderizar_tabela_paginada(df_antigas_display, key="tbl_perda_antiga", column_config=col_config_extended)
         st.caption("Use a caixa de seleção para abrir automaticamente a Análise Detalhada.")
         
         # Botão de exportação Excel (apenas colunas de exibição)
@@ -4048,7 +4564,7 @@ def renderizar_aba_fechamento_mensal(df: pd.DataFrame, metrics: KPIMetrics, filt
     st.caption("Comparativo: Realizado Mês Atual vs Baseline Mensal (Média dos Melhores Meses Históricos).")
 
     if 'CNPJ_Normalizado' not in df.columns and 'CNPJ_PCL' in df.columns:
-        df['CNPJ_Normalizado'] = df['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
+        df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ_PCL'])
 
     portes_sel = filtros.get('portes')
     if portes_sel and 'Porte' in df.columns:
@@ -4063,7 +4579,7 @@ def renderizar_aba_fechamento_mensal(df: pd.DataFrame, metrics: KPIMetrics, filt
     ano_mes_anterior = ano_atual - 1 if mes_atual == 1 else ano_atual
     col_mes_anterior = f"N_Coletas_{meses_nomes[mes_anterior - 1]}_{str(ano_mes_anterior)[-2:]}"
 
-    df_mensal = df.copy()
+    df_mensal = df.copy(deep=False)
     # Remover laboratórios que não devem aparecer (ex.: Laboratório Cairo)
     if 'Nome_Fantasia_PCL' in df_mensal.columns:
         df_mensal = df_mensal[~df_mensal['Nome_Fantasia_PCL'].str.contains('cairo', case=False, na=False)]
@@ -4136,7 +4652,14 @@ def renderizar_aba_fechamento_mensal(df: pd.DataFrame, metrics: KPIMetrics, filt
     # ============================================================
     # KPI BOX EXECUTIVO - TOPO DA ABA MENSAL (com filtros aplicados)
     # ============================================================
-    metricas_mensal = calcular_metricas_fechamento_mensal(df_mensal_filtrado)
+    metricas_mensal = calcular_metricas_fechamento_mensal(
+        df_mensal_filtrado,
+        chave=chave_filtros(
+            filtros, 'uf_selecionada', 'portes',
+            variacao_baseline=variacao_baseline_sel,
+            variacao_mes_anterior=variacao_mes_ant_sel
+        )
+    )
     met_mensal = metricas_mensal
     resumo_mensal = met_mensal.get('resumo_mensal', {})
 
@@ -4289,10 +4812,9 @@ def renderizar_aba_fechamento_mensal(df: pd.DataFrame, metrics: KPIMetrics, filt
 
     df_mensal_display = adicionar_coluna_detalhes(df_sorted[cols_final], 'CNPJ_Normalizado')
     df_mensal_display = df_mensal_display[cols_final].reset_index(drop=True)
-    evento_mensal = st.dataframe(
+    renderizar_tabela_paginada(
         df_mensal_display,
-        use_container_width=True,
-        hide_index=True,
+        key="tbl_mensal_master",
         column_config={
             "Nome_Fantasia_PCL": st.column_config.TextColumn("Laboratório", width="medium", help="Nome fantasia cadastrado no CRM"),
             "CNPJ_Normalizado": st.column_config.TextColumn("CNPJ", width="medium", help="Identificador único (apenas números)"),
@@ -4311,12 +4833,8 @@ def renderizar_aba_fechamento_mensal(df: pd.DataFrame, metrics: KPIMetrics, filt
             "Baseline_Estado_Porte": st.column_config.NumberColumn("Média Mensal Estado (baseline)", format="%d", help="Média dos 3 maiores meses dos labs do mesmo porte no mesmo estado"),
             "Variacao_Estado_Pct": st.column_config.NumberColumn("Variação % vs Média Estado", format="%.1f%%", help="Comparação do realizado com a média do estado"),
             "Status_Exibicao": st.column_config.TextColumn("Em_Risco / Status", width="small", help="Sim/Não ou Perda, quando aplicável")
-        },
-        selection_mode="single-row",
-        on_select="rerun",
-        key="tbl_mensal_master"
+        }
     )
-    _processar_evento_selecao(evento_mensal, df_mensal_display)
     st.caption("Use a caixa de seleção para abrir automaticamente a Análise Detalhada.")
 
     # Botão Exportação Excel Mensal (apenas colunas de exibição)
@@ -4439,6 +4957,385 @@ def exibir_helper_icone(chave_helper: str, label: str = "ℹ️"):
             st.info(HELPERS_V2[chave_helper])
 
 
+class IndiceFiltros:
+    """
+    Índice pré-computado dos filtros da sidebar para uma versão do dataset.
+
+    Guarda os códigos (pd.factorize) de UF, porte e representante e o bitmap de
+    pertencimento à lista VIP (montado no primeiro uso do filtro VIP), de modo que
+    cada combinação de filtros se resolve com comparações sobre arrays numpy.
+    """
+    COLUNAS_CATEGORICAS = ('Estado', 'Porte', 'Representante_Nome')
+
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        self.index = df.index
+        self.codigos: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        for coluna in self.COLUNAS_CATEGORICAS:
+            if coluna in df.columns:
+                codigos, categorias = pd.factorize(df[coluna])
+                self.codigos[coluna] = (codigos, pd.Index(categorias))
+        self._df = df
+        self._vip: Optional[np.ndarray] = None
+        self._erro_vip: Optional[str] = None
+        self._vip_montado = False
+        self._vip_lock = threading.Lock()
+
+    @property
+    def vip(self) -> Optional[np.ndarray]:
+        """Bitmap VIP, montado só quando o filtro VIP é usado pela primeira vez."""
+        self._garantir_bitmap_vip()
+        return self._vip
+
+    @property
+    def erro_vip(self) -> Optional[str]:
+        self._garantir_bitmap_vip()
+        return self._erro_vip
+
+    def _garantir_bitmap_vip(self):
+        with self._vip_lock:
+            if not self._vip_montado:
+                self._montar_bitmap_vip(self._df)
+                self._vip_montado = True
+                self._df = None
+
+    def _montar_bitmap_vip(self, df: pd.DataFrame):
+        """Bitmap de linhas cujo CNPJ está na lista VIP (None se a lista estiver indisponível)."""
+        if 'CNPJ_PCL' not in df.columns:
+            return
+        try:
+            df_vip = DataManager.carregar_dados_vip()
+            if df_vip is None or df_vip.empty or 'CNPJ' not in df_vip.columns:
+                return
+            cnpjs_vip = somente_digitos_serie(df_vip['CNPJ'])
+            cnpjs_vip = cnpjs_vip[cnpjs_vip != '']
+            if cnpjs_vip.empty:
+                return
+            cnpjs = somente_digitos_serie(df['CNPJ_PCL'])
+            self._vip = ((cnpjs != '') & cnpjs.isin(cnpjs_vip.unique())).to_numpy()
+        except Exception as e:
+            self._erro_vip = str(e)
+
+    def mascara_valores(self, coluna: str, valores: List[Any]) -> np.ndarray:
+        """Máscara booleana das linhas cujo valor da coluna está em valores."""
+        codigos, categorias = self.codigos[coluna]
+        selecionados = categorias.get_indexer(pd.Index(list(valores)).unique())
+        selecionados = selecionados[selecionados >= 0]
+        if len(selecionados) == 0:
+            return np.zeros(self.n, dtype=bool)
+        return np.isin(codigos, selecionados)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_filtros_versao(versao: str, id_frame: int, _df: pd.DataFrame) -> IndiceFiltros:
+    """IndiceFiltros compartilhado entre sessões para a versão do dataset (e o frame preparado dela)."""
+    return IndiceFiltros(_df)
+
+
+def obter_indice_filtros(df: pd.DataFrame) -> IndiceFiltros:
+    """
+    Retorna o índice de filtros para df. Usa o índice da versão atual quando df é
+    o dataset preparado compartilhado; para outros frames monta um índice avulso.
+    """
+    versao = st.session_state.get('versao_dados')
+    if versao:
+        indice = _indice_filtros_versao(versao, id(df), df)
+        if indice.index is df.index:
+            return indice
+    return IndiceFiltros(df)
+
+
+def _cnpjs_normalizados(df: pd.DataFrame) -> pd.Series:
+    """CNPJ_Normalizado de df (normalizado do CNPJ_PCL quando a coluna não existe)."""
+    if 'CNPJ_Normalizado' in df.columns:
+        return df['CNPJ_Normalizado']
+    return normalizar_cnpjs(df['CNPJ_PCL'])
+
+
+def _linhas_no_recorte(index_base: pd.Index, cnpjs_base: np.ndarray, df: pd.DataFrame,
+                       posicoes: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Posições em df das linhas `posicoes` do frame indexado, na mesma ordem (as que
+    não estão no recorte ficam de fora). None quando df não é o frame indexado nem
+    um recorte dele que se possa conferir pelo CNPJ.
+    """
+    if df.index is index_base:
+        return posicoes
+    if not df.index.is_unique or not ('CNPJ_Normalizado' in df.columns or 'CNPJ_PCL' in df.columns):
+        return None
+    linhas = df.index.get_indexer(index_base[posicoes])
+    encontradas = linhas >= 0
+    linhas = linhas[encontradas]
+    if len(linhas) and not (_cnpjs_normalizados(df.iloc[linhas]).to_numpy() == cnpjs_base[posicoes[encontradas]]).all():
+        return None
+    return linhas
+
+
+class IndiceLaboratorios:
+    """
+    Posições dos laboratórios no dataset preparado de uma versão.
+
+    Mapeia CNPJ normalizado -> posição da linha e nome fantasia normalizado
+    (normalizar_nome) -> posições. Páginas de detalhe, deep links e gráficos do lab
+    resolvem o laboratório com consultas a dicionário em vez de varrer (e copiar)
+    o frame a cada rerun.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        if 'CNPJ_Normalizado' in df.columns or 'CNPJ_PCL' in df.columns:
+            cnpjs = _cnpjs_normalizados(df).fillna('')
+        else:
+            cnpjs = pd.Series('', index=df.index, dtype=object)
+        nomes = (normalizar_nomes(df['Nome_Fantasia_PCL']) if 'Nome_Fantasia_PCL' in df.columns
+                 else pd.Series('', index=df.index, dtype=object))
+        self.cnpjs = cnpjs.to_numpy()
+        self._por_cnpj, self._cnpj_repetido = self._mapear(cnpjs)
+        self._por_nome, self._nome_repetido = self._mapear(nomes)
+
+    @staticmethod
+    def _mapear(chaves: pd.Series) -> Tuple[Dict[Any, int], Dict[Any, np.ndarray]]:
+        """Chave -> primeira posição e, só para chaves repetidas, chave -> todas as posições."""
+        codigos, unicos = pd.factorize(chaves.where(chaves != ''))
+        posicoes = np.flatnonzero(codigos >= 0)
+        ordem = np.argsort(codigos[posicoes], kind='stable')
+        posicoes = posicoes[ordem]
+        inicios = np.searchsorted(codigos[posicoes], np.arange(len(unicos) + 1))
+        primeiras = dict(zip(unicos.tolist(), posicoes[inicios[:-1]].tolist()))
+        repetidas = {
+            unicos[k]: posicoes[inicios[k]:inicios[k + 1]]
+            for k in np.flatnonzero(np.diff(inicios) > 1)
+        }
+        return primeiras, repetidas
+
+    def posicoes(self, lab_cnpj: Optional[str] = None, lab_nome: Optional[str] = None) -> np.ndarray:
+        """Posições (no frame indexado) do CNPJ ou, sem CNPJ, do nome normalizado."""
+        if lab_cnpj:
+            chave, primeiras, repetidas = lab_cnpj, self._por_cnpj, self._cnpj_repetido
+        else:
+            chave, primeiras, repetidas = normalizar_nome(lab_nome), self._por_nome, self._nome_repetido
+        if chave in repetidas:
+            return repetidas[chave]
+        posicao = primeiras.get(chave)
+        return np.array([posicao] if posicao is not None else [], dtype=np.intp)
+
+    def localizar(self, df: pd.DataFrame, lab_cnpj: Optional[str] = None,
+                  lab_nome: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Linhas de df com o CNPJ (ou o Nome_Fantasia_PCL exato) do laboratório.
+
+        Vale para o frame indexado e para recortes dele (filtros da sidebar, colunas
+        extras): as linhas candidatas são conferidas pelo CNPJ. Retorna None quando o
+        índice não permite concluir (frame com outro índice, lab ausente do recorte);
+        nesse caso o chamador varre df.
+        """
+        linhas = _linhas_no_recorte(self.index, self.cnpjs, df, self.posicoes(lab_cnpj, lab_nome))
+        if linhas is None or (not len(linhas) and df.index is not self.index):
+            return None
+        lab = df.iloc[np.sort(linhas)]
+        if not lab_cnpj:
+            lab = lab[lab['Nome_Fantasia_PCL'] == lab_nome]
+        return lab
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_laboratorios_versao(versao: str, id_frame: int, _df: pd.DataFrame) -> IndiceLaboratorios:
+    """IndiceLaboratorios compartilhado entre sessões para a versão do dataset (e o frame preparado dela)."""
+    return IndiceLaboratorios(_df)
+
+
+def _dataset_da_sessao() -> Optional[Tuple[str, pd.DataFrame]]:
+    """
+    (versão, frame) publicados pelo AtualizadorDataset quando são a versão desta
+    sessão (None antes da primeira carga ou se outra versão já foi publicada).
+    """
+    versao = st.session_state.get('versao_dados')
+    atual = _obter_atualizador_dataset().atual()
+    if not versao or atual is None or atual[0] != versao:
+        return None
+    return atual
+
+
+def obter_indice_laboratorios() -> Optional[IndiceLaboratorios]:
+    """IndiceLaboratorios do dataset preparado da versão desta sessão (None sem ele)."""
+    atual = _dataset_da_sessao()
+    if atual is None:
+        return None
+    return _indice_laboratorios_versao(atual[0], id(atual[1]), atual[1])
+
+
+def localizar_laboratorio(df: pd.DataFrame, lab_cnpj: Optional[str] = None, lab_nome: Optional[str] = None,
+                          nome_como_reserva: bool = False) -> pd.DataFrame:
+    """
+    Linhas de df do laboratório, sem copiar df.
+
+    Procura pelo CNPJ normalizado quando informado (e df tem CNPJ); senão pelo
+    Nome_Fantasia_PCL exato. Com nome_como_reserva, cai no nome quando o CNPJ não
+    encontra nada. Usa o IndiceLaboratorios da versão e só varre df quando o índice
+    não se aplica ao frame.
+    """
+    indice = obter_indice_laboratorios()
+    buscas = []
+    if lab_cnpj and ('CNPJ_Normalizado' in df.columns or 'CNPJ_PCL' in df.columns):
+        buscas.append((lab_cnpj, None))
+        if nome_como_reserva and lab_nome and 'Nome_Fantasia_PCL' in df.columns:
+            buscas.append((None, lab_nome))
+    elif lab_nome and 'Nome_Fantasia_PCL' in df.columns:
+        buscas.append((None, lab_nome))
+    lab = df.iloc[0:0]
+    for cnpj, nome in buscas:
+        lab = indice.localizar(df, cnpj, nome) if indice is not None else None
+        if lab is None:
+            lab = df[_cnpjs_normalizados(df) == cnpj] if cnpj else df[df['Nome_Fantasia_PCL'] == nome]
+        if not lab.empty:
+            break
+    return lab
+
+
+class IndiceBusca:
+    """
+    Índice de busca textual dos laboratórios de uma versão do dataset.
+
+    Nome fantasia, razão social e cidade normalizados (normalizar_termo) viram
+    trigramas em listas invertidas ordenadas (trigrama -> posições) e os CNPJs
+    ficam ordenados para busca por prefixo com searchsorted. Cada busca soma os
+    trigramas em comum por linha e devolve as posições mais parecidas, sem varrer
+    as colunas de texto do frame a cada tecla.
+    """
+    CAMPOS = ('Nome_Fantasia_PCL', 'Razao_Social_PCL', 'Cidade')
+    SEPARADOR = ord('\n')
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        self.n = len(df)
+        if 'CNPJ_Normalizado' in df.columns or 'CNPJ_PCL' in df.columns:
+            self.cnpjs = _cnpjs_normalizados(df).fillna('').to_numpy()
+        else:
+            self.cnpjs = np.full(self.n, '', dtype=object)
+        cnpjs_str = self.cnpjs.astype(str)
+        self._ordem_cnpj = np.argsort(cnpjs_str, kind='stable')
+        self._cnpjs_ordenados = cnpjs_str[self._ordem_cnpj]
+        campos = [normalizar_termos(df[c]) for c in self.CAMPOS if c in df.columns]
+        vazio = pd.Series('', index=df.index, dtype=object)
+        self.nomes = (campos[0] if 'Nome_Fantasia_PCL' in df.columns else vazio).to_numpy()
+        textos = pd.Series(' ', index=df.index, dtype=object)
+        for campo in campos:
+            textos = textos + campo + ' '
+        self.textos = textos.to_numpy()
+        self._montar_trigramas(textos.tolist())
+
+    @staticmethod
+    def _codigos_trigramas(caracteres: np.ndarray) -> np.ndarray:
+        caracteres = caracteres.astype(np.int64)
+        return caracteres[:-2] << 16 | caracteres[1:-1] << 8 | caracteres[2:]
+
+    def _montar_trigramas(self, textos: List[str]):
+        """Listas invertidas: trigramas únicos ordenados e, para cada um, as posições que o contêm."""
+        caracteres = np.frombuffer('\n'.join(textos).encode('ascii'), dtype=np.uint8)
+        tamanhos = np.fromiter(map(len, textos), dtype=np.int64, count=len(textos))
+        linhas = np.repeat(np.arange(len(textos), dtype=np.int64), tamanhos + 1)[:len(caracteres)]
+        separador = caracteres == self.SEPARADOR
+        validos = ~(separador[:-2] | separador[1:-1] | separador[2:])
+        codigos = self._codigos_trigramas(caracteres)[validos]
+        pares = np.sort(codigos << 32 | linhas[:len(validos)][validos])
+        pares = pares[np.r_[True, pares[1:] != pares[:-1]]] if len(pares) else pares
+        trigramas = pares >> 32
+        inicios = np.flatnonzero(np.r_[True, trigramas[1:] != trigramas[:-1]]) if len(pares) else np.array([], dtype=np.intp)
+        self._trigramas = trigramas[inicios]
+        self._inicios = np.append(inicios, len(pares))
+        self._posicoes = (pares & 0xFFFFFFFF).astype(np.int32)
+
+    def _achados(self, trigramas: np.ndarray) -> np.ndarray:
+        """Índices (em self._trigramas) dos trigramas da busca presentes no índice."""
+        achados = np.searchsorted(self._trigramas, trigramas)
+        achados = achados[achados < len(self._trigramas)]
+        return achados[np.isin(self._trigramas[achados], trigramas)]
+
+    def _contendo(self, termo: str) -> np.ndarray:
+        """
+        Posições cujo texto contém o termo em qualquer ponto (ex.: 'LAB' em 'BIOLAB'),
+        pela interseção das listas dos trigramas do termo, conferida com `in`.
+        """
+        trigramas = np.unique(self._codigos_trigramas(np.frombuffer(termo.encode('ascii'), dtype=np.uint8)))
+        if len(trigramas):
+            achados = self._achados(trigramas)
+            if len(achados) < len(trigramas):
+                return np.array([], dtype=np.intp)
+            listas = sorted((self._posicoes[self._inicios[k]:self._inicios[k + 1]] for k in achados), key=len)
+            posicoes = listas[0]
+            for lista in listas[1:]:
+                posicoes = np.intersect1d(posicoes, lista, assume_unique=True)
+        else:
+            posicoes = np.arange(self.n)
+        return np.fromiter((p for p in posicoes if termo in self.textos[p]), dtype=np.intp)
+
+    def _buscar_cnpj(self, prefixo: str) -> np.ndarray:
+        """Posições (na ordem do frame) dos CNPJs que começam com prefixo."""
+        if len(prefixo) > 14:
+            return np.array([], dtype=np.intp)
+        inicio = np.searchsorted(self._cnpjs_ordenados, prefixo, side='left')
+        fim = np.searchsorted(self._cnpjs_ordenados, prefixo + '9' * (14 - len(prefixo)), side='right')
+        return np.sort(self._ordem_cnpj[inicio:fim])
+
+    def buscar(self, busca: str, similaridade_minima: float = BUSCA_LABS_SIMILARIDADE_MINIMA) -> np.ndarray:
+        """
+        Posições dos laboratórios que casam com a busca, da mais à menos parecida.
+
+        Busca só com dígitos (e pontuação) é prefixo de CNPJ. Para texto, entram os
+        laboratórios que contêm o termo em qualquer ponto (como o antigo str.contains)
+        e os com similaridade mínima; o ranking é pela fração dos trigramas da busca
+        presentes no laboratório e, no empate, vêm antes
+        os que contêm o termo como palavras inteiras, depois os que o contêm em
+        qualquer ponto e os de nome fantasia começando por ele.
+        """
+        termo = normalizar_termo(busca)
+        if not termo:
+            return np.array([], dtype=np.intp)
+        if termo.replace(' ', '').isdigit():
+            return self._buscar_cnpj(somente_digitos(busca))
+        trigramas = np.unique(self._codigos_trigramas(np.frombuffer((' ' + termo).encode('ascii'), dtype=np.uint8)))
+        achados = self._achados(trigramas)
+        if len(achados):
+            posicoes = np.concatenate([self._posicoes[self._inicios[k]:self._inicios[k + 1]] for k in achados])
+            similaridade = np.bincount(posicoes, minlength=self.n) / len(trigramas)
+        else:
+            similaridade = np.zeros(self.n)
+        candidatos = np.union1d(np.flatnonzero(similaridade >= similaridade_minima), self._contendo(termo))
+        palavras = f' {termo} '
+        inteiro = np.fromiter((palavras in self.textos[p] for p in candidatos), dtype=bool, count=len(candidatos))
+        contem = np.fromiter((termo in self.textos[p] for p in candidatos), dtype=bool, count=len(candidatos))
+        prefixo = np.fromiter((self.nomes[p].startswith(termo) for p in candidatos), dtype=bool, count=len(candidatos))
+        return candidatos[np.lexsort((candidatos, ~prefixo, ~contem, ~inteiro, -similaridade[candidatos]))]
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _indice_busca_versao(versao: str, id_frame: int, _df: pd.DataFrame) -> IndiceBusca:
+    """IndiceBusca compartilhado entre sessões para a versão do dataset (e o frame preparado dela)."""
+    return IndiceBusca(_df)
+
+
+def buscar_laboratorios(df: pd.DataFrame, busca: str, limite: Optional[int] = BUSCA_LABS_TOP_K) -> pd.DataFrame:
+    """
+    Laboratórios de df mais parecidos com a busca (nome fantasia, razão social,
+    cidade ou prefixo de CNPJ), do mais ao menos parecido: um por CNPJ, sem CNPJ
+    vazio e no máximo `limite` (None = todos).
+
+    Usa o IndiceBusca da versão desta sessão; frames que não são recortes dele
+    ganham um índice avulso.
+    """
+    linhas = None
+    atual = _dataset_da_sessao()
+    if atual is not None:
+        indice = _indice_busca_versao(atual[0], id(atual[1]), atual[1])
+        linhas = _linhas_no_recorte(indice.index, indice.cnpjs, df, indice.buscar(busca))
+    if linhas is None:
+        linhas = IndiceBusca(df).buscar(busca)
+    encontrados = df.iloc[linhas]
+    cnpjs = _cnpjs_normalizados(encontrados)
+    encontrados = encontrados[(cnpjs != '').to_numpy() & ~cnpjs.duplicated().to_numpy()]
+    return encontrados if limite is None else encontrados.head(limite)
+
+
 class FilterManager:
     """Gerenciador de filtros da interface."""
     def __init__(self):
@@ -4585,53 +5482,35 @@ class FilterManager:
         self.filtros = filtros
         return filtros
     def aplicar_filtros(self, df: pd.DataFrame, filtros: Dict[str, Any]) -> pd.DataFrame:
-        """Aplica filtros otimizados ao DataFrame - Atualizado para coerência."""
+        """
+        Aplica filtros otimizados ao DataFrame - Atualizado para coerência.
+
+        Os filtros são resolvidos sobre o IndiceFiltros da versão atual do dataset:
+        cada critério vira uma máscara booleana, combinadas com um único AND e
+        materializadas com take (sem copiar a base inteira quando nada é filtrado).
+        """
         if df.empty:
             return df
-        df_filtrado = df.copy()
+        indice = obter_indice_filtros(df)
+        mascara = np.ones(indice.n, dtype=bool)
         
         # ===== FILTRO UF (SISTEMA V2 - PRIORITÁRIO) =====
         if filtros.get('uf_selecionada') and filtros['uf_selecionada'] != 'Todas':
-            if 'Estado' in df_filtrado.columns:
-                df_filtrado = df_filtrado[df_filtrado['Estado'] == filtros['uf_selecionada']]
+            if 'Estado' in df.columns:
+                mascara &= indice.mascara_valores('Estado', [filtros['uf_selecionada']])
         
         # Filtro VIP (sempre ativo)
         if filtros.get('apenas_vip', False):
-            try:
-                # Carregar dados VIP
-                df_vip = DataManager.carregar_dados_vip()
-                if df_vip is not None and not df_vip.empty:
-                    # Normalizar CNPJs para match com tratamento de erro
-                    df_filtrado['CNPJ_Normalizado'] = df_filtrado['CNPJ_PCL'].apply(
-                        lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) and str(x).strip() != '' else ''
-                    )
-                    df_vip['CNPJ_Normalizado'] = df_vip['CNPJ'].apply(
-                        lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) and str(x).strip() != '' else ''
-                    )
-                 
-                    # Filtrar apenas registros que estão na lista VIP (com validação)
-                    if 'CNPJ_Normalizado' in df_filtrado.columns and 'CNPJ_Normalizado' in df_vip.columns:
-                        # Remover CNPJs vazios antes do match
-                        df_filtrado = df_filtrado[df_filtrado['CNPJ_Normalizado'] != '']
-                        df_vip_clean = df_vip[df_vip['CNPJ_Normalizado'] != '']
-                     
-                        if not df_vip_clean.empty:
-                            df_filtrado = df_filtrado[df_filtrado['CNPJ_Normalizado'].isin(df_vip_clean['CNPJ_Normalizado'])]
-                        else:
-                            # Se não há CNPJs válidos na lista VIP, retornar DataFrame vazio
-                            return pd.DataFrame()
-                    else:
-                        # Se as colunas não existem, retornar DataFrame vazio
-                        return pd.DataFrame()
-                else:
-                    # Se não há dados VIP, retornar DataFrame vazio
-                    return pd.DataFrame()
-            except Exception as e:
+            if indice.erro_vip:
                 # Em caso de erro, retornar DataFrame vazio e log do erro
-                st.error(f"Erro ao aplicar filtro VIP: {str(e)}")
+                st.error(f"Erro ao aplicar filtro VIP: {indice.erro_vip}")
                 return pd.DataFrame()
+            if indice.vip is None:
+                # Sem dados VIP (ou sem CNPJs válidos na lista), retornar DataFrame vazio
+                return pd.DataFrame()
+            mascara &= indice.vip
         # Filtro por período (compatibilidade com filtros antigos)
-        if 'Data_Analise' in df_filtrado.columns and filtros.get('data_inicio') and filtros.get('data_fim'):
+        if 'Data_Analise' in df.columns and filtros.get('data_inicio') and filtros.get('data_fim'):
             try:
                 # Garantir que as datas sejam do tipo date
                 data_inicio = filtros['data_inicio']
@@ -4641,34 +5520,32 @@ class FilterManager:
                     data_inicio = data_inicio.date()
                 if hasattr(data_fim, 'date'):
                     data_fim = data_fim.date()
-                # Verificar se a coluna Data_Analise é do tipo datetime
-                if df_filtrado['Data_Analise'].dtype == 'object':
-                    # Tentar converter para datetime
-                    df_filtrado['Data_Analise'] = pd.to_datetime(df_filtrado['Data_Analise'], errors='coerce')
+                datas = df['Data_Analise']
+                if datas.dtype == 'object':
+                    datas = pd.to_datetime(datas, errors='coerce')
                 # Aplicar filtro apenas se a conversão foi bem-sucedida
-                if df_filtrado['Data_Analise'].dtype.name.startswith('datetime'):
-                    df_filtrado = df_filtrado[
-                        (df_filtrado['Data_Analise'].dt.date >= data_inicio) &
-                        (df_filtrado['Data_Analise'].dt.date <= data_fim)
-                    ]
+                if datas.dtype.name.startswith('datetime'):
+                    datas = datas.dt.date
+                    mascara &= ((datas >= data_inicio) & (datas <= data_fim)).to_numpy()
             except Exception as e:
                 # Em caso de erro no filtro de data, continuar sem filtrar
                 st.warning(f"Aviso: Erro ao aplicar filtro de período: {str(e)}")
-                pass
         # Filtro por representante
         representantes_sel = filtros.get('representantes', [])
-        if representantes_sel and 'Representante_Nome' in df_filtrado.columns:
-            df_filtrado = df_filtrado[df_filtrado['Representante_Nome'].isin(representantes_sel)]
+        if representantes_sel and 'Representante_Nome' in df.columns:
+            mascara &= indice.mascara_valores('Representante_Nome', representantes_sel)
         
         # Filtro por porte
         portes_sel = filtros.get('portes', [])
-        if portes_sel and 'Porte' in df_filtrado.columns:
-            df_filtrado = df_filtrado[df_filtrado['Porte'].isin(portes_sel)]
+        if portes_sel and 'Porte' in df.columns:
+            mascara &= indice.mascara_valores('Porte', portes_sel)
         
         # Para dados mensais, o filtro principal será usado nos cálculos dos gráficos
         # Os filtros 'ano_selecionado', 'meses_selecionados' e 'sufixo_ano' são usados
         # diretamente nas funções de cálculo dos gráficos
-        return df_filtrado
+        if mascara.all():
+            return df
+        return df.take(np.flatnonzero(mascara))
 class KPIManager:
     """Gerenciador de cálculos de KPIs - Atualizado para coerência entre telas."""
     @staticmethod
@@ -4741,6 +5618,326 @@ class KPIManager:
             metrics.ativos_7d = metrics.ativos_7d_count / metrics.total_labs * 100
             metrics.ativos_30d = metrics.ativos_30d_count / metrics.total_labs * 100
         return metrics
+class SeriesGraficos:
+    """
+    Matriz laboratório × dia de 'Dados_Diarios_2025' para os gráficos de séries temporais.
+
+    Montada uma vez por versão do dataset. A série agregada de qualquer recorte
+    (conjunto filtrado, UF, cidade, lab) é uma única redução ponderada sobre a
+    matriz, e as médias móveis prontas para o gráfico ficam num LRU por
+    (assinatura do recorte, nível do contexto, janela da MM).
+    """
+    MAX_SERIES = 128
+
+    def __init__(self, df: pd.DataFrame):
+        self.index = df.index
+        n = len(df)
+        if 'Dados_Diarios_2025' in df.columns:
+            serie_json = df['Dados_Diarios_2025']
+        else:
+            serie_json = pd.Series([None] * n, index=df.index)
+        lab, data, valor = RiskEngine._registros_diarios(serie_json)
+        datas = np.unique(data)
+        coluna = np.searchsorted(datas, data)
+        self.datas = pd.DatetimeIndex(datas.astype('datetime64[ns]'))
+        # Coletas por (lab, dia) e presença do dia no JSON do lab (a série agregada
+        # só tem as datas registradas por ao menos um lab do recorte)
+        self.valores = np.zeros((n, len(datas)), dtype=np.int32)
+        self.valores[lab, coluna] = valor
+        self.presente = np.zeros((n, len(datas)), dtype=np.uint8)
+        self.presente[lab, coluna] = 1
+        self._mes_coluna = self.datas.strftime('%Y-%m').to_numpy()
+        self._dia_coluna = self.datas.day.astype(str).to_numpy()
+        self._series: "OrderedDict[Tuple, pd.Series]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def dias_por_mes(self, posicao: int) -> Dict[str, Dict[str, int]]:
+        """Coletas de um lab no formato do JSON de 'Dados_Diarios_2025' ('AAAA-MM' -> {'dia': coletas})."""
+        colunas = np.flatnonzero(self.presente[posicao])
+        meses: Dict[str, Dict[str, int]] = {}
+        for mes, dia, valor in zip(self._mes_coluna[colunas], self._dia_coluna[colunas],
+                                   self.valores[posicao, colunas].tolist()):
+            meses.setdefault(mes, {})[dia] = valor
+        return meses
+
+    def pesos(self, df_recorte: pd.DataFrame) -> Optional[np.ndarray]:
+        """Peso (nº de ocorrências) de cada linha da matriz em df_recorte; None se alguma linha não pertence a ela."""
+        if not self.index.is_unique:
+            return None
+        posicoes = self.index.get_indexer(df_recorte.index)
+        if (posicoes < 0).any():
+            return None
+        return np.bincount(posicoes, minlength=len(self.index))
+
+    @staticmethod
+    def assinatura(pesos: np.ndarray) -> str:
+        """Assinatura estável de um recorte (linhas selecionadas) para chave de cache."""
+        return hashlib.blake2b(np.ascontiguousarray(pesos, dtype=np.int64).tobytes(), digest_size=16).hexdigest()
+
+    def serie(self, pesos: np.ndarray) -> pd.Series:
+        """Soma diária do recorte definido por pesos (máscara booleana ou contagem por linha)."""
+        pesos = np.asarray(pesos, dtype=np.int64)
+        presente = (pesos @ self.presente) > 0
+        if not presente.any():
+            return pd.Series(dtype="float")
+        total = pesos @ self.valores
+        return pd.Series(total[presente].astype(float), index=self.datas[presente])
+
+    @staticmethod
+    def media_movel_dias_uteis(serie: pd.Series, janela: int) -> pd.Series:
+        """Média móvel de janela dias úteis ao longo da série (fins de semana descartados)."""
+        if serie.empty:
+            return pd.Series(dtype="float")
+        serie = serie.sort_index()
+        serie_uteis = serie[serie.index.weekday < 5]  # Segunda=0 a Sexta=4
+        if serie_uteis.empty:
+            return pd.Series(dtype="float")
+        return serie_uteis.rolling(window=janela, min_periods=1).mean()
+
+    def media_movel(self, assinatura: Any, nivel: str, janela: int, pesos: np.ndarray) -> pd.Series:
+        """MM do recorte, cacheada por (assinatura, nível, janela). Trate o retorno como somente leitura."""
+        chave = (assinatura, nivel, janela)
+        with self._lock:
+            if chave in self._series:
+                self._series.move_to_end(chave)
+                return self._series[chave]
+        mm = self.media_movel_dias_uteis(self.serie(pesos), janela)
+        with self._lock:
+            self._series[chave] = mm
+            while len(self._series) > self.MAX_SERIES:
+                self._series.popitem(last=False)
+        return mm
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _series_graficos_versao(versao: str, id_frame: int, _df: pd.DataFrame) -> SeriesGraficos:
+    """SeriesGraficos compartilhada entre sessões para a versão do dataset (e o frame preparado dela)."""
+    return SeriesGraficos(_df)
+
+
+def obter_series_graficos(df: pd.DataFrame) -> SeriesGraficos:
+    """
+    Retorna a SeriesGraficos para df. Usa a da versão atual quando df é o dataset
+    preparado compartilhado; para outros frames monta uma matriz avulsa.
+    """
+    versao = st.session_state.get('versao_dados')
+    if versao and df.index.is_unique:
+        series = _series_graficos_versao(versao, id(df), df)
+        if series.index is df.index:
+            return series
+    return SeriesGraficos(df)
+
+
+def dados_diarios_lab(lab: pd.Series) -> Dict[str, Dict[str, int]]:
+    """
+    'Dados_Diarios_2025' de uma linha do dataset como dict mês -> {dia: coletas}.
+
+    Linhas do dataset da sessão saem da matriz SeriesGraficos da versão (sem
+    json.loads a cada render); as demais têm o JSON lido na hora. {} se não há dados.
+    """
+    bruto = lab.get('Dados_Diarios_2025')
+    atual = _dataset_da_sessao()
+    if atual is not None and 'Dados_Diarios_2025' in atual[1].columns and atual[1].index.is_unique:
+        series = _series_graficos_versao(atual[0], id(atual[1]), atual[1])
+        posicao = series.index.get_indexer([lab.name])[0]
+        if posicao >= 0 and atual[1]['Dados_Diarios_2025'].iat[posicao] == bruto:
+            return series.dias_por_mes(posicao)
+    if isinstance(bruto, dict):
+        return bruto
+    if not isinstance(bruto, str) or bruto.strip() in ('', '{}', 'null'):
+        return {}
+    try:
+        return json.loads(bruto) or {}
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+
+def assinatura_frame(df: Optional[pd.DataFrame]) -> Optional[str]:
+    """Assinatura das linhas (rótulos do índice) e colunas de um recorte do dataset, para chave de cache."""
+    if df is None:
+        return None
+    h = hashlib.blake2b(digest_size=16)
+    h.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    h.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    return h.hexdigest()
+
+
+class CacheFiguras:
+    """
+    LRU de figuras Plotly serializadas (JSON) compartilhado entre sessões.
+
+    A chave é (gráfico, assinatura das entradas, versão do dataset, dia): um rerun
+    que não muda as entradas de um gráfico o reexibe a partir do JSON, sem refazer
+    agregações nem chamadas ao plotly.express.
+    """
+
+    def __init__(self, max_figuras: int = FIGURAS_CACHE_MAX):
+        self.max_figuras = max_figuras
+        self._figuras: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obter(self, chave: Tuple) -> Optional[str]:
+        with self._lock:
+            figura = self._figuras.get(chave)
+            if figura is None:
+                self.faltas += 1
+                return None
+            self._figuras.move_to_end(chave)
+            self.acertos += 1
+            return figura
+
+    def guardar(self, chave: Tuple, figura: str) -> None:
+        with self._lock:
+            self._figuras[chave] = figura
+            self._figuras.move_to_end(chave)
+            while len(self._figuras) > self.max_figuras:
+                self._figuras.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._figuras.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.acertos + self.faltas
+            return {
+                'figuras': len(self._figuras),
+                'tamanho_mb': sum(len(f) for f in self._figuras.values()) / 2**20,
+                'taxa_acerto': self.acertos / total if total else None,
+            }
+
+
+def indices_lttb(x: np.ndarray, y: np.ndarray, n_saida: int) -> np.ndarray:
+    """
+    Índices dos pontos escolhidos pelo Largest-Triangle-Three-Buckets.
+
+    Mantém o primeiro e o último ponto e, em cada um dos n_saida - 2 baldes, o
+    ponto que forma o maior triângulo com o escolhido no balde anterior e a média
+    do balde seguinte (preserva picos e vales da série).
+    """
+    n = len(x)
+    if n_saida < 3 or n <= n_saida:
+        return np.arange(n)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    limites = np.linspace(1, n - 1, n_saida - 1).astype(np.intp)
+    limites = np.append(limites, n)
+    indices = np.empty(n_saida, dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_saida - 2):
+        inicio, fim = limites[i], limites[i + 1]
+        mx, my = x[fim:limites[i + 2]].mean(), y[fim:limites[i + 2]].mean()
+        areas = np.abs((x[a] - mx) * (y[inicio:fim] - y[a]) - (x[a] - x[inicio:fim]) * (my - y[a]))
+        a = inicio + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def _eixo_numerico(valores: Any) -> np.ndarray:
+    """Eixo x como float para o LTTB (datas viram ns; categorias, a posição)."""
+    valores = np.asarray(valores)
+    if np.issubdtype(valores.dtype, np.number):
+        return valores.astype(float)
+    if np.issubdtype(valores.dtype, np.datetime64):
+        return valores.astype('datetime64[ns]').astype(np.int64).astype(float)
+    try:
+        return pd.to_datetime(valores).asi8.astype(float)
+    except (TypeError, ValueError):
+        return np.arange(len(valores), dtype=float)
+
+
+def otimizar_series_figura(fig: Any, limiar_webgl: int = GRAFICO_LIMIAR_WEBGL,
+                           max_pontos: int = GRAFICO_MAX_PONTOS_SERIE) -> Any:
+    """
+    Reduz as séries de linha longas com LTTB e passa a figura para Scattergl (WebGL)
+    quando o total de pontos de linha passa de limiar_webgl.
+
+    O LTTB só escolhe pontos da série original, então o hover mostra valores exatos;
+    os arrays por ponto (text, customdata, hovertext) acompanham a seleção. Traces que
+    o plotly.express já criou como Scattergl também passam pelo LTTB.
+
+    Hoje é inerte: as linhas exibidas via exibir_figura têm no máximo ~23 pontos por
+    trace (coletas por dia) ou 12 (evolução mensal), abaixo dos dois limiares, e o
+    gráfico de controle BR/UF/cidade, o único com séries diárias longas, não é
+    chamado por nenhuma página.
+    """
+    linhas = [trace for trace in fig.data if trace.type in ('scatter', 'scattergl') and trace.y is not None]
+    if not linhas:
+        return fig
+    for trace in linhas:
+        n = len(trace.y)
+        if n <= max_pontos:
+            continue
+        x = trace.x if trace.x is not None else np.arange(n)
+        indices = indices_lttb(_eixo_numerico(x), np.asarray(trace.y, dtype=float), max_pontos)
+        atualizacao = {}
+        for atributo in ('x', 'y', 'text', 'hovertext', 'customdata'):
+            valores = getattr(trace, atributo)
+            if valores is not None and not isinstance(valores, str) and len(valores) == n:
+                atualizacao[atributo] = np.asarray(valores)[indices]
+        trace.update(atualizacao)
+    if sum(len(trace.y) for trace in linhas) <= limiar_webgl:
+        return fig
+    ids_linhas = {id(trace) for trace in linhas if trace.type == 'scatter'}
+    if not ids_linhas:
+        return fig
+    dados = []
+    for trace in fig.data:
+        if id(trace) in ids_linhas:
+            props = trace.to_plotly_json()
+            props.pop('type', None)
+            if props.get('line', {}).get('shape') == 'spline':
+                props['line']['shape'] = 'linear'  # Scattergl não tem spline
+            trace = go.Scattergl(props, skip_invalid=True)
+        dados.append(trace)
+    return go.Figure(data=dados, layout=fig.layout)
+
+
+@st.cache_resource(show_spinner=False)
+def _obter_cache_figuras() -> CacheFiguras:
+    """Cache de figuras único por processo (compartilhado entre sessões)."""
+    return CacheFiguras()
+
+
+def exibir_figura(grafico: str, entradas: Tuple, construir: Callable[[], Optional[Any]], **kwargs_plotly) -> bool:
+    """
+    Exibe a figura `grafico` para as entradas, do CacheFiguras quando já foi montada
+    nesta versão do dataset; senão chama construir(), passa a figura por
+    otimizar_series_figura e guarda o JSON.
+
+    construir() pode exibir avisos e retornar None (nada é exibido nem guardado).
+    Retorna se uma figura foi exibida. Os kwargs vão para st.plotly_chart.
+
+    Na prática só os gráficos de um laboratório (média diária, coletas por dia,
+    evolução mensal) e a evolução mensal agregada passam por aqui: distribuição
+    de risco, top laboratórios e controle BR/UF/cidade não têm chamador.
+    """
+    versao = st.session_state.get('versao_dados')
+    if not versao:
+        figura = construir()
+        if figura is None:
+            return False
+        st.plotly_chart(otimizar_series_figura(figura), **kwargs_plotly)
+        return True
+    cache = _obter_cache_figuras()
+    chave = (grafico, entradas, versao, datetime.now().strftime('%Y-%m-%d'))
+    figura_json = cache.obter(chave)
+    if figura_json is None:
+        figura = construir()
+        if figura is None:
+            return False
+        figura = otimizar_series_figura(figura)
+        cache.guardar(chave, figura.to_json())
+    else:
+        # JSON gerado de uma figura já validada: remonta sem revalidar cada trace
+        figura = go.Figure(json.loads(figura_json), _validate=False)
+    st.plotly_chart(figura, **kwargs_plotly)
+    logger.debug(f"Cache figuras: {cache.estatisticas()}")
+    return True
+
+
 class ChartManager:
     """Gerenciador de criação de gráficos - Atualizado com correções de bugs e layouts."""
     @staticmethod
@@ -4864,34 +6061,38 @@ class ChartManager:
         if 'Risco_Diario' not in df.columns:
             st.warning("⚠️ Coluna 'Risco_Diario' não encontrada nos dados.")
             return
-        status_counts = df['Risco_Diario'].value_counts()
-        cores_map = {
-            '🟢 Normal': '#16A34A',
-            '🟡 Atenção': '#F59E0B',
-            '🟠 Moderado': '#FB923C',
-            '🔴 Alto': '#DC2626',
-            '⚫ Crítico': '#111827'
-        }
-        fig = px.pie(
-            values=status_counts.values,
-            names=status_counts.index,
-            title="📊 Distribuição de Risco Diário<br><sup>Baseado em dias úteis e reduções vs. MM7_BR/MM7_UF/MM7_CIDADE</sup>",
-            color=status_counts.index,
-            color_discrete_map=cores_map
-        )
-        fig.update_traces(
-            textposition='inside',
-            textinfo='percent+label+value',
-            texttemplate='%{label}<br>%{value} labs<br>(%{percent})',
-            hovertemplate='<b>%{label}</b><br>%{value} laboratórios<br>%{percent}<extra></extra>'
-        )
-        fig.update_layout(
-            showlegend=True,
-            legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
-            height=500,
-            margin=dict(l=40, r=40, t=40, b=40)
-        )
-        st.plotly_chart(fig, width='stretch')
+        def construir():
+            """Figura da distribuição de risco (guardada no CacheFiguras)."""
+            status_counts = df['Risco_Diario'].value_counts()
+            cores_map = {
+                '🟢 Normal': '#16A34A',
+                '🟡 Atenção': '#F59E0B',
+                '🟠 Moderado': '#FB923C',
+                '🔴 Alto': '#DC2626',
+                '⚫ Crítico': '#111827'
+            }
+            fig = px.pie(
+                values=status_counts.values,
+                names=status_counts.index,
+                title="📊 Distribuição de Risco Diário<br><sup>Baseado em dias úteis e reduções vs. MM7_BR/MM7_UF/MM7_CIDADE</sup>",
+                color=status_counts.index,
+                color_discrete_map=cores_map
+            )
+            fig.update_traces(
+                textposition='inside',
+                textinfo='percent+label+value',
+                texttemplate='%{label}<br>%{value} labs<br>(%{percent})',
+                hovertemplate='<b>%{label}</b><br>%{value} laboratórios<br>%{percent}<extra></extra>'
+            )
+            fig.update_layout(
+                showlegend=True,
+                legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5),
+                height=500,
+                margin=dict(l=40, r=40, t=40, b=40)
+            )
+            return fig
+
+        exibir_figura('distribuicao_risco', (assinatura_frame(df),), construir, width='stretch')
     @staticmethod
     def criar_grafico_top_labs(df: pd.DataFrame, top_n: int = 10):
         if df.empty:
@@ -4900,36 +6101,40 @@ class ChartManager:
         if 'Risco_Diario' not in df.columns:
             st.warning("⚠️ Coluna 'Risco_Diario' não encontrada nos dados.")
             return
-        labs_risco = df[df['Risco_Diario'].isin(['🟠 Moderado', '🔴 Alto', '⚫ Crítico'])].copy()
-        if labs_risco.empty:
-            st.info("✅ Nenhum laboratório em risco encontrado!")
-            return
-        # Ordenar por maior queda vs MM7 e menor volume do dia
-        if 'Delta_MM7' in labs_risco.columns:
-            labs_risco = labs_risco.sort_values(['Delta_MM7', 'Vol_Hoje'], ascending=[True, True])
-        else:
-            labs_risco = labs_risco.sort_values('Vol_Hoje', ascending=True)
-        cores_map = {'🟠 Moderado': '#FB923C', '🔴 Alto': '#DC2626', '⚫ Crítico': '#111827'}
-        fig = px.bar(
-            labs_risco.head(top_n),
-            x='Vol_Hoje',
-            y='Nome_Fantasia_PCL',
-            orientation='h',
-            title=f"🚨 Top {top_n} Laboratórios em Risco (Diário)<br><sup>Classificação baseada em dias úteis</sup>",
-            color='Risco_Diario',
-            color_discrete_map=cores_map,
-            text='Delta_MM7'
-        )
-        fig.update_traces(texttemplate='%{text:.1f}% vs MM7', textposition='outside')
-        fig.update_layout(
-            yaxis={'categoryorder': 'total ascending'},
-            xaxis_title="Coletas (Último Dia Útil)",
-            yaxis_title="Laboratório",
-            showlegend=True,
-            height=500,
-            margin=dict(l=40, r=40, t=40, b=100)
-        )
-        st.plotly_chart(fig, width='stretch')
+        def construir():
+            """Figura dos labs em risco (guardada no CacheFiguras)."""
+            labs_risco = df[df['Risco_Diario'].isin(['🟠 Moderado', '🔴 Alto', '⚫ Crítico'])].copy()
+            if labs_risco.empty:
+                st.info("✅ Nenhum laboratório em risco encontrado!")
+                return None
+            # Ordenar por maior queda vs MM7 e menor volume do dia
+            if 'Delta_MM7' in labs_risco.columns:
+                labs_risco = labs_risco.sort_values(['Delta_MM7', 'Vol_Hoje'], ascending=[True, True])
+            else:
+                labs_risco = labs_risco.sort_values('Vol_Hoje', ascending=True)
+            cores_map = {'🟠 Moderado': '#FB923C', '🔴 Alto': '#DC2626', '⚫ Crítico': '#111827'}
+            fig = px.bar(
+                labs_risco.head(top_n),
+                x='Vol_Hoje',
+                y='Nome_Fantasia_PCL',
+                orientation='h',
+                title=f"🚨 Top {top_n} Laboratórios em Risco (Diário)<br><sup>Classificação baseada em dias úteis</sup>",
+                color='Risco_Diario',
+                color_discrete_map=cores_map,
+                text='Delta_MM7'
+            )
+            fig.update_traces(texttemplate='%{text:.1f}% vs MM7', textposition='outside')
+            fig.update_layout(
+                yaxis={'categoryorder': 'total ascending'},
+                xaxis_title="Coletas (Último Dia Útil)",
+                yaxis_title="Laboratório",
+                showlegend=True,
+                height=500,
+                margin=dict(l=40, r=40, t=40, b=100)
+            )
+            return fig
+
+        exibir_figura('top_labs', (assinatura_frame(df), top_n), construir, width='stretch')
     @staticmethod
     def criar_grafico_media_diaria(
         df: pd.DataFrame,
@@ -4944,97 +6149,83 @@ class ChartManager:
             st.info("📊 Selecione um laboratório para visualizar a média diária")
             return
 
-        df_ref = df
-        if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-            df_ref = df_ref.copy()
-            df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
+        lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome)
+
+        if lab_data.empty:
+            st.info("📊 Laboratório não encontrado")
+            return
+
+        lab = lab_data.iloc[0]
+        nome_exibicao = lab_nome or lab.get('Nome_Fantasia_PCL') or lab_cnpj
+        
+        def construir():
+            """Figura da média diária do lab (guardada no CacheFiguras)."""
+            # Dados diários reais de 2025 (matriz lab × dia da versão)
+            dados_diarios = dados_diarios_lab(lab)
+            if not dados_diarios:
+                st.info("📊 Nenhum dado diário disponível para 2025 para este laboratório.")
+                return None
+
+            # Calcular média diária real baseada em dias com coleta
+            meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+            medias_diarias = []
+            meses_com_dados = []
+
+            for mes_key, dias_mes in dados_diarios.items():
+                # Extrair mês do formato "2025-10"
+                try:
+                    ano, mes_num = mes_key.split('-')
+                    mes_num = int(mes_num)
+                    if mes_num >= 1 and mes_num <= 12:
+                        mes_nome = meses_ordem[mes_num - 1]
+
+                        # Calcular total de coletas e dias com coleta para este mês
+                        total_coletas = sum(int(coletas) for coletas in dias_mes.values())
+                        dias_com_coleta = len(dias_mes)
+
+                        # Média diária = total de coletas / dias com coleta (não dias do mês)
+                        if dias_com_coleta > 0:
+                            media_diaria = total_coletas / dias_com_coleta
+                            medias_diarias.append(media_diaria)
+                            meses_com_dados.append(mes_nome)
+                except (ValueError, IndexError):
+                    continue
+
+            if not medias_diarias:
+                st.info("📊 Nenhuma coleta encontrada nos dados diários de 2025.")
+                return None
+
+            # Criar gráfico
+            fig = px.bar(
+                x=meses_com_dados,
+                y=medias_diarias,
+                title=f"📊 Média Diária Real por Mês - {nome_exibicao}<br><sup>Baseado em dias com coleta real</sup>",
+                color=medias_diarias,
+                color_continuous_scale='Greens',
+                text=[f"{val:.1f}" for val in medias_diarias]
+            )
+
+            fig.update_traces(
+                texttemplate='%{text} coletas',
+                textposition='outside',
+                hovertemplate='<b>Mês:</b> %{x}<br><b>Média Diária:</b> %{y:.1f} coletas<br><sup>Baseado em dias com coleta real</sup><extra></extra>'
+            )
+
+            fig.update_layout(
+                xaxis_title="Mês",
+                yaxis_title="Média Diária (Coletas)",
+                showlegend=False,
+                height=600,
+                margin=dict(l=60, r=60, t=80, b=80),
+                autosize=True,
+                font=dict(size=14)
+            )
 
-        if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-            lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-        else:
-            lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+            return fig
 
-        if lab_data.empty:
-            st.info("📊 Laboratório não encontrado")
+        if not exibir_figura('media_diaria', (lab_cnpj, lab_nome, lab.name), construir, width='stretch'):
             return
 
-        lab = lab_data.iloc[0]
-        nome_exibicao = lab_nome or lab.get('Nome_Fantasia_PCL') or lab_cnpj
-        
-        # Verificar se temos dados diários reais de 2025
-        if 'Dados_Diarios_2025' not in lab or pd.isna(lab['Dados_Diarios_2025']) or lab['Dados_Diarios_2025'] == '{}':
-            st.info("📊 Nenhum dado diário disponível para 2025 para este laboratório.")
-            return
-        
-        import json
-        try:
-            # Carregar dados diários reais
-            dados_diarios = json.loads(lab['Dados_Diarios_2025'])
-        except (json.JSONDecodeError, TypeError):
-            st.info("📊 Erro ao processar dados diários para este laboratório.")
-            return
-        
-        if not dados_diarios:
-            st.info("📊 Nenhum dado diário disponível para 2025.")
-            return
-        
-        # Calcular média diária real baseada em dias com coleta
-        meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
-        medias_diarias = []
-        meses_com_dados = []
-        
-        for mes_key, dias_mes in dados_diarios.items():
-            # Extrair mês do formato "2025-10"
-            try:
-                ano, mes_num = mes_key.split('-')
-                mes_num = int(mes_num)
-                if mes_num >= 1 and mes_num <= 12:
-                    mes_nome = meses_ordem[mes_num - 1]
-                    
-                    # Calcular total de coletas e dias com coleta para este mês
-                    total_coletas = sum(int(coletas) for coletas in dias_mes.values())
-                    dias_com_coleta = len(dias_mes)
-                    
-                    # Média diária = total de coletas / dias com coleta (não dias do mês)
-                    if dias_com_coleta > 0:
-                        media_diaria = total_coletas / dias_com_coleta
-                        medias_diarias.append(media_diaria)
-                        meses_com_dados.append(mes_nome)
-            except (ValueError, IndexError):
-                continue
-        
-        if not medias_diarias:
-            st.info("📊 Nenhuma coleta encontrada nos dados diários de 2025.")
-            return
-        
-        # Criar gráfico
-        fig = px.bar(
-            x=meses_com_dados,
-            y=medias_diarias,
-            title=f"📊 Média Diária Real por Mês - {nome_exibicao}<br><sup>Baseado em dias com coleta real</sup>",
-            color=medias_diarias,
-            color_continuous_scale='Greens',
-            text=[f"{val:.1f}" for val in medias_diarias]
-        )
-     
-        fig.update_traces(
-            texttemplate='%{text} coletas',
-            textposition='outside',
-            hovertemplate='<b>Mês:</b> %{x}<br><b>Média Diária:</b> %{y:.1f} coletas<br><sup>Baseado em dias com coleta real</sup><extra></extra>'
-        )
-     
-        fig.update_layout(
-            xaxis_title="Mês",
-            yaxis_title="Média Diária (Coletas)",
-            showlegend=False,
-            height=600,
-            margin=dict(l=60, r=60, t=80, b=80),
-            autosize=True,
-            font=dict(size=14)
-        )
-     
-        st.plotly_chart(fig, width='stretch')
-        
         # Explicação metodológica
         with st.expander("ℹ️ Sobre Esta Análise", expanded=False):
             st.markdown(f"""
@@ -5063,15 +6254,7 @@ class ChartManager:
             st.info("📊 Selecione um laboratório para visualizar as coletas por dia")
             return
 
-        df_ref = df
-        if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-            df_ref = df_ref.copy()
-            df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-
-        if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-            lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-        else:
-            lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+        lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome)
 
         if lab_data.empty:
             st.info("📊 Laboratório não encontrado")
@@ -5080,105 +6263,98 @@ class ChartManager:
         lab = lab_data.iloc[0]
         nome_exibicao = lab_nome or lab.get('Nome_Fantasia_PCL') or lab_cnpj
 
-        # Verificar se temos dados diários reais de 2025
-        if 'Dados_Diarios_2025' not in lab or pd.isna(lab['Dados_Diarios_2025']) or lab['Dados_Diarios_2025'] == '{}':
-            st.info("📊 Nenhum dado diário disponível para 2025 para este laboratório.")
-            return
+        def construir():
+            """Figura das coletas por dia do lab (guardada no CacheFiguras)."""
+            # Dados diários reais de 2025 (matriz lab × dia da versão)
+            dados_diarios = dados_diarios_lab(lab)
+            if not dados_diarios:
+                st.info("📊 Nenhum dado diário disponível para 2025 para este laboratório.")
+                return None
 
-        import json
-        try:
-            # Carregar dados diários reais
-            dados_diarios = json.loads(lab['Dados_Diarios_2025'])
-        except (json.JSONDecodeError, TypeError):
-            st.info("📊 Erro ao processar dados diários para este laboratório.")
-            return
+            # Converter dados para DataFrame
+            dados_grafico = []
+            meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
 
-        if not dados_diarios:
-            st.info("📊 Nenhum dado diário disponível para 2025.")
-            return
+            for mes_key, dias_mes in dados_diarios.items():
+                # Extrair mês do formato "2025-10"
+                try:
+                    ano, mes_num = mes_key.split('-')
+                    mes_num = int(mes_num)
+                    if mes_num >= 1 and mes_num <= 12:
+                        mes_nome = meses_ordem[mes_num - 1]
+
+                        # Adicionar apenas dias com coletas reais
+                        for dia_str, coletas in dias_mes.items():
+                            dia = int(dia_str)
+                            if coletas > 0:  # Só mostrar dias com coletas
+                                dados_grafico.append({
+                                    'Dia': dia,
+                                    'Mês': mes_nome,
+                                    'Coletas': int(coletas)
+                                })
+                except (ValueError, IndexError):
+                    continue
 
-        # Converter dados para DataFrame
-        dados_grafico = []
-        meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+            if not dados_grafico:
+                st.info("📊 Nenhuma coleta encontrada nos dados diários de 2025.")
+                return None
 
-        for mes_key, dias_mes in dados_diarios.items():
-            # Extrair mês do formato "2025-10"
-            try:
-                ano, mes_num = mes_key.split('-')
-                mes_num = int(mes_num)
-                if mes_num >= 1 and mes_num <= 12:
-                    mes_nome = meses_ordem[mes_num - 1]
-
-                    # Adicionar apenas dias com coletas reais
-                    for dia_str, coletas in dias_mes.items():
-                        dia = int(dia_str)
-                        if coletas > 0:  # Só mostrar dias com coletas
-                            dados_grafico.append({
-                                'Dia': dia,
-                                'Mês': mes_nome,
-                                'Coletas': int(coletas)
-                            })
-            except (ValueError, IndexError):
-                continue
+            df_grafico = pd.DataFrame(dados_grafico)
 
-        if not dados_grafico:
-            st.info("📊 Nenhuma coleta encontrada nos dados diários de 2025.")
-            return
+            # Criar gráfico de linha interativo
+            fig = px.line(
+                df_grafico,
+                x='Dia',
+                y='Coletas',
+                color='Mês',
+                title=f"📅 Coletas por Dia Útil do Mês - {nome_exibicao}",
+                markers=True,
+                line_shape='linear'
+            )
 
-        df_grafico = pd.DataFrame(dados_grafico)
-
-        # Criar gráfico de linha interativo
-        fig = px.line(
-            df_grafico,
-            x='Dia',
-            y='Coletas',
-            color='Mês',
-            title=f"📅 Coletas por Dia Útil do Mês - {nome_exibicao}",
-            markers=True,
-            line_shape='linear'
-        )
+            # Configurar tooltip personalizado com nome correto do mês
+            fig.update_traces(
+                hovertemplate='<b>Dia:</b> %{x}<br><b>Mês:</b> %{fullData.name}<br><b>Coletas:</b> %{y:.0f}<extra></extra>'
+            )
 
-        # Configurar tooltip personalizado com nome correto do mês
-        fig.update_traces(
-            hovertemplate='<b>Dia:</b> %{x}<br><b>Mês:</b> %{fullData.name}<br><b>Coletas:</b> %{y:.0f}<extra></extra>'
-        )
+            fig.update_layout(
+                xaxis_title="Dia do Mês (dias úteis disponíveis)",
+                yaxis_title="Número de Coletas (dias úteis)",
+                xaxis=dict(tickmode='linear', tick0=1, dtick=5),
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=-0.15,
+                    xanchor="center",
+                    x=0.5,
+                    bgcolor="rgba(255,255,255,0.8)",
+                    bordercolor="rgba(0,0,0,0.2)",
+                    borderwidth=1
+                ),
+                height=600,
+                margin=dict(l=60, r=60, t=80, b=120),  # Margem inferior maior para legenda
+                autosize=True,
+                font=dict(size=14),
+                # Tornar o gráfico mais interativo
+                hovermode='x unified',
+                # Melhorar a aparência das linhas
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)'
+            )
 
-        fig.update_layout(
-            xaxis_title="Dia do Mês (dias úteis disponíveis)",
-            yaxis_title="Número de Coletas (dias úteis)",
-            xaxis=dict(tickmode='linear', tick0=1, dtick=5),
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.15,
-                xanchor="center",
-                x=0.5,
-                bgcolor="rgba(255,255,255,0.8)",
-                bordercolor="rgba(0,0,0,0.2)",
-                borderwidth=1
-            ),
-            height=600,
-            margin=dict(l=60, r=60, t=80, b=120),  # Margem inferior maior para legenda
-            autosize=True,
-            font=dict(size=14),
-            # Tornar o gráfico mais interativo
-            hovermode='x unified',
-            # Melhorar a aparência das linhas
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)'
-        )
+            # Adicionar anotação explicativa (dica persistente)
+            fig.add_annotation(
+                text="💡 Dica: dê duplo clique no mês na legenda para focar apenas aquela série. Clique simples mostra/oculta linhas.",
+                xref="paper", yref="paper",
+                x=0.5, y=-0.25,
+                showarrow=False,
+                font=dict(size=12, color="gray"),
+                xanchor="center"
+            )
 
-        # Adicionar anotação explicativa (dica persistente)
-        fig.add_annotation(
-            text="💡 Dica: dê duplo clique no mês na legenda para focar apenas aquela série. Clique simples mostra/oculta linhas.",
-            xref="paper", yref="paper",
-            x=0.5, y=-0.25,
-            showarrow=False,
-            font=dict(size=12, color="gray"),
-            xanchor="center"
-        )
+            return fig
 
-        st.plotly_chart(fig, width='stretch')
+        exibir_figura('coletas_por_dia', (lab_cnpj, lab_nome, lab.name), construir, width='stretch')
     @staticmethod
     def criar_grafico_media_dia_semana_novo(
         df: pd.DataFrame,
@@ -5194,15 +6370,7 @@ class ChartManager:
             st.info("📊 Selecione um laboratório para visualizar a distribuição semanal")
             return
 
-        df_ref = df
-        if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-            df_ref = df_ref.copy()
-            df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-
-        if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-            lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-        else:
-            lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+        lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome)
 
         if lab_data.empty:
             st.info("📊 Laboratório não encontrado")
@@ -5327,7 +6495,7 @@ class ChartManager:
         if not lab_selecionado:
             st.info("📊 Selecione um laboratório para visualizar a distribuição semanal")
             return
-        lab_data = df[df['Nome_Fantasia_PCL'] == lab_selecionado]
+        lab_data = localizar_laboratorio(df, lab_nome=lab_selecionado)
         if not lab_data.empty:
             lab = lab_data.iloc[0]
             
@@ -5484,241 +6652,192 @@ class ChartManager:
             st.info("📊 Nenhum dado disponível para o gráfico de controle")
             return
         
-        import json
-        from pandas.tseries.offsets import BDay
-        
-        # Determinar contexto atual (lab específico ou conjunto filtrado)
-        serie_atual = pd.Series(dtype="float")
-        nome_serie_atual = "Conjunto Filtrado"
-        lab_data = pd.DataFrame()
-        
-        if lab_cnpj or lab_nome:
-            # Buscar lab específico
-            df_ref = df.copy()
-            if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-                df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-            
-            if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-                lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
+        def construir():
+            """Figura de controle BR × UF × Cidade × atual (guardada no CacheFiguras)."""
+            series = obter_series_graficos(df)
+            janela = 30 if usar_mm30 else 7
+            mm_label = "MM30" if usar_mm30 else "MM7"
+
+            def mm_recorte_avulso(df_recorte: pd.DataFrame) -> pd.Series:
+                """MM de um recorte que não pertence à matriz de df (matriz avulsa só para ele)."""
+                series_recorte = SeriesGraficos(df_recorte)
+                return SeriesGraficos.media_movel_dias_uteis(
+                    series_recorte.serie(np.ones(len(df_recorte), dtype=np.int64)), janela
+                )
+
+            # Determinar contexto atual (lab específico ou conjunto filtrado)
+            mm_atual = pd.Series(dtype="float")
+            nome_serie_atual = "Conjunto Filtrado"
+            lab_data = pd.DataFrame()
+
+            if lab_cnpj or lab_nome:
+                # Buscar lab específico
+                lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome)
+
+                if not lab_data.empty:
+                    lab = lab_data.iloc[0]
+                    nome_serie_atual = lab.get('Nome_Fantasia_PCL', lab_cnpj or lab_nome)
+                    pesos_lab = series.pesos(lab_data.iloc[:1])
+                    if pesos_lab is not None:
+                        mm_atual = series.media_movel(('lab', int(pesos_lab.argmax())), 'ATUAL', janela, pesos_lab)
+                    else:
+                        mm_atual = mm_recorte_avulso(lab_data.iloc[:1])
             else:
-                lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
-            
-            if not lab_data.empty:
-                lab = lab_data.iloc[0]
-                nome_serie_atual = lab.get('Nome_Fantasia_PCL', lab_cnpj or lab_nome)
-                if 'Dados_Diarios_2025' in lab and pd.notna(lab['Dados_Diarios_2025']):
-                    serie_atual = RiskEngine._serie_diaria_from_json(lab['Dados_Diarios_2025'])
-        else:
-            # Agregar série do conjunto filtrado (usar df_filtrado se disponível, senão df)
-            df_para_serie = df_filtrado if df_filtrado is not None and not df_filtrado.empty else df
-            todas_series = []
-            for _, row in df_para_serie.iterrows():
-                if 'Dados_Diarios_2025' in row and pd.notna(row['Dados_Diarios_2025']):
-                    s = RiskEngine._serie_diaria_from_json(row['Dados_Diarios_2025'])
-                    if not s.empty:
-                        todas_series.append(s)
-            
-            if todas_series:
-                # Agregar todas as séries por data
-                todas_datas = set()
-                for s in todas_series:
-                    todas_datas.update(s.index)
-                
-                serie_agregada = pd.Series(index=sorted(todas_datas), dtype="float")
-                for data in serie_agregada.index:
-                    total = sum(s.get(data, 0) for s in todas_series)
-                    serie_agregada[data] = total
-                
-                serie_atual = serie_agregada
-        
-        # Agregar séries por contexto (BR, UF, Cidade)
-        def agregar_por_contexto(df_contexto: pd.DataFrame) -> pd.Series:
-            """Agrega coletas diárias por contexto."""
-            todas_series = []
-            for _, row in df_contexto.iterrows():
-                if 'Dados_Diarios_2025' in row and pd.notna(row['Dados_Diarios_2025']):
-                    s = RiskEngine._serie_diaria_from_json(row['Dados_Diarios_2025'])
-                    if not s.empty:
-                        todas_series.append(s)
-            
-            if not todas_series:
-                return pd.Series(dtype="float")
-            
-            # Agregar todas as séries por data
-            todas_datas = set()
-            for s in todas_series:
-                todas_datas.update(s.index)
-            
-            serie_agregada = pd.Series(index=sorted(todas_datas), dtype="float")
-            for data in serie_agregada.index:
-                total = sum(s.get(data, 0) for s in todas_series)
-                serie_agregada[data] = total
-            
-            return serie_agregada
-        
-        # Agregar por BR (todos os labs do DataFrame completo)
-        serie_br = agregar_por_contexto(df)
-        
-        # Agregar por UF (se temos info de UF)
-        serie_uf = pd.Series(dtype="float")
-        uf_nome = ""
-        if lab_cnpj or lab_nome:
-            if not lab_data.empty and 'Estado' in lab_data.columns:
-                uf_nome = lab_data.iloc[0]['Estado']
-                if pd.notna(uf_nome) and uf_nome:
-                    df_uf = df[df['Estado'] == uf_nome]
-                    serie_uf = agregar_por_contexto(df_uf)
-        else:
-            # Para conjunto filtrado, usar UF do primeiro lab (se disponível)
-            if not df.empty and 'Estado' in df.columns:
-                uf_nome = df.iloc[0]['Estado']
-                if pd.notna(uf_nome) and uf_nome:
-                    df_uf = df[df['Estado'] == uf_nome]
-                    serie_uf = agregar_por_contexto(df_uf)
-        
-        # Agregar por Cidade (se temos info de Cidade)
-        serie_cidade = pd.Series(dtype="float")
-        cidade_nome = ""
-        if lab_cnpj or lab_nome:
-            if not lab_data.empty and 'Cidade' in lab_data.columns:
-                cidade_nome = lab_data.iloc[0]['Cidade']
-                if pd.notna(cidade_nome) and cidade_nome:
-                    df_cidade = df[df['Cidade'] == cidade_nome]
-                    serie_cidade = agregar_por_contexto(df_cidade)
-        else:
-            # Para conjunto filtrado, usar Cidade do primeiro lab (se disponível)
-            if not df.empty and 'Cidade' in df.columns:
-                cidade_nome = df.iloc[0]['Cidade']
-                if pd.notna(cidade_nome) and cidade_nome:
-                    df_cidade = df[df['Cidade'] == cidade_nome]
-                    serie_cidade = agregar_por_contexto(df_cidade)
-        
-        # Calcular médias móveis ao longo do tempo (apenas dias úteis)
-        def calcular_mm_serie(serie: pd.Series, janela: int) -> pd.Series:
-            """Calcula média móvel de janela dias úteis ao longo da série."""
-            if serie.empty:
-                return pd.Series(dtype="float")
-            
-            # Garantir que temos apenas dias úteis
-            serie = serie.sort_index()
-            serie_uteis = serie[serie.index.weekday < 5]  # Segunda=0 a Sexta=4
-            
-            if serie_uteis.empty:
-                return pd.Series(dtype="float")
-            
-            # Calcular MM ao longo do tempo
-            mm_serie = serie_uteis.rolling(window=janela, min_periods=1).mean()
-            return mm_serie
-        
-        janela = 30 if usar_mm30 else 7
-        mm_label = "MM30" if usar_mm30 else "MM7"
-        
-        # Calcular MMs para cada contexto
-        mm_br = calcular_mm_serie(serie_br, janela)
-        mm_uf = calcular_mm_serie(serie_uf, janela)
-        mm_cidade = calcular_mm_serie(serie_cidade, janela)
-        mm_atual = calcular_mm_serie(serie_atual, janela)
-        
-        # Preparar dados para o gráfico
-        dados_grafico = []
-        
-        # Adicionar série BR
-        for data, valor in mm_br.items():
-            dados_grafico.append({
-                'Data': data,
-                'Valor': valor,
-                'Serie': '🇧🇷 MM7_BR' if not usar_mm30 else '🇧🇷 MM30_BR'
-            })
-        
-        # Adicionar série UF
-        if not mm_uf.empty and uf_nome:
-            uf_label = f"📍 MM7_UF ({uf_nome})" if not usar_mm30 else f"📍 MM30_UF ({uf_nome})"
-            for data, valor in mm_uf.items():
-                dados_grafico.append({
-                    'Data': data,
-                    'Valor': valor,
-                    'Serie': uf_label
-                })
-        
-        # Adicionar série Cidade
-        if not mm_cidade.empty and cidade_nome:
-            cidade_label = f"🏙️ MM7_CIDADE ({cidade_nome})" if not usar_mm30 else f"🏙️ MM30_CIDADE ({cidade_nome})"
-            for data, valor in mm_cidade.items():
-                dados_grafico.append({
-                    'Data': data,
-                    'Valor': valor,
-                    'Serie': cidade_label
-                })
-        
-        # Adicionar série atual
-        if not mm_atual.empty:
-            atual_label = f"📊 {nome_serie_atual} ({mm_label})"
-            for data, valor in mm_atual.items():
+                # Agregar série do conjunto filtrado (usar df_filtrado se disponível, senão df)
+                df_para_serie = df_filtrado if df_filtrado is not None and not df_filtrado.empty else df
+                pesos_filtro = series.pesos(df_para_serie)
+                if pesos_filtro is not None:
+                    mm_atual = series.media_movel(
+                        ('filtro', SeriesGraficos.assinatura(pesos_filtro)), 'ATUAL', janela, pesos_filtro
+                    )
+                else:
+                    mm_atual = mm_recorte_avulso(df_para_serie)
+
+            def mm_por_coluna(coluna: str, valor: Any, nivel: str) -> pd.Series:
+                """MM do contexto df[coluna] == valor (máscara sobre a matriz diária)."""
+                mascara = (df[coluna] == valor).to_numpy()
+                return series.media_movel((coluna, valor), nivel, janela, mascara)
+
+            # Agregar por BR (todos os labs do DataFrame completo)
+            mm_br = series.media_movel(('todos',), 'BR', janela, np.ones(len(df), dtype=np.int64))
+
+            # Agregar por UF (se temos info de UF)
+            mm_uf = pd.Series(dtype="float")
+            uf_nome = ""
+            if lab_cnpj or lab_nome:
+                if not lab_data.empty and 'Estado' in lab_data.columns:
+                    uf_nome = lab_data.iloc[0]['Estado']
+                    if pd.notna(uf_nome) and uf_nome:
+                        mm_uf = mm_por_coluna('Estado', uf_nome, 'UF')
+            else:
+                # Para conjunto filtrado, usar UF do primeiro lab (se disponível)
+                if not df.empty and 'Estado' in df.columns:
+                    uf_nome = df.iloc[0]['Estado']
+                    if pd.notna(uf_nome) and uf_nome:
+                        mm_uf = mm_por_coluna('Estado', uf_nome, 'UF')
+
+            # Agregar por Cidade (se temos info de Cidade)
+            mm_cidade = pd.Series(dtype="float")
+            cidade_nome = ""
+            if lab_cnpj or lab_nome:
+                if not lab_data.empty and 'Cidade' in lab_data.columns:
+                    cidade_nome = lab_data.iloc[0]['Cidade']
+                    if pd.notna(cidade_nome) and cidade_nome:
+                        mm_cidade = mm_por_coluna('Cidade', cidade_nome, 'CIDADE')
+            else:
+                # Para conjunto filtrado, usar Cidade do primeiro lab (se disponível)
+                if not df.empty and 'Cidade' in df.columns:
+                    cidade_nome = df.iloc[0]['Cidade']
+                    if pd.notna(cidade_nome) and cidade_nome:
+                        mm_cidade = mm_por_coluna('Cidade', cidade_nome, 'CIDADE')
+
+            # Preparar dados para o gráfico
+            dados_grafico = []
+
+            # Adicionar série BR
+            for data, valor in mm_br.items():
                 dados_grafico.append({
                     'Data': data,
                     'Valor': valor,
-                    'Serie': atual_label
+                    'Serie': '🇧🇷 MM7_BR' if not usar_mm30 else '🇧🇷 MM30_BR'
                 })
-        
-        if not dados_grafico:
-            st.info("📊 Nenhum dado disponível para gerar o gráfico de controle")
-            return
-        
-        df_grafico = pd.DataFrame(dados_grafico)
-        
-        # Criar gráfico de linha
-        cores_map = {
-            '🇧🇷 MM7_BR': '#DC2626',
-            '🇧🇷 MM30_BR': '#DC2626',
-            '📍 MM7_UF': '#3B82F6',
-            '📍 MM30_UF': '#3B82F6',
-            '🏙️ MM7_CIDADE': '#10B981',
-            '🏙️ MM30_CIDADE': '#10B981'
-        }
-        
-        # Adicionar cores dinâmicas para série atual
-        for serie_nome in df_grafico['Serie'].unique():
-            if serie_nome not in cores_map:
-                cores_map[serie_nome] = '#6BBF47'  # Cor padrão verde
-        
-        fig = px.line(
-            df_grafico,
-            x='Data',
-            y='Valor',
-            color='Serie',
-            title=f"📊 Controle BR × UF × Cidade × {nome_serie_atual}<br><sup>{mm_label} - Apenas dias úteis</sup>",
-            markers=True,
-            line_shape='linear',
-            color_discrete_map=cores_map
-        )
-        
-        fig.update_traces(
-            hovertemplate='<b>%{fullData.name}</b><br>Data: %{x|%d/%m/%Y}<br>Valor: %{y:.2f}<extra></extra>',
-            line=dict(width=2.5)
-        )
-        
-        fig.update_layout(
-            xaxis_title="Data (dias úteis)",
-            yaxis_title=f"Média Móvel ({mm_label})",
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.2,
-                xanchor="center",
-                x=0.5,
-                bgcolor="rgba(255,255,255,0.9)",
-                bordercolor="rgba(0,0,0,0.2)",
-                borderwidth=1
-            ),
-            height=600,
-            margin=dict(l=60, r=60, t=100, b=120),
-            hovermode='x unified',
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font=dict(size=12)
+
+            # Adicionar série UF
+            if not mm_uf.empty and uf_nome:
+                uf_label = f"📍 MM7_UF ({uf_nome})" if not usar_mm30 else f"📍 MM30_UF ({uf_nome})"
+                for data, valor in mm_uf.items():
+                    dados_grafico.append({
+                        'Data': data,
+                        'Valor': valor,
+                        'Serie': uf_label
+                    })
+
+            # Adicionar série Cidade
+            if not mm_cidade.empty and cidade_nome:
+                cidade_label = f"🏙️ MM7_CIDADE ({cidade_nome})" if not usar_mm30 else f"🏙️ MM30_CIDADE ({cidade_nome})"
+                for data, valor in mm_cidade.items():
+                    dados_grafico.append({
+                        'Data': data,
+                        'Valor': valor,
+                        'Serie': cidade_label
+                    })
+
+            # Adicionar série atual
+            if not mm_atual.empty:
+                atual_label = f"📊 {nome_serie_atual} ({mm_label})"
+                for data, valor in mm_atual.items():
+                    dados_grafico.append({
+                        'Data': data,
+                        'Valor': valor,
+                        'Serie': atual_label
+                    })
+
+            if not dados_grafico:
+                st.info("📊 Nenhum dado disponível para gerar o gráfico de controle")
+                return None
+
+            df_grafico = pd.DataFrame(dados_grafico)
+
+            # Criar gráfico de linha
+            cores_map = {
+                '🇧🇷 MM7_BR': '#DC2626',
+                '🇧🇷 MM30_BR': '#DC2626',
+                '📍 MM7_UF': '#3B82F6',
+                '📍 MM30_UF': '#3B82F6',
+                '🏙️ MM7_CIDADE': '#10B981',
+                '🏙️ MM30_CIDADE': '#10B981'
+            }
+
+            # Adicionar cores dinâmicas para série atual
+            for serie_nome in df_grafico['Serie'].unique():
+                if serie_nome not in cores_map:
+                    cores_map[serie_nome] = '#6BBF47'  # Cor padrão verde
+
+            fig = px.line(
+                df_grafico,
+                x='Data',
+                y='Valor',
+                color='Serie',
+                title=f"📊 Controle BR × UF × Cidade × {nome_serie_atual}<br><sup>{mm_label} - Apenas dias úteis</sup>",
+                markers=True,
+                line_shape='linear',
+                color_discrete_map=cores_map
+            )
+
+            fig.update_traces(
+                hovertemplate='<b>%{fullData.name}</b><br>Data: %{x|%d/%m/%Y}<br>Valor: %{y:.2f}<extra></extra>',
+                line=dict(width=2.5)
+            )
+
+            fig.update_layout(
+                xaxis_title="Data (dias úteis)",
+                yaxis_title=f"Média Móvel ({mm_label})",
+                legend=dict(
+                    orientation="h",
+                    yanchor="bottom",
+                    y=-0.2,
+                    xanchor="center",
+                    x=0.5,
+                    bgcolor="rgba(255,255,255,0.9)",
+                    bordercolor="rgba(0,0,0,0.2)",
+                    borderwidth=1
+                ),
+                height=600,
+                margin=dict(l=60, r=60, t=100, b=120),
+                hovermode='x unified',
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font=dict(size=12)
+            )
+
+            return fig
+
+        entradas = (
+            assinatura_frame(df),
+            None if (lab_cnpj or lab_nome) else assinatura_frame(df_filtrado),
+            lab_cnpj, lab_nome, usar_mm30
         )
-        
-        st.plotly_chart(fig, width='stretch')
+        exibir_figura('controle_br_uf_cidade', entradas, construir, width='stretch')
     
     @staticmethod
     def criar_grafico_evolucao_mensal(
@@ -5738,116 +6857,118 @@ class ChartManager:
         colunas_meses = [f'N_Coletas_{mes}_25' for mes in meses]
         if lab_cnpj or lab_nome:
             # Gráfico para laboratório específico
-            df_ref = df
-            if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-                df_ref = df_ref.copy()
-                df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-
-            if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-                lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-            else:
-                lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+            lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome)
             if not lab_data.empty:
                 lab = lab_data.iloc[0]
                 nome_exibicao = lab_nome or lab.get('Nome_Fantasia_PCL') or lab_cnpj
-                valores_2025 = [lab.get(col, 0) for col in colunas_meses]
-             
-                # Dados 2024 (mesmos meses para comparação direta)
-                colunas_2024 = [f'N_Coletas_{mes}_24' for mes in meses]
-                valores_2024 = [lab.get(col, 0) for col in colunas_2024]
-             
-                # Calcular médias - Corrigido agrupamento temporal
-                media_2025 = sum(valores_2025) / len(valores_2025) if valores_2025 else 0
-                media_2024 = sum(valores_2024) / len(valores_2024) if valores_2024 else 0
-             
-                # Criar DataFrame para o gráfico
-                df_grafico = pd.DataFrame({
-                    'Mês': meses,
-                    '2025': valores_2025,
-                    '2024': valores_2024,
-                    'Média 2025': [media_2025] * len(meses),
-                    'Média 2024': [media_2024] * len(meses)
-                })
-             
-                # Criar gráfico com múltiplas linhas
+                def construir():
+                    """Figura da evolução mensal do lab (guardada no CacheFiguras)."""
+                    valores_2025 = [lab.get(col, 0) for col in colunas_meses]
+
+                    # Dados 2024 (mesmos meses para comparação direta)
+                    colunas_2024 = [f'N_Coletas_{mes}_24' for mes in meses]
+                    valores_2024 = [lab.get(col, 0) for col in colunas_2024]
+
+                    # Calcular médias - Corrigido agrupamento temporal
+                    media_2025 = sum(valores_2025) / len(valores_2025) if valores_2025 else 0
+                    media_2024 = sum(valores_2024) / len(valores_2024) if valores_2024 else 0
+
+                    # Criar DataFrame para o gráfico
+                    df_grafico = pd.DataFrame({
+                        'Mês': meses,
+                        '2025': valores_2025,
+                        '2024': valores_2024,
+                        'Média 2025': [media_2025] * len(meses),
+                        'Média 2024': [media_2024] * len(meses)
+                    })
+
+                    # Criar gráfico com múltiplas linhas
+                    fig = px.line(
+                        df_grafico,
+                        x='Mês',
+                        y=['2025', '2024', 'Média 2025', 'Média 2024'],
+                        title=f"📈 Evolução Mensal - {nome_exibicao}",
+                        markers=True,
+                        line_shape='spline'
+                    )
+
+                    # Personalizar cores e estilos
+                    fig.update_traces(
+                        mode='lines+markers',
+                        hovertemplate='<b>Mês:</b> %{x}<br><b>Coletas:</b> %{y}<extra></extra>'
+                    )
+
+                    # Garantir que não há valores negativos exibidos (ajustar eixo Y para começar em 0 ou acima)
+                    fig.update_layout(
+                        yaxis=dict(
+                            rangemode='tozero',  # Garante que o eixo Y começa em 0 ou acima
+                            showgrid=True,
+                            gridcolor='rgba(128, 128, 128, 0.2)'
+                        )
+                    )
+
+                    # Cores personalizadas
+                    fig.data[0].line.color = '#6BBF47' # Verde Synvia para 2025
+                    fig.data[1].line.color = '#ff7f0e' # Laranja para 2024
+                    fig.data[2].line.color = '#6BBF47' # Verde Synvia para média 2025
+                    fig.data[2].line.dash = 'dash'
+                    fig.data[3].line.color = '#ff7f0e' # Laranja para média 2024
+                    fig.data[3].line.dash = 'dash'
+                    # Ajustar textos de hover para diferenciar coletas x médias
+                    fig.data[0].hovertemplate = '<b>Mês:</b> %{x}<br><b>Coletas 2025:</b> %{y:.0f}<extra></extra>'
+                    fig.data[1].hovertemplate = '<b>Mês:</b> %{x}<br><b>Coletas 2024:</b> %{y:.0f}<extra></extra>'
+                    fig.data[2].hovertemplate = '<b>Mês:</b> %{x}<br><b>Média 2025:</b> %{y:.1f}<extra></extra>'
+                    fig.data[3].hovertemplate = '<b>Mês:</b> %{x}<br><b>Média 2024:</b> %{y:.1f}<extra></extra>'
+                    fig.update_layout(
+                        xaxis_title="Mês",
+                        yaxis_title="Número de Coletas",
+                        hovermode='x unified',
+                        legend=dict(
+                            orientation="h",
+                            yanchor="bottom",
+                            y=-0.15,
+                            xanchor="center",
+                            x=0.5
+                        ),
+                        height=600,  # Aumentado conforme solicitado
+                        margin=dict(l=60, r=60, t=60, b=80),  # Margens aumentadas para evitar cortes
+                        autosize=True,  # Responsivo
+                        showlegend=True
+                    )
+                    return fig
+
+                exibir_figura('evolucao_mensal_lab', (lab_cnpj, lab_nome, lab.name), construir,
+                              width='stretch', key=f"evolucao_mensal_lab_{chart_key}")
+        else:
+            # Gráfico agregado
+            def construir():
+                """Figura da evolução mensal agregada (guardada no CacheFiguras)."""
+                valores_agregados = [df[col].sum() for col in colunas_meses]
                 fig = px.line(
-                    df_grafico,
-                    x='Mês',
-                    y=['2025', '2024', 'Média 2025', 'Média 2024'],
-                    title=f"📈 Evolução Mensal - {nome_exibicao}",
+                    x=meses,
+                    y=valores_agregados,
+                    title="📈 Evolução Mensal Agregada (2025)",
                     markers=True,
                     line_shape='spline'
                 )
-                
-                # Personalizar cores e estilos
                 fig.update_traces(
-                    mode='lines+markers',
-                    hovertemplate='<b>Mês:</b> %{x}<br><b>Coletas:</b> %{y}<extra></extra>'
-                )
-                
-                # Garantir que não há valores negativos exibidos (ajustar eixo Y para começar em 0 ou acima)
-                fig.update_layout(
-                    yaxis=dict(
-                        rangemode='tozero',  # Garante que o eixo Y começa em 0 ou acima
-                        showgrid=True,
-                        gridcolor='rgba(128, 128, 128, 0.2)'
-                    )
+                    mode='lines+markers+text',
+                    text=valores_agregados,
+                    textposition="top center",
+                    hovertemplate='<b>Mês:</b> %{x}<br><b>Total Coletas:</b> %{y}<extra></extra>'
                 )
-             
-                # Cores personalizadas
-                fig.data[0].line.color = '#6BBF47' # Verde Synvia para 2025
-                fig.data[1].line.color = '#ff7f0e' # Laranja para 2024
-                fig.data[2].line.color = '#6BBF47' # Verde Synvia para média 2025
-                fig.data[2].line.dash = 'dash'
-                fig.data[3].line.color = '#ff7f0e' # Laranja para média 2024
-                fig.data[3].line.dash = 'dash'
-                # Ajustar textos de hover para diferenciar coletas x médias
-                fig.data[0].hovertemplate = '<b>Mês:</b> %{x}<br><b>Coletas 2025:</b> %{y:.0f}<extra></extra>'
-                fig.data[1].hovertemplate = '<b>Mês:</b> %{x}<br><b>Coletas 2024:</b> %{y:.0f}<extra></extra>'
-                fig.data[2].hovertemplate = '<b>Mês:</b> %{x}<br><b>Média 2025:</b> %{y:.1f}<extra></extra>'
-                fig.data[3].hovertemplate = '<b>Mês:</b> %{x}<br><b>Média 2024:</b> %{y:.1f}<extra></extra>'
                 fig.update_layout(
                     xaxis_title="Mês",
-                    yaxis_title="Número de Coletas",
+                    yaxis_title="Total de Coletas",
                     hovermode='x unified',
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=-0.15,
-                        xanchor="center",
-                        x=0.5
-                    ),
                     height=600,  # Aumentado conforme solicitado
-                    margin=dict(l=60, r=60, t=60, b=80),  # Margens aumentadas para evitar cortes
-                    autosize=True,  # Responsivo
-                    showlegend=True
+                    margin=dict(l=60, r=60, t=60, b=80),  # Margens aumentadas
+                    autosize=True  # Responsivo
                 )
-                st.plotly_chart(fig, width='stretch', key=f"evolucao_mensal_lab_{chart_key}")
-        else:
-            # Gráfico agregado
-            valores_agregados = [df[col].sum() for col in colunas_meses]
-            fig = px.line(
-                x=meses,
-                y=valores_agregados,
-                title="📈 Evolução Mensal Agregada (2025)",
-                markers=True,
-                line_shape='spline'
-            )
-            fig.update_traces(
-                mode='lines+markers+text',
-                text=valores_agregados,
-                textposition="top center",
-                hovertemplate='<b>Mês:</b> %{x}<br><b>Total Coletas:</b> %{y}<extra></extra>'
-            )
-            fig.update_layout(
-                xaxis_title="Mês",
-                yaxis_title="Total de Coletas",
-                hovermode='x unified',
-                height=600,  # Aumentado conforme solicitado
-                margin=dict(l=60, r=60, t=60, b=80),  # Margens aumentadas
-                autosize=True  # Responsivo
-            )
-            st.plotly_chart(fig, width='stretch', key=f"evolucao_mensal_agregado_{chart_key}")
+                return fig
+
+            exibir_figura('evolucao_mensal_agregado', (assinatura_frame(df),), construir,
+                          width='stretch', key=f"evolucao_mensal_agregado_{chart_key}")
 class UIManager:
     """Gerenciador da interface do usuário - Atualizado com tabs."""
     @staticmethod
@@ -5979,16 +7100,7 @@ class MetricasAvancadas:
     ) -> dict:
         """Calcula métricas avançadas para um laboratório específico - Atualizado score."""
 
-        df_ref = df
-        if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-            df_ref = df_ref.copy()
-            df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-
-        lab_data = pd.DataFrame()
-        if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-            lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-        if lab_data.empty and lab_nome:
-            lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+        lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome, nome_como_reserva=True)
 
         if lab_data.empty:
             return {}
@@ -6068,16 +7180,7 @@ class MetricasAvancadas:
     ) -> dict:
         """Calcula métricas de evolução e comparativos para um laboratório específico - Atualizado organização e comparativo."""
 
-        df_ref = df
-        if lab_cnpj and 'CNPJ_Normalizado' not in df_ref.columns and 'CNPJ_PCL' in df_ref.columns:
-            df_ref = df_ref.copy()
-            df_ref['CNPJ_Normalizado'] = df_ref['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-
-        lab_data = pd.DataFrame()
-        if lab_cnpj and 'CNPJ_Normalizado' in df_ref.columns:
-            lab_data = df_ref[df_ref['CNPJ_Normalizado'] == lab_cnpj]
-        if lab_data.empty and lab_nome:
-            lab_data = df_ref[df_ref['Nome_Fantasia_PCL'] == lab_nome]
+        lab_data = localizar_laboratorio(df, lab_cnpj, lab_nome, nome_como_reserva=True)
 
         if lab_data.empty:
             return {}
@@ -6157,7 +7260,7 @@ class AnaliseInteligente:
     @staticmethod
     def calcular_insights_automaticos(df: pd.DataFrame) -> pd.DataFrame:
         """Calcula insights automáticos para cada laboratório."""
-        df_insights = df.copy()
+        df_insights = df.copy(deep=False)
      
         # Volume atual (último mês fechado com lógica de dia de corte)
         info_ultimo_mes = ChartManager._obter_ultimo_mes_fechado(df_insights)
@@ -6337,6 +7440,24 @@ class ReportManager:
             mime="text/markdown",
             key="download_relatorio_mensal"
         )
+@dataclass(frozen=True)
+class DependenciasPagina:
+    """O que uma página consome; main() só carrega/calcula o que a página selecionada declara."""
+    datasets: Tuple[str, ...] = ()  # artefatos do prefetch aguardados antes de renderizar
+    base_filtrada: bool = False     # usa df_filtrado (filtros da sidebar + insights automáticos)
+    kpis: bool = False              # usa KPIManager.calcular_kpis sobre df_filtrado
+
+
+PAGINAS: Dict[str, DependenciasPagina] = {
+    "📅 Fechamento Semanal": DependenciasPagina(),
+    "📊 Fechamento Mensal": DependenciasPagina(),
+    "📋 Análise Detalhada": DependenciasPagina(datasets=('vip',), base_filtrada=True),
+    "🏢 Ranking Rede": DependenciasPagina(datasets=('vip',)),
+    "🔧 Manutenção VIPs": DependenciasPagina(datasets=('vip',)),
+    "🔍 Análise de Concorrente": DependenciasPagina(),
+}
+
+
 def show_toast_once(message: str, key: str):
     """Mostra um toast apenas uma vez por sessão."""
     if key not in st.session_state:
@@ -6388,11 +7509,14 @@ def main():
         unsafe_allow_html=True
     )
     try:
-        df_raw = DataManager.carregar_dados_churn()
-        if df_raw is None:
+        iniciar_prefetch()
+        _obter_delta_watcher()
+        df, versao_dados = DataManager.carregar_dados_preparados()
+        if df is None:
             st.error("❌ Não foi possível carregar os dados. Por favor, tente novamente mais tarde.")
             return
-        df = DataManager.preparar_dados(df_raw)
+        st.session_state['versao_dados'] = versao_dados
+        registrar_sessao()
         show_toast_once(f"✅ Dados carregados: {len(df):,} laboratórios", "dados_carregados")
     finally:
         loader_placeholder.empty()
@@ -6406,14 +7530,7 @@ def main():
     # ========================================
     # Removido cabeçalho "Navegação" da sidebar; botões de páginas mantidos abaixo
    
-    pages = [
-        "📅 Fechamento Semanal", 
-        "📊 Fechamento Mensal", 
-        "📋 Análise Detalhada", 
-        "🏢 Ranking Rede", 
-        "🔧 Manutenção VIPs", 
-        "🔍 Análise de Concorrente"
-    ]
+    pages = list(PAGINAS)
    
     if "page" not in st.session_state:
         st.session_state.page = pages[0]
@@ -6428,37 +7545,44 @@ def main():
     # Separador visual
     st.sidebar.markdown("---")
    
+    inicio_pagina = time.perf_counter()
+    dependencias = PAGINAS.get(st.session_state.page, DependenciasPagina())
     # Inicializar gerenciadores
     filter_manager = FilterManager()
     # Sidebar com filtros
     filtros = filter_manager.renderizar_sidebar_filtros(df)
-    # Aplicar filtros
-    df_filtrado = filter_manager.aplicar_filtros(df, filtros)
-    # Calcular análises inteligentes
-    df_filtrado = AnaliseInteligente.calcular_insights_automaticos(df_filtrado)
-    # Calcular KPIs
-    metrics = KPIManager.calcular_kpis(df_filtrado)
-    # Botão de refresh
-    if st.sidebar.button("🔄 Atualizar Dados", help="Limpar cache e recarregar dados"):
-        loader = show_overlay_loader(
-            "Atualizando dados...",
-            "Limpando cache e recarregando todas as informações. Isso pode levar alguns segundos."
-        )
-        try:
-            st.cache_data.clear()
-            st.toast("✅ Cache limpo! Os dados serão recarregados automaticamente.")
-            # Forçar recarregamento dos dados
-            time.sleep(0.5)  # Pequena pausa para usuário ver o loader
-            st.rerun()
-        finally:
-            loader.empty()
+    # Base filtrada, insights e KPIs só para as páginas que os declaram
+    df_filtrado = None
+    metrics = KPIMetrics()
+    if dependencias.base_filtrada or dependencias.kpis:
+        # Aplicar filtros
+        df_filtrado = filter_manager.aplicar_filtros(df, filtros)
+        if dependencias.base_filtrada:
+            # Calcular análises inteligentes
+            df_filtrado = AnaliseInteligente.calcular_insights_automaticos(df_filtrado)
+        if dependencias.kpis:
+            # Calcular KPIs
+            metrics = KPIManager.calcular_kpis(df_filtrado)
+    for dataset in dependencias.datasets:
+        aguardar_prefetch(dataset)
+    # Botão de refresh: recarrega em segundo plano; a versão atual segue no ar até a troca
+    atualizador = _obter_atualizador_dataset()
+    if st.sidebar.button("🔄 Atualizar Dados", help="Limpar cache e recarregar dados em segundo plano"):
+        st.cache_data.clear()
+        invalidar_metricas_fechamento()
+        _obter_cache_figuras().limpar()
+        iniciar_prefetch(forcar=True)
+        atualizador.solicitar(forcar=True)
+        st.toast("✅ Atualização iniciada! Os novos dados entram automaticamente quando estiverem prontos.")
+    if atualizador.em_andamento:
+        st.sidebar.caption("🔄 Preparando nova versão dos dados em segundo plano...")
     # ========================================
     # RENDERIZAÇÃO DA PÁGINA SELECIONADA - Atualizado com tabs
     # ========================================
     if st.session_state.page == "📅 Fechamento Semanal":
         # REGRA: Ignorar filtro VIP da sidebar
         # Usamos 'df' (base completa), mas podemos aplicar filtro de UF se selecionado
-        df_view = df.copy()
+        df_view = df.copy(deep=False)
         if filtros.get('uf_selecionada') and filtros['uf_selecionada'] != 'Todas':
              df_view = df_view[df_view['Estado'] == filtros['uf_selecionada']]
         if filtros.get('portes') and 'Porte' in df_view.columns:
@@ -6468,7 +7592,7 @@ def main():
 
     elif st.session_state.page == "📊 Fechamento Mensal":
         # REGRA: Ignorar filtro VIP da sidebar
-        df_view = df.copy()
+        df_view = df.copy(deep=False)
         if filtros.get('uf_selecionada') and filtros['uf_selecionada'] != 'Todas':
              df_view = df_view[df_view['Estado'] == filtros['uf_selecionada']]
         if filtros.get('portes') and 'Porte' in df_view.columns:
@@ -6589,7 +7713,7 @@ def main():
         
         if st.button("Salvar Alterações VIPs"):
             # Validar CNPJs (apenas números)
-            edited_df['CNPJ_PCL'] = edited_df['CNPJ_PCL'].astype(str).str.replace(r'\D', '', regex=True)
+            edited_df['CNPJ_PCL'] = somente_digitos_serie(edited_df['CNPJ_PCL'])
             
             # Remover linhas vazias ou com CNPJ duplicado/vazio
             edited_df = edited_df.dropna(subset=['CNPJ_PCL'])
@@ -6606,10 +7730,10 @@ def main():
         # Se marcado, mostrar apenas VIPs; se desmarcado, mostrar tudo (incluindo VIPs)
         if filtros.get('apenas_vip', False):
             # Filtro VIP marcado: usar df_filtrado (já filtrado por VIP)
-            df_analise_detalhada = df_filtrado.copy()
+            df_analise_detalhada = df_filtrado.copy(deep=False)
         else:
             # Filtro VIP desmarcado: usar base completa (df), mas aplicar outros filtros se houver
-            df_analise_detalhada = df.copy()
+            df_analise_detalhada = df.copy(deep=False)
             # Aplicar outros filtros (UF, porte, representante) mas não VIP
             if filtros.get('uf_selecionada') and filtros['uf_selecionada'] != 'Todas':
                 if 'Estado' in df_analise_detalhada.columns:
@@ -6633,18 +7757,11 @@ def main():
         # Seleção de laboratório específico
         if not df_analise_detalhada.empty:
             if 'CNPJ_Normalizado' not in df_analise_detalhada.columns:
-                df_analise_detalhada['CNPJ_Normalizado'] = df_analise_detalhada['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
+                df_analise_detalhada['CNPJ_Normalizado'] = normalizar_cnpjs(df_analise_detalhada['CNPJ_PCL'])
             df_analise_detalhada['CNPJ_Normalizado'] = df_analise_detalhada['CNPJ_Normalizado'].fillna('')
 
-            labs_catalogo = df_analise_detalhada[
-                ['CNPJ_PCL', 'CNPJ_Normalizado', 'Nome_Fantasia_PCL', 'Razao_Social_PCL', 'Cidade', 'Estado']
-            ].copy()
-            labs_catalogo = labs_catalogo[labs_catalogo['CNPJ_Normalizado'] != ""]
-            labs_catalogo['CNPJ_Normalizado'] = labs_catalogo['CNPJ_Normalizado'].astype(str)
-            labs_catalogo = labs_catalogo.drop_duplicates('CNPJ_Normalizado')
-
             def formatar_cnpj_display(cnpj_val):
-                digitos = ''.join(filter(str.isdigit, str(cnpj_val))) if pd.notna(cnpj_val) else ''
+                digitos = somente_digitos(cnpj_val)
                 if len(digitos) == 14:
                     return f"{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}"
                 return digitos or "N/A"
@@ -6664,23 +7781,33 @@ def main():
                 cnpj_fmt = formatar_cnpj_display(row.get('CNPJ_PCL') or row.get('CNPJ_Normalizado'))
                 return f"{nome} - {local} (CNPJ: {cnpj_fmt})"
 
-            lab_display_map = {str(row['CNPJ_Normalizado']): montar_rotulo(row) for _, row in labs_catalogo.iterrows()}
-            lab_nome_map = {
-                str(row['CNPJ_Normalizado']): row.get('Nome_Fantasia_PCL') or row.get('Razao_Social_PCL') or str(row['CNPJ_Normalizado'])
-                for _, row in labs_catalogo.iterrows()
-            }
-            lista_cnpjs_ordenada = sorted(lab_display_map.keys(), key=lambda cnpj: lab_display_map[cnpj].lower())
-            lista_cnpjs_validos = set(lista_cnpjs_ordenada)
+            # Rótulos/nomes montados só para os laboratórios exibidos (resultados da busca e seleção atual)
+            linhas_lab: Dict[str, Optional[pd.Series]] = {}
+
+            def linha_lab(cnpj_val: str) -> Optional[pd.Series]:
+                if cnpj_val not in linhas_lab:
+                    lab = localizar_laboratorio(df_analise_detalhada, cnpj_val)
+                    if lab.empty:
+                        lab = localizar_laboratorio(df, cnpj_val)
+                    linhas_lab[cnpj_val] = lab.iloc[0] if not lab.empty else None
+                return linhas_lab[cnpj_val]
+
+            def rotulo_lab(cnpj_val: str) -> str:
+                row = linha_lab(cnpj_val)
+                return montar_rotulo(row) if row is not None else cnpj_val
+
+            def nome_lab(cnpj_val: str) -> str:
+                row = linha_lab(cnpj_val)
+                if row is None:
+                    return cnpj_val
+                return row.get('Nome_Fantasia_PCL') or row.get('Razao_Social_PCL') or cnpj_val
 
             LAB_STATE_KEY = 'lab_cnpj_selecionado'
             lab_cnpj_estado = st.session_state.get(LAB_STATE_KEY, "") or ""
-            if lab_cnpj_estado and lab_cnpj_estado not in lista_cnpjs_validos:
+            if lab_cnpj_estado and localizar_laboratorio(df_analise_detalhada, lab_cnpj_estado).empty:
                 lab_cnpj_estado = ""
                 st.session_state[LAB_STATE_KEY] = ""
 
-            opcoes_select = [""] + lista_cnpjs_ordenada
-            index_padrao = opcoes_select.index(lab_cnpj_estado) if lab_cnpj_estado in lista_cnpjs_validos else 0
-
             # Layout melhorado com 3 colunas - ajustado para melhor alinhamento
             col1, col2, col3 = st.columns([4, 1.5, 2.5])
             with col1:
@@ -6688,20 +7815,31 @@ def main():
                 busca_lab = st.text_input(
                     "🔎 Buscar PCL",
                     placeholder="CNPJ (com/sem formatação) ou Nome do laboratório",
-                    help="Digite CNPJ (com ou sem pontos/traços) ou nome do laboratório/razão social",
+                    help="Digite o CNPJ (ou o começo dele, com ou sem pontos/traços), nome fantasia, razão social ou cidade",
                     key="busca_avancada"
                 )
             with col2:
                 # Botão de busca funcional (lupa como submit)
                 buscar_btn = st.button("🔍", type="primary", help="Clique para buscar o PCL no Gralab/backend", use_container_width=True)
+            busca_normalizada = (busca_lab or "").strip()
+            # Verificar se há busca ativa
+            busca_ativa = buscar_btn or len(busca_normalizada) > 2
+            # Busca no IndiceBusca da versão: só os BUSCA_LABS_TOP_K mais parecidos vão para a lista
+            if busca_ativa and busca_normalizada:
+                lab_encontrado = buscar_laboratorios(df_analise_detalhada, busca_normalizada)
+            else:
+                lab_encontrado = df_analise_detalhada.iloc[0:0]
+            opcoes_select = [""] + lab_encontrado['CNPJ_Normalizado'].astype(str).tolist()
+            if lab_cnpj_estado and lab_cnpj_estado not in opcoes_select:
+                opcoes_select.insert(1, lab_cnpj_estado)
             with col3:
-                # Seleção por dropdown como alternativa
+                # Resultados ranqueados da busca (e o laboratório já selecionado)
                 lab_selecionado = st.selectbox(
-                    "📋 Lista Rápida:",
+                    "📋 Resultados:",
                     options=opcoes_select,
-                    index=index_padrao,
-                    format_func=lambda cnpj: "Selecione um laboratório" if cnpj == "" else lab_display_map.get(cnpj, cnpj),
-                    help="Ou selecione um laboratório da lista completa"
+                    index=opcoes_select.index(lab_cnpj_estado) if lab_cnpj_estado else 0,
+                    format_func=lambda cnpj: "Selecione um laboratório" if cnpj == "" else rotulo_lab(cnpj),
+                    help=f"Até {BUSCA_LABS_TOP_K} laboratórios mais parecidos com a busca"
                 )
                 lab_selecionado = lab_selecionado or ""
                 if lab_selecionado != st.session_state.get(LAB_STATE_KEY, ""):
@@ -6713,37 +7851,22 @@ def main():
                 **🔢 Para CNPJ:**
                 - Apenas números: `51865434001248`
                 - Com formatação: `51.865.434/0012-48`
+                - Só o começo do CNPJ também funciona: `51865434`
                 **🏥 Para Nome:**
-                - Nome fantasia ou razão social
-                - Busca parcial e sem distinção de maiúsculas/minúsculas
+                - Nome fantasia, razão social ou cidade
+                - Busca parcial, sem distinção de maiúsculas/minúsculas ou acentos e tolerante a pequenos erros de digitação
                 **📊 Resultados:**
                 - 1 resultado: Selecionado automaticamente
-                - Múltiplos: Lista para escolher o correto
+                - Múltiplos: os mais parecidos aparecem em 📋 Resultados
                 """)
             # Estado da busca
             lab_final = None
-            lab_final_cnpj = lab_cnpj_estado if lab_cnpj_estado in lista_cnpjs_validos else ""
-            # Verificar se há busca ativa ou laboratório selecionado
-            busca_ativa = buscar_btn or (busca_lab and len(busca_lab.strip()) > 2)
+            lab_final_cnpj = lab_cnpj_estado
+            # Verificar se há laboratório selecionado
             tem_selecao = bool(lab_cnpj_estado)
             if busca_ativa or tem_selecao:
                 # Lógica de busca aprimorada
-                if busca_ativa and busca_lab:
-                    busca_normalizada = busca_lab.strip()
-                    # Verificar se é CNPJ (com ou sem formatação)
-                    cnpj_limpo = ''.join(filter(str.isdigit, busca_normalizada))
-                    if len(cnpj_limpo) >= 1:
-                        if len(cnpj_limpo) >= 14:
-                            lab_encontrado = df_analise_detalhada[df_analise_detalhada['CNPJ_Normalizado'] == cnpj_limpo]
-                        else:
-                            lab_encontrado = df_analise_detalhada[df_analise_detalhada['CNPJ_Normalizado'].str.startswith(cnpj_limpo)]
-                    else:
-                        # Buscar por nome (case insensitive e parcial) - apenas nome fantasia e razão social
-                        lab_encontrado = df_analise_detalhada[
-                            df_analise_detalhada['Nome_Fantasia_PCL'].str.contains(busca_normalizada, case=False, na=False) |
-                            df_analise_detalhada['Razao_Social_PCL'].str.contains(busca_normalizada, case=False, na=False)
-                        ]
-                    lab_encontrado = lab_encontrado[lab_encontrado['CNPJ_Normalizado'] != ""].drop_duplicates('CNPJ_Normalizado')
+                if busca_ativa and busca_normalizada:
                     if not lab_encontrado.empty:
                         if len(lab_encontrado) == 1:
                             lab_info_unico = lab_encontrado.iloc[0]
@@ -6754,45 +7877,15 @@ def main():
                             )
                             st.session_state[LAB_STATE_KEY] = lab_final_cnpj
                         else:
-                            # Múltiplos resultados - mostrar opções
-                            st.info(f"🔍 Encontrados {len(lab_encontrado)} laboratórios. Selecione um:")
-                            opcoes_df = lab_encontrado.head(10)
-                            opcoes_cnpjs = [""] + opcoes_df['CNPJ_Normalizado'].astype(str).tolist()
-                            if 'multiplo_resultados' in st.session_state:
-                                valor_multi = st.session_state['multiplo_resultados']
-                                if valor_multi not in opcoes_cnpjs:
-                                    st.session_state['multiplo_resultados'] = ""
-                            lab_selecionado_multiplo = st.selectbox(
-                                "Selecione o laboratório correto:",
-                                options=opcoes_cnpjs,
-                                format_func=lambda cnpj: "Selecione" if cnpj == "" else lab_display_map.get(cnpj, cnpj),
-                                key="multiplo_resultados"
-                            )
-                            if lab_selecionado_multiplo:
-                                lab_final_cnpj = str(lab_selecionado_multiplo)
-                                lab_final = lab_nome_map.get(lab_final_cnpj, lab_final_cnpj)
-                                st.session_state[LAB_STATE_KEY] = lab_final_cnpj
+                            # Múltiplos resultados - escolha na lista ranqueada de 📋 Resultados
+                            if not lab_final_cnpj:
+                                st.info(f"🔍 Encontrados {len(lab_encontrado)} laboratórios mais parecidos. Selecione um em 📋 Resultados.")
                     else:
                         # Limpar flag de laboratório fora dos filtros ao iniciar nova busca
                         if 'lab_fora_filtros' in st.session_state:
                             del st.session_state['lab_fora_filtros']
                         # Não encontrou - verificar se existe na base completa e qual filtro está impedindo
-                        cnpj_limpo = ''.join(filter(str.isdigit, busca_normalizada))
-                        lab_na_base_completa = None
-                        
-                        if len(cnpj_limpo) >= 1:
-                            if len(cnpj_limpo) >= 14:
-                                lab_na_base_completa = df[df['CNPJ_Normalizado'] == cnpj_limpo]
-                            else:
-                                lab_na_base_completa = df[df['CNPJ_Normalizado'].str.startswith(cnpj_limpo)]
-                        else:
-                            # Buscar por nome na base completa
-                            lab_na_base_completa = df[
-                                df['Nome_Fantasia_PCL'].str.contains(busca_normalizada, case=False, na=False) |
-                                df['Razao_Social_PCL'].str.contains(busca_normalizada, case=False, na=False)
-                            ]
-                        
-                        lab_na_base_completa = lab_na_base_completa[lab_na_base_completa['CNPJ_Normalizado'] != ""].drop_duplicates('CNPJ_Normalizado')
+                        lab_na_base_completa = buscar_laboratorios(df, busca_normalizada, limite=None)
                         
                         if not lab_na_base_completa.empty:
                             # Encontrou na base completa mas não nos filtros atuais
@@ -6846,26 +7939,22 @@ def main():
                 elif tem_selecao:
                     # Laboratório selecionado diretamente da lista
                     lab_final_cnpj = st.session_state.get(LAB_STATE_KEY, "")
-                    lab_final = lab_nome_map.get(lab_final_cnpj, lab_final_cnpj)
+                    lab_final = nome_lab(lab_final_cnpj)
                     # Limpar flag de laboratório fora dos filtros quando selecionado da lista
                     if 'lab_fora_filtros' in st.session_state:
                         del st.session_state['lab_fora_filtros']
+                if lab_final_cnpj and not lab_final:
+                    lab_final = nome_lab(lab_final_cnpj)
                 # Renderizar dados do laboratório encontrado/selecionado
                 if lab_final_cnpj:
                     st.markdown("---") # Separador antes dos dados
                     # Verificar se é VIP
                     df_vip = DataManager.carregar_dados_vip()
                     # Tentar buscar primeiro em df_analise_detalhada, se não encontrar, buscar na base completa
-                    if lab_final_cnpj:
-                        lab_data = df_analise_detalhada[df_analise_detalhada['CNPJ_Normalizado'] == lab_final_cnpj]
-                        # Se não encontrou em df_analise_detalhada, buscar na base completa
-                        if lab_data.empty:
-                            lab_data = df[df['CNPJ_Normalizado'] == lab_final_cnpj]
-                    else:
-                        lab_data = df_analise_detalhada[df_analise_detalhada['Nome_Fantasia_PCL'] == lab_final]
-                        # Se não encontrou em df_analise_detalhada, buscar na base completa
-                        if lab_data.empty:
-                            lab_data = df[df['Nome_Fantasia_PCL'] == lab_final]
+                    lab_data = localizar_laboratorio(df_analise_detalhada, lab_final_cnpj, lab_final)
+                    # Se não encontrou em df_analise_detalhada, buscar na base completa
+                    if lab_data.empty:
+                        lab_data = localizar_laboratorio(df, lab_final_cnpj, lab_final)
                     info_vip = None
                     if not lab_data.empty and df_vip is not None:
                         cnpj_lab = lab_data.iloc[0].get('CNPJ_PCL', '')
@@ -6898,16 +7987,10 @@ def main():
                         """, unsafe_allow_html=True)
                     # Informações de contato e localização
                     # Tentar buscar primeiro em df_analise_detalhada, se não encontrar, buscar na base completa
-                    if lab_final_cnpj:
-                        lab_data = df_analise_detalhada[df_analise_detalhada['CNPJ_Normalizado'] == lab_final_cnpj]
-                        # Se não encontrou em df_analise_detalhada, buscar na base completa
-                        if lab_data.empty:
-                            lab_data = df[df['CNPJ_Normalizado'] == lab_final_cnpj]
-                    else:
-                        lab_data = df_analise_detalhada[df_analise_detalhada['Nome_Fantasia_PCL'] == lab_final]
-                        # Se não encontrou em df_analise_detalhada, buscar na base completa
-                        if lab_data.empty:
-                            lab_data = df[df['Nome_Fantasia_PCL'] == lab_final]
+                    lab_data = localizar_laboratorio(df_analise_detalhada, lab_final_cnpj, lab_final)
+                    # Se não encontrou em df_analise_detalhada, buscar na base completa
+                    if lab_data.empty:
+                        lab_data = localizar_laboratorio(df, lab_final_cnpj, lab_final)
                     if not lab_data.empty:
                             lab_info = lab_data.iloc[0]
                          
@@ -7214,11 +8297,11 @@ def main():
                             """, unsafe_allow_html=True)
                     # Métricas comerciais essenciais
                     # Usar base completa se não encontrou em df_analise_detalhada
-                    df_para_metricas = df_analise_detalhada.copy()
+                    df_para_metricas = df_analise_detalhada
                     if lab_final_cnpj:
-                        lab_existe = not df_analise_detalhada[df_analise_detalhada['CNPJ_Normalizado'] == lab_final_cnpj].empty
+                        lab_existe = not localizar_laboratorio(df_analise_detalhada, lab_final_cnpj).empty
                         if not lab_existe:
-                            df_para_metricas = df.copy()
+                            df_para_metricas = df
                     
                     metricas = MetricasAvancadas.calcular_metricas_lab(
                         df_para_metricas,
@@ -7383,13 +8466,11 @@ def main():
                         # Buscar dados diários da base completa
                         dados_encontrados = False
                         if lab_final_cnpj and 'Dados_Diarios_2025' in df.columns:
-                            lab_dados = df[df['CNPJ_Normalizado'] == lab_final_cnpj]
+                            lab_dados = localizar_laboratorio(df, lab_final_cnpj)
                             if not lab_dados.empty:
-                                dados_diarios_raw = lab_dados.iloc[0].get('Dados_Diarios_2025', '{}')
                                 try:
-                                    import json  # Import explícito para garantir disponibilidade
-                                    # Parse dos dados JSON
-                                    dados_diarios = json.loads(dados_diarios_raw) if isinstance(dados_diarios_raw, str) else dados_diarios_raw
+                                    # Dados diários do lab (matriz lab × dia da versão)
+                                    dados_diarios = dados_diarios_lab(lab_dados.iloc[0])
                                     
                                     # Obter mês atual
                                     hoje = datetime.now()
@@ -7628,15 +8709,7 @@ def main():
                         st.subheader(f"📆 Evolução do Mês (Semana a Semana) - {mes_ref_nome}/{ano_ref}")
 
                         semanas_raw = []
-                        df_semana_ref = df_para_metricas.copy()
-                        if 'CNPJ_Normalizado' not in df_semana_ref.columns and 'CNPJ_PCL' in df_semana_ref.columns:
-                            df_semana_ref['CNPJ_Normalizado'] = df_semana_ref['CNPJ_PCL'].apply(
-                                lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else ''
-                            )
-                        if lab_final_cnpj:
-                            lab_semana = df_semana_ref[df_semana_ref['CNPJ_Normalizado'] == lab_final_cnpj]
-                        else:
-                            lab_semana = df_semana_ref[df_semana_ref['Nome_Fantasia_PCL'] == lab_final]
+                        lab_semana = localizar_laboratorio(df_para_metricas, lab_final_cnpj, lab_final)
 
                         fallback_vol_semana_anterior = 0
                         if not lab_semana.empty:
@@ -7833,24 +8906,20 @@ def main():
         mostrar_rede = False
         # Garantir que CNPJ_Normalizado existe em df_tabela
         if 'CNPJ_Normalizado' not in df_tabela.columns and 'CNPJ_PCL' in df_tabela.columns:
-            df_tabela['CNPJ_Normalizado'] = df_tabela['CNPJ_PCL'].apply(
-                lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else ''
-            )
+            df_tabela['CNPJ_Normalizado'] = somente_digitos_serie(df_tabela['CNPJ_PCL'])
         # Se há um laboratório pesquisado que está fora dos filtros, adicioná-lo à tabela
         lab_fora_filtros = st.session_state.get('lab_fora_filtros', False)
         if lab_fora_filtros and lab_final_cnpj and 'CNPJ_Normalizado' in df_tabela.columns:
             # Verificar se o laboratório não está na tabela
             if lab_final_cnpj not in df_tabela['CNPJ_Normalizado'].values:
                 # Buscar o laboratório na base completa
-                lab_na_base = df[df['CNPJ_Normalizado'] == lab_final_cnpj]
+                lab_na_base = localizar_laboratorio(df, lab_final_cnpj)
                 if not lab_na_base.empty:
                     # Adicionar o laboratório à tabela
                     df_tabela = pd.concat([df_tabela, lab_na_base], ignore_index=True)
         if df_vip_tabela is not None and not df_vip_tabela.empty:
             df_vip_tabela = df_vip_tabela.copy()
-            df_vip_tabela['CNPJ_Normalizado'] = df_vip_tabela['CNPJ'].apply(
-                lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else ''
-            )
+            df_vip_tabela['CNPJ_Normalizado'] = somente_digitos_serie(df_vip_tabela['CNPJ'])
             colunas_vip_disponiveis = ['CNPJ_Normalizado']
             for col in ['Rede', 'Ranking', 'Ranking Rede']:
                 if col in df_vip_tabela.columns:
@@ -8848,14 +9917,10 @@ def main():
         df_vip = DataManager.carregar_dados_vip()
         if df_vip is not None and not df_vip.empty:
             # Merge dos dados principais com dados VIP
-            df_com_rede = df_filtrado.copy()
+            df_com_rede = df_filtrado.copy(deep=False)
             # Adicionar coluna CNPJ normalizado para match
-            df_com_rede['CNPJ_Normalizado'] = df_com_rede['CNPJ_PCL'].apply(
-                lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else ''
-            )
-            df_vip['CNPJ_Normalizado'] = df_vip['CNPJ'].apply(
-                lambda x: ''.join(filter(str.isdigit, str(x))) if pd.notna(x) else ''
-            )
+            df_com_rede['CNPJ_Normalizado'] = somente_digitos_serie(df_com_rede['CNPJ_PCL'])
+            df_vip['CNPJ_Normalizado'] = somente_digitos_serie(df_vip['CNPJ'])
             # Merge dos dados
             df_com_rede = df_com_rede.merge(
                 df_vip[['CNPJ_Normalizado', 'Rede', 'Ranking', 'Ranking Rede']],
@@ -10094,6 +11159,7 @@ def main():
             nome_curto = "Gralab"
             nome_completo = "Gralab (CunhaLab)"
             carregar_funcao = DataManager.carregar_dados_gralab
+            chave_match = 'gralab'
         elif concorrente_selecionado == "Sodre (SodreLab)":
             cor_primaria = "#9333ea"
             cor_secundaria = "#a855f7"
@@ -10103,6 +11169,7 @@ def main():
             nome_curto = "Sodre"
             nome_completo = "Sodre (SodreLab)"
             carregar_funcao = DataManager.carregar_dados_sodre
+            chave_match = 'sodre'
         else:  # DB Toxicológico
             cor_primaria = "#0369a1"
             cor_secundaria = "#0284c7"
@@ -10112,6 +11179,7 @@ def main():
             nome_curto = "DB"
             nome_completo = "DB Toxicológico"
             carregar_funcao = DataManager.carregar_dados_db
+            chave_match = 'db'
         
         st.markdown(f"""
         <div style="background: linear-gradient(135deg, {cor_primaria} 0%, {cor_secundaria} 100%);
@@ -10142,16 +11210,17 @@ def main():
             # Normalizar CNPJs da nossa base (usar df completo, não df_filtrado)
             # Isso garante que todos os nossos clientes sejam considerados na comparação
             if 'CNPJ_Normalizado' not in df.columns:
-                df['CNPJ_Normalizado'] = df['CNPJ_PCL'].apply(DataManager.normalizar_cnpj)
-            
-            # Obter conjuntos de CNPJs (usar df completo para ter todos os clientes)
-            cnpjs_nossos = set(df['CNPJ_Normalizado'].dropna().unique())
-            cnpjs_concorrente = set(df_concorrente['CNPJ_Normalizado'].dropna().unique())
-            
-            # Calcular intersecções
-            cnpjs_comuns = cnpjs_nossos & cnpjs_concorrente
-            cnpjs_so_nossos = cnpjs_nossos - cnpjs_concorrente
-            cnpjs_so_concorrente = cnpjs_concorrente - cnpjs_nossos
+                df = df.assign(CNPJ_Normalizado=normalizar_cnpjs(df['CNPJ_PCL']))
+
+            # Conjuntos de CNPJs a partir da tabela de match (df completo = todos os clientes)
+            tabela_match = obter_tabela_match_cnpj(df)
+            na_nossa_base = tabela_match['in_ours'].to_numpy()
+            no_concorrente = tabela_match[f'in_{chave_match}'].to_numpy()
+            cnpjs_nossos = tabela_match.index[na_nossa_base]
+            cnpjs_concorrente = tabela_match.index[no_concorrente]
+            cnpjs_comuns = tabela_match.index[na_nossa_base & no_concorrente]
+            cnpjs_so_nossos = tabela_match.index[na_nossa_base & ~no_concorrente]
+            cnpjs_so_concorrente = tabela_match.index[~na_nossa_base & no_concorrente]
             
             # ========================================
             # KPIs COMPARATIVOS
@@ -10552,7 +11621,7 @@ def main():
                                 if pd.isna(cnpj) or cnpj == '':
                                     return 'N/A'
                                 # Normalizar CNPJ para comparação
-                                cnpj_normalizado = DataManager.normalizar_cnpj(str(cnpj))
+                                cnpj_normalizado = normalizar_cnpj(str(cnpj))
                                 if cnpj_normalizado in cnpjs_nossos:
                                     return '✅ Sim'
                                 return '❌ Não'
@@ -10719,6 +11788,9 @@ def main():
                 else:
                     st.info("Nenhum laboratório em comum para análise de preços")
     
+    logger.debug(f"Página '{st.session_state.page}' renderizada em {time.perf_counter() - inicio_pagina:.2f}s")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Memória: {metricas_memoria()}")
     st.markdown("""
     <div class="footer">
         <p>📊 <strong>Syntox Churn</strong> - Dashboard profissional de análise de retenção de laboratórios</p>
@@ -5,6 +5,7 @@ Implementa login via Azure AD com MSAL
 
 import base64
 import os
+import threading
 from functools import lru_cache
 from html import escape
 from pathlib import Path
@@ -242,6 +243,13 @@ def _get_login_logo_base64() -> Optional[str]:
 
     return None
 
+# Apps MSAL por (client_id, authority), compartilhados entre sessões do processo.
+# O cache de tokens deles fica só em memória: os tokens do usuário vivem no
+# session_state, e o arquivo compartilhado (msal_cache_manager) é do token app-only.
+_MSAL_APPS: Dict[tuple, msal.ConfidentialClientApplication] = {}
+_MSAL_APPS_LOCK = threading.Lock()
+
+
 class MicrosoftAuth:
     """Classe para gerenciar autenticação Microsoft via Azure AD"""
 
@@ -320,14 +328,34 @@ class MicrosoftAuth:
             logger.error(f"Erro ao determinar redirect URI: {e}")
             return self.redirect_uri_prod
 
+    def _msal_app(self) -> msal.ConfidentialClientApplication:
+        """App MSAL compartilhado no processo (evita nova descoberta de authority a cada chamada)"""
+        chave = (self.client_id, self.authority)
+        with _MSAL_APPS_LOCK:
+            app = _MSAL_APPS.get(chave)
+            if app is None:
+                app = msal.ConfidentialClientApplication(
+                    self.client_id,
+                    authority=self.authority,
+                    client_credential=self.client_secret,
+                    token_cache=msal.TokenCache()
+                )
+                _MSAL_APPS[chave] = app
+        return app
+
+    @staticmethod
+    def _descartar_contas(app: msal.ConfidentialClientApplication, result: Dict[str, Any]):
+        """Remove do cache em memória a conta do resultado (o app nunca relê esses tokens)"""
+        usuario = (result.get("id_token_claims") or {}).get("preferred_username")
+        if not usuario:
+            return
+        for conta in app.get_accounts(username=usuario):
+            app.remove_account(conta)
+
     def get_login_url(self) -> str:
         """Gera URL de autenticação Microsoft"""
         try:
-            app = msal.ConfidentialClientApplication(
-                self.client_id,
-                authority=self.authority,
-                client_credential=self.client_secret
-            )
+            app = self._msal_app()
 
             # MSAL automaticamente solicita offline_access quando usado dessa forma
             auth_url = app.get_authorization_request_url(
@@ -343,11 +371,7 @@ class MicrosoftAuth:
     def get_token_from_code(self, code: str) -> Optional[Dict[str, Any]]:
         """Troca código de autorização por token de acesso e refresh token"""
         try:
-            app = msal.ConfidentialClientApplication(
-                self.client_id,
-                authority=self.authority,
-                client_credential=self.client_secret
-            )
+            app = self._msal_app()
 
             # MSAL automaticamente retorna refresh_token quando disponível
             result = app.acquire_token_by_authorization_code(
@@ -355,6 +379,7 @@ class MicrosoftAuth:
                 scopes=self.scope,
                 redirect_uri=self.redirect_uri
             )
+            self._descartar_contas(app, result)
 
             if "access_token" in result:
                 return {
@@ -376,17 +401,14 @@ class MicrosoftAuth:
     def refresh_access_token(self, refresh_token: str) -> Optional[Dict[str, Any]]:
         """Renova o access token usando refresh token"""
         try:
-            app = msal.ConfidentialClientApplication(
-                self.client_id,
-                authority=self.authority,
-                client_credential=self.client_secret
-            )
+            app = self._msal_app()
 
             # MSAL automaticamente retorna novo refresh_token
             result = app.acquire_token_by_refresh_token(
                 refresh_token,
                 scopes=self.scope
             )
+            self._descartar_contas(app, result)
 
             if "access_token" in result:
                 logger.info("Token renovado com sucesso")
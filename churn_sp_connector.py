@@ -3,17 +3,135 @@
 # Adaptado para leitura e armazenamento de dados de VIPs
 
 import io
+import json
 import time
+import random
+import hashlib
+import tempfile
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 import msal
 import pandas as pd
 import os
 from urllib.parse import quote
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from requests.adapters import HTTPAdapter
 import streamlit as st
+from msal_cache_manager import obter_token_cache
 
 GRAPH = "https://graph.microsoft.com/v1.0"
 
+# Política de retry/backoff para chamadas Graph
+HTTP_POOL_MAXSIZE = int(os.getenv('SP_HTTP_POOL_MAXSIZE', 10))
+HTTP_MAX_RETRIES = int(os.getenv('SP_HTTP_MAX_RETRIES', 5))
+HTTP_BACKOFF_BASE = float(os.getenv('SP_HTTP_BACKOFF_BASE', 1.0))  # segundos
+HTTP_BACKOFF_MAX = float(os.getenv('SP_HTTP_BACKOFF_MAX', 60.0))   # segundos
+HTTP_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# JSON batching ($batch) aceita no máximo 20 requisições por chamada
+BATCH_MAX_REQUESTS = 20
+DOWNLOAD_LOTE_WORKERS = int(os.getenv('SP_DOWNLOAD_LOTE_WORKERS', 4))
+
+# Upload em sessões (createUploadSession) para arquivos acima do limite do PUT simples
+UPLOAD_SIMPLES_MAX = int(os.getenv('SP_UPLOAD_SIMPLES_MAX', 4 * 1024 * 1024))  # ~4 MB (limite Graph)
+UPLOAD_CHUNK_SIZE = int(os.getenv('SP_UPLOAD_CHUNK_SIZE', 16 * 320 * 1024))    # múltiplo de 320 KiB (5 MiB)
+UPLOAD_MAX_RETOMADAS = int(os.getenv('SP_UPLOAD_MAX_RETOMADAS', 5))
+
+# Cache de conteúdo em disco compartilhado entre processos do mesmo host
+SP_CACHE_DIR = os.getenv('SP_CACHE_DIR', os.path.join(tempfile.gettempdir(), "churn_sp_cache"))
+ITEM_SELECT = "id,name,size,eTag,cTag,lastModifiedDateTime"
+
+
+class SPContentCache:
+    """
+    Cache de conteúdo endereçado por hash (SHA-256) para artefatos do SharePoint.
+
+    Estrutura em disco:
+      - blobs/<sha256>   conteúdo dos arquivos (imutável, um por versão)
+      - refs/<chave>.json  caminho remoto -> {eTag, cTag, sha256, size, lastModifiedDateTime}
+
+    Todas as escritas são atômicas (arquivo temporário + os.replace), então vários
+    processos do app no mesmo host podem ler e atualizar o cache sem lock.
+    """
+
+    def __init__(self, base_dir: str = SP_CACHE_DIR):
+        self.base_dir = base_dir
+        self._blobs = os.path.join(base_dir, "blobs")
+        self._refs = os.path.join(base_dir, "refs")
+        os.makedirs(self._blobs, exist_ok=True)
+        os.makedirs(self._refs, exist_ok=True)
+
+    @staticmethod
+    def _gravar_atomico(destino: str, conteudo: bytes):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(conteudo)
+            os.replace(tmp, destino)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _ref_path(self, chave: str) -> str:
+        return os.path.join(self._refs, hashlib.sha1(chave.encode("utf-8")).hexdigest() + ".json")
+
+    def ler_ref(self, chave: str) -> Optional[dict]:
+        """Retorna a referência gravada para a chave (ou None)"""
+        try:
+            with open(self._ref_path(chave), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def ler_blob(self, sha256: str) -> Optional[bytes]:
+        """Lê conteúdo pelo hash (None se ausente ou corrompido)"""
+        try:
+            with open(os.path.join(self._blobs, sha256), "rb") as f:
+                conteudo = f.read()
+        except OSError:
+            return None
+        if hashlib.sha256(conteudo).hexdigest() != sha256:
+            return None
+        return conteudo
+
+    def gravar(self, chave: str, conteudo: bytes, meta: dict) -> dict:
+        """Grava conteúdo + referência e remove o blob anterior se ficou órfão"""
+        sha256 = hashlib.sha256(conteudo).hexdigest()
+        blob = os.path.join(self._blobs, sha256)
+        if not os.path.exists(blob):
+            self._gravar_atomico(blob, conteudo)
+
+        anterior = self.ler_ref(chave)
+        ref = {
+            "chave": chave,
+            "sha256": sha256,
+            "size": len(conteudo),
+            "eTag": meta.get("eTag"),
+            "cTag": meta.get("cTag"),
+            "lastModifiedDateTime": meta.get("lastModifiedDateTime"),
+        }
+        self._gravar_atomico(self._ref_path(chave), json.dumps(ref).encode("utf-8"))
+
+        if anterior and anterior.get("sha256") not in (None, sha256):
+            self._remover_blob_orfao(anterior["sha256"])
+        return ref
+
+    def _remover_blob_orfao(self, sha256: str):
+        for nome in os.listdir(self._refs):
+            try:
+                with open(os.path.join(self._refs, nome), "r", encoding="utf-8") as f:
+                    if json.load(f).get("sha256") == sha256:
+                        return
+            except (OSError, ValueError):
+                continue
+        try:
+            os.remove(os.path.join(self._blobs, sha256))
+        except OSError:
+            pass
+
 class ChurnSPConnector:
     """
     Conector personalizado para SharePoint/OneDrive no projeto Churn PCLs.
@@ -61,16 +179,27 @@ class ChurnSPConnector:
         if not all([self.tenant_id, self.client_id, self.client_secret]):
             raise ValueError("Configurações Graph API incompletas")
 
-        # Inicialização MSAL
+        # Sessão HTTP persistente (keep-alive + pool de conexões)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+        self._session.mount("https://", adapter)
+        self._metricas_lock = threading.Lock()
+        self._metricas = {}
+
+        # Inicialização MSAL (reaproveita a mesma sessão HTTP e o cache de tokens em disco)
+        self._token_cache = obter_token_cache()
         self._app = msal.ConfidentialClientApplication(
             client_id=self.client_id,
             authority=f"https://login.microsoftonline.com/{self.tenant_id}",
             client_credential=self.client_secret,
+            http_client=self._session,
+            token_cache=self._token_cache,
         )
         self._tok = None
         self._exp = 0
         self._site_id_cache = None
         self._drive_id_cache = None
+        self._cache = None
 
     # -------- Autenticação --------
     def _token(self):
@@ -79,7 +208,9 @@ class ChurnSPConnector:
         if self._tok and now < self._exp:
             return self._tok
 
-        res = self._app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
+        # acquire_token_for_client consulta o cache compartilhado antes de ir à rede
+        with self._token_cache.sincronizado():
+            res = self._app.acquire_token_for_client(scopes=["https://graph.microsoft.com/.default"])
         if "access_token" not in res:
             raise RuntimeError(res.get("error_description") or res)
 
@@ -91,6 +222,96 @@ class ChurnSPConnector:
         """Retorna headers com token de autenticação"""
         return {"Authorization": f"Bearer {self._token()}"}
 
+    # -------- HTTP com retry/backoff --------
+    @staticmethod
+    def _retry_after(r: Optional[requests.Response], tentativa: int) -> float:
+        """Calcula espera antes da próxima tentativa (Retry-After ou backoff exponencial)"""
+        valor = r.headers.get("Retry-After") if r is not None else None
+        if valor:
+            try:
+                return min(float(valor), HTTP_BACKOFF_MAX)
+            except ValueError:
+                pass
+        espera = HTTP_BACKOFF_BASE * (2 ** tentativa)
+        return min(espera + random.uniform(0, HTTP_BACKOFF_BASE), HTTP_BACKOFF_MAX)
+
+    def _registrar_latencia(self, operacao: str, segundos: float, status: Optional[int]):
+        """Acumula métricas de latência por operação"""
+        with self._metricas_lock:
+            m = self._metricas.setdefault(operacao, {
+                "chamadas": 0, "erros": 0, "retries": 0,
+                "total_s": 0.0, "max_s": 0.0, "ultimo_status": None,
+            })
+            m["chamadas"] += 1
+            m["total_s"] += segundos
+            m["max_s"] = max(m["max_s"], segundos)
+            m["ultimo_status"] = status
+            if status is None or status >= 400:
+                m["erros"] += 1
+
+    def _request(self, method: str, url: str, operacao: str = None, autenticar: bool = True, **kw) -> requests.Response:
+        """
+        Executa requisição na sessão persistente com retry em 429/5xx e falhas de rede.
+
+        Args:
+            method: Método HTTP
+            url: URL completa
+            operacao: Nome usado nas métricas de latência (padrão: método)
+            autenticar: Se envia o header Authorization (False para URLs pré-autenticadas)
+            **kw: Argumentos repassados a requests.Session.request
+
+        Returns:
+            Resposta final (o chamador decide sobre raise_for_status)
+        """
+        operacao = operacao or method.upper()
+        extra_headers = kw.pop("headers", None) or {}
+        token_renovado = False
+        tentativa = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                headers = {**self._headers(), **extra_headers} if autenticar else extra_headers
+                r = self._session.request(method, url, headers=headers, **kw)
+            except (requests.ConnectionError, requests.Timeout):
+                self._registrar_latencia(operacao, time.perf_counter() - inicio, None)
+                if tentativa >= HTTP_MAX_RETRIES:
+                    raise
+                r = None
+            else:
+                self._registrar_latencia(operacao, time.perf_counter() - inicio, r.status_code)
+                if r.status_code == 401 and autenticar and not token_renovado:
+                    # Token revogado/expirado antes do previsto: renovar uma única vez
+                    self._tok = None
+                    token_renovado = True
+                    continue
+                if r.status_code not in HTTP_RETRY_STATUS or tentativa >= HTTP_MAX_RETRIES:
+                    return r
+
+            with self._metricas_lock:
+                self._metricas[operacao]["retries"] += 1
+            time.sleep(self._retry_after(r, tentativa))
+            tentativa += 1
+
+    def metricas_latencia(self) -> dict:
+        """
+        Resumo das métricas de latência por operação
+
+        Returns:
+            Dicionário operação -> {chamadas, erros, retries, media_s, max_s, ultimo_status}
+        """
+        with self._metricas_lock:
+            return {
+                op: {
+                    "chamadas": m["chamadas"],
+                    "erros": m["erros"],
+                    "retries": m["retries"],
+                    "media_s": round(m["total_s"] / m["chamadas"], 4) if m["chamadas"] else 0.0,
+                    "max_s": round(m["max_s"], 4),
+                    "ultimo_status": m["ultimo_status"],
+                }
+                for op, m in self._metricas.items()
+            }
+
     # -------- Modo de operação --------
     @property
     def is_onedrive(self) -> bool:
@@ -106,7 +327,7 @@ class ChurnSPConnector:
             return self._site_id_cache
 
         url = f"{GRAPH}/sites/{self.hostname}:/{self.site_path}"
-        r = requests.get(url, headers=self._headers(), timeout=30)
+        r = self._request("GET", url, operacao="site_id", timeout=30)
         r.raise_for_status()
         self._site_id_cache = r.json()["id"]
         return self._site_id_cache
@@ -119,7 +340,7 @@ class ChurnSPConnector:
             return self._drive_id_cache
 
         url = f"{GRAPH}/sites/{self._site_id()}/drives"
-        r = requests.get(url, headers=self._headers(), timeout=30)
+        r = self._request("GET", url, operacao="drive_id", timeout=30)
         r.raise_for_status()
 
         drives = r.json().get("value", [])
@@ -169,25 +390,299 @@ class ChurnSPConnector:
                 return path[len(prefix):]
             return path
 
+    def _drive_url(self) -> str:
+        """URL base do drive (OneDrive do usuário ou biblioteca SharePoint)"""
+        if self.is_onedrive:
+            return f"{GRAPH}/users/{self.user_upn}/drive"
+        return f"{GRAPH}/drives/{self._drive_id()}"
+
+    def _item_url(self, path: str, sufixo: str = "") -> str:
+        """Monta URL Graph do item (root:/caminho:) com sufixo opcional (ex: '/content')"""
+        rel = quote(self.normalize_path(path), safe="/")
+        return f"{self._drive_url()}/root:/{rel}:{sufixo}"
+
+    def _item_path_relativo(self, path: str) -> str:
+        """Caminho do item relativo à raiz do Graph (formato exigido pelo $batch)"""
+        return self._item_url(path)[len(GRAPH):]
+
+    def _chave_cache(self, path: str) -> str:
+        """Chave estável do item para o cache (independe de IDs resolvidos via rede)"""
+        origem = self.user_upn if self.is_onedrive else f"{self.hostname}/{self.site_path}/{self.library_name}"
+        return f"{origem}|{self.normalize_path(path)}"
+
     # -------- Operações básicas de arquivo --------
-    def download(self, path: str) -> bytes:
+    def metadados(self, path: str) -> dict:
         """
-        Baixa arquivo do SharePoint/OneDrive
+        Obtém metadados do item (id, name, size, eTag, cTag, lastModifiedDateTime)
 
         Args:
             path: Caminho do arquivo
 
         Returns:
-            Conteúdo do arquivo em bytes
+            Dicionário de metadados do Graph
         """
-        rel = quote(self.normalize_path(path), safe="/")
+        url = self._item_url(path)
+        r = self._request("GET", url, operacao="metadados", params={"$select": ITEM_SELECT}, timeout=30)
+        if r.status_code == 404:
+            raise FileNotFoundError(f"Arquivo não encontrado: {path}")
+        r.raise_for_status()
+        return r.json()
 
-        if self.is_onedrive:
-            url = f"{GRAPH}/users/{self.user_upn}/drive/root:/{rel}:/content"
+    def metadados_lote(self, paths: List[str]) -> Dict[str, Optional[dict]]:
+        """
+        Obtém metadados de vários itens via JSON batching ($batch), até 20 por chamada
+
+        Args:
+            paths: Caminhos dos arquivos
+
+        Returns:
+            Dicionário caminho -> metadados (None se o item não existe)
+        """
+        resultado = {}
+        urls = {}
+        for path in dict.fromkeys(paths):
+            try:
+                urls[path] = f"{self._item_path_relativo(path)}?$select={ITEM_SELECT}"
+            except ValueError as e:
+                print(f"Aviso: caminho ignorado no lote ({e}): {path}")
+                resultado[path] = None
+        paths = list(urls)
+        for ini in range(0, len(paths), BATCH_MAX_REQUESTS):
+            lote = paths[ini:ini + BATCH_MAX_REQUESTS]
+            body = {"requests": [
+                {"id": str(i), "method": "GET", "url": urls[p]}
+                for i, p in enumerate(lote)
+            ]}
+            r = self._request("POST", f"{GRAPH}/$batch", operacao="metadados_lote", json=body, timeout=60)
+            r.raise_for_status()
+            for resp in r.json().get("responses", []):
+                path = lote[int(resp["id"])]
+                status = resp.get("status")
+                if status == 200:
+                    resultado[path] = resp.get("body") or {}
+                elif status == 404:
+                    resultado[path] = None
+                else:
+                    # Sub-requisição limitada (429) ou com erro transitório: tentar individualmente
+                    try:
+                        resultado[path] = self.metadados(path)
+                    except FileNotFoundError:
+                        resultado[path] = None
+        return resultado
+
+    def download_lote(self, paths: List[str], max_workers: int = None) -> Dict[str, Optional[bytes]]:
+        """
+        Baixa vários artefatos: metadados em um único $batch e, em seguida, apenas os
+        corpos que mudaram (cTag/eTag) em paralelo; os demais saem do cache em disco.
+
+        Args:
+            paths: Caminhos dos arquivos
+            max_workers: Downloads simultâneos (padrão DOWNLOAD_LOTE_WORKERS)
+
+        Returns:
+            Dicionário caminho -> conteúdo (None se o item não existe ou falhou)
+        """
+        metas = self.metadados_lote(paths)
+        existentes = [p for p, meta in metas.items() if meta is not None]
+        resultado = {p: None for p in metas}
+
+        def _baixar(path):
+            try:
+                return path, self.download_cached(path, meta=metas[path])
+            except Exception as e:
+                print(f"Aviso: falha ao baixar {path}: {e}")
+                return path, None
+
+        with ThreadPoolExecutor(max_workers=max_workers or DOWNLOAD_LOTE_WORKERS) as pool:
+            for path, conteudo in pool.map(_baixar, existentes):
+                resultado[path] = conteudo
+        return resultado
+
+    def _listar_subarvore(self, pasta_id: str) -> Tuple[Dict[str, Optional[str]], Dict[str, list]]:
+        """
+        Enumera a pasta e suas subpastas pelo id do item.
+
+        Returns:
+            (pastas, itens): pastas id -> id do pai (None para a raiz monitorada) e
+            arquivos id -> [nome, id da pasta pai]
+        """
+        pastas: Dict[str, Optional[str]] = {pasta_id: None}
+        itens: Dict[str, list] = {}
+        fila = [pasta_id]
+        while fila:
+            atual = fila.pop()
+            url = f"{self._drive_url()}/items/{atual}/children"
+            params = {"$select": "id,name,folder,file"}
+            while url:
+                r = self._request("GET", url, operacao="delta_listar", params=params, timeout=60)
+                r.raise_for_status()
+                dados = r.json()
+                for item in dados.get("value", []):
+                    if "folder" in item:
+                        pastas[item["id"]] = atual
+                        fila.append(item["id"])
+                    else:
+                        itens[item["id"]] = [item.get("name", ""), atual]
+                url, params = dados.get("@odata.nextLink"), None
+        return pastas, itens
+
+    def alteracoes_desde(self, pasta: str, estado_path: str = None) -> List[dict]:
+        """
+        Lista itens alterados na pasta desde a última chamada (delta query do drive).
+
+        No OneDrive for Business/SharePoint o delta não traz parentReference.path e
+        itens removidos vêm sem nome, então a pasta é resolvida uma vez para o seu id
+        e o estado persistido guarda, além do deltaLink, as subpastas (id -> pai) e os
+        arquivos monitorados (id -> [nome, pai]). As alterações são casadas por
+        parentReference.id e os removidos recebem o nome pelo mapa.
+
+        O estado fica em disco, então sobrevive a reinícios do app. Na primeira
+        chamada apenas enumera a pasta e registra o ponto de partida (token=latest),
+        retornando lista vazia. Se o servidor exigir ressincronização (410), todos os
+        arquivos monitorados são devolvidos como alterados.
+
+        Args:
+            pasta: Pasta monitorada (itens em subpastas também contam)
+            estado_path: Arquivo onde guardar o estado (padrão: dentro do SP_CACHE_DIR)
+
+        Returns:
+            Lista de driveItems (arquivos) alterados ou removidos na pasta, com "name"
+            sempre preenchido
+        """
+        if estado_path is None:
+            estado_path = os.path.join(self.cache.base_dir, f"delta_{hashlib.sha1(self._chave_cache(pasta).encode('utf-8')).hexdigest()}.json")
+
+        estado = {}
+        try:
+            with open(estado_path, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        delta_link = estado.get("deltaLink")
+        pasta_id = estado.get("pasta_id")
+        pastas: Dict[str, Optional[str]] = estado.get("pastas") or {}
+        itens: Dict[str, list] = estado.get("itens") or {}
+        primeira = not (delta_link and pasta_id in pastas)
+        alterados: Dict[str, dict] = {}
+
+        def _ressincronizar():
+            # Enumera de novo a pasta; os arquivos já conhecidos contam como alterados
+            nonlocal pasta_id, pastas, itens
+            conhecidos = itens
+            pasta_id = self.metadados(pasta)["id"]
+            pastas, itens = self._listar_subarvore(pasta_id)
+            if not primeira:
+                for item_id, (nome, _pai) in {**conhecidos, **itens}.items():
+                    alterados[item_id] = {"id": item_id, "name": nome}
+            return f"{self._drive_url()}/root/delta", {"token": "latest"}
+
+        if primeira:
+            url, params = _ressincronizar()
         else:
-            url = f"{GRAPH}/drives/{self._drive_id()}/root:/{rel}:/content"
+            url, params = delta_link, None
+        while url:
+            r = self._request("GET", url, operacao="delta", params=params, timeout=60)
+            if r.status_code == 410:
+                # Token expirado/ressincronização exigida: recomeçar do estado atual
+                url, params = _ressincronizar()
+                continue
+            r.raise_for_status()
+            dados = r.json()
+            for item in dados.get("value", []):
+                item_id = item.get("id")
+                pai = (item.get("parentReference") or {}).get("id")
+                removido = "deleted" in item
+                if "folder" in item or item_id in pastas:
+                    if item_id == pasta_id:
+                        continue
+                    if not removido and pai in pastas:
+                        pastas[item_id] = pai
+                    elif item_id in pastas:
+                        # Subpasta removida ou movida para fora: seus arquivos saem junto
+                        fora = {item_id}
+                        while True:
+                            novas = {p for p, pai_p in pastas.items() if pai_p in fora} - fora
+                            if not novas:
+                                break
+                            fora |= novas
+                        for arquivo_id, (nome, pai_arquivo) in list(itens.items()):
+                            if pai_arquivo in fora:
+                                alterados[arquivo_id] = {"id": arquivo_id, "name": nome, "deleted": {}}
+                                del itens[arquivo_id]
+                        for p in fora:
+                            pastas.pop(p, None)
+                    continue
+                if removido or pai not in pastas:
+                    anterior = itens.pop(item_id, None)
+                    if anterior is not None:
+                        alterados[item_id] = {**item, "name": item.get("name") or anterior[0]}
+                    continue
+                anterior = itens.get(item_id)
+                if anterior is not None and anterior[0] != item.get("name", ""):
+                    # Renomeado: o nome antigo também deixa de valer
+                    alterados[f"{item_id}:anterior"] = {"id": item_id, "name": anterior[0], "deleted": {}}
+                itens[item_id] = [item.get("name", ""), pai]
+                alterados[item_id] = item
+            url, params = dados.get("@odata.nextLink"), None
+            delta_link = dados.get("@odata.deltaLink", delta_link)
+
+        if delta_link:
+            estado = {"deltaLink": delta_link, "pasta_id": pasta_id, "pastas": pastas, "itens": itens}
+            SPContentCache._gravar_atomico(estado_path, json.dumps(estado).encode("utf-8"))
+        return list(alterados.values())
+
+    @property
+    def cache(self) -> SPContentCache:
+        """Cache de conteúdo em disco (criado sob demanda)"""
+        if self._cache is None:
+            self._cache = SPContentCache()
+        return self._cache
+
+    def download_cached(self, path: str, meta: dict = None) -> bytes:
+        """
+        Baixa arquivo apenas se mudou desde a última versão em cache (cTag/eTag).
+
+        Faz um GET leve de metadados; se o cTag (ou eTag) coincide com a referência
+        local e o blob existe, devolve o conteúdo do disco sem baixar o corpo.
+
+        Args:
+            path: Caminho do arquivo
+            meta: Metadados já obtidos (evita o GET de metadados)
+
+        Returns:
+            Conteúdo do arquivo em bytes
+        """
+        chave = self._chave_cache(path)
+        if meta is None:
+            meta = self.metadados(path)
+        ref = self.cache.ler_ref(chave)
+        if ref:
+            # cTag muda só com o conteúdo; eTag é o fallback quando cTag não vem
+            tag = "cTag" if meta.get("cTag") and ref.get("cTag") else "eTag"
+            mesma_versao = bool(meta.get(tag)) and meta.get(tag) == ref.get(tag)
+            if mesma_versao:
+                conteudo = self.cache.ler_blob(ref["sha256"])
+                if conteudo is not None:
+                    self._registrar_latencia("download_cache_hit", 0.0, 304)
+                    return conteudo
+
+        conteudo = self.download(path)
+        self.cache.gravar(chave, conteudo, meta)
+        return conteudo
 
-        r = requests.get(url, headers=self._headers(), timeout=180)
+    def download(self, path: str) -> bytes:
+        """
+        Baixa arquivo do SharePoint/OneDrive
+
+        Args:
+            path: Caminho do arquivo
+
+        Returns:
+            Conteúdo do arquivo em bytes
+        """
+        url = self._item_url(path, "/content")
+        r = self._request("GET", url, operacao="download", timeout=180)
         if r.status_code == 404:
             raise FileNotFoundError(f"Arquivo não encontrado: {path}")
         r.raise_for_status()
@@ -202,17 +697,108 @@ class ChurnSPConnector:
             content: Conteúdo em bytes
             overwrite: Se deve sobrescrever arquivo existente
         """
-        rel = quote(self.normalize_path(path), safe="/")
         params = {"@microsoft.graph.conflictBehavior": "replace" if overwrite else "fail"}
+        url = self._item_url(path, "/content")
+        r = self._request("PUT", url, operacao="upload_small", params=params, data=content, timeout=300)
+        r.raise_for_status()
+        return r.json()
 
-        if self.is_onedrive:
-            url = f"{GRAPH}/users/{self.user_upn}/drive/root:/{rel}:/content"
-        else:
-            url = f"{GRAPH}/drives/{self._drive_id()}/root:/{rel}:/content"
+    def upload(self, path: str, content: bytes, overwrite: bool = True):
+        """
+        Faz upload escolhendo PUT simples ou sessão em blocos conforme o tamanho
+
+        Args:
+            path: Caminho de destino
+            content: Conteúdo em bytes
+            overwrite: Se deve sobrescrever arquivo existente
+        """
+        if len(content) > UPLOAD_SIMPLES_MAX:
+            return self.upload_large(path, content, overwrite=overwrite)
+        return self.upload_small(path, content, overwrite=overwrite)
+
+    @staticmethod
+    def _intervalos_pendentes(next_expected: List[str], total: int, chunk_size: int) -> List[Tuple[int, int]]:
+        """Converte nextExpectedRanges ('ini-fim' ou 'ini-') em blocos [ini, fim] de até chunk_size"""
+        blocos = []
+        for faixa in next_expected:
+            ini_str, _, fim_str = faixa.partition("-")
+            ini = int(ini_str)
+            fim = int(fim_str) if fim_str else total - 1
+            while ini <= fim:
+                bloco_fim = min(ini + chunk_size - 1, fim)
+                blocos.append((ini, bloco_fim))
+                ini = bloco_fim + 1
+        return blocos
+
+    def _enviar_bloco(self, upload_url: str, content: bytes, ini: int, fim: int) -> requests.Response:
+        """Envia um bloco [ini, fim] para a URL da sessão (pré-autenticada)"""
+        headers = {
+            "Content-Length": str(fim - ini + 1),
+            "Content-Range": f"bytes {ini}-{fim}/{len(content)}",
+        }
+        r = self._request("PUT", upload_url, operacao="upload_bloco", autenticar=False,
+                          headers=headers, data=content[ini:fim + 1], timeout=300)
+        if r.status_code not in (200, 201, 202):
+            r.raise_for_status()
+        return r
+
+    def upload_large(self, path: str, content: bytes, overwrite: bool = True,
+                     chunk_size: int = None):
+        """
+        Faz upload em blocos via createUploadSession, com retomada a partir do
+        último intervalo confirmado pelo servidor.
+
+        Os blocos são enviados em sequência: o Graph exige que os fragmentos da
+        sessão cheguem em ordem e rejeita os fora de ordem. Conteúdo vazio (que a
+        sessão não aceita) vai por upload_small.
+
+        Args:
+            path: Caminho de destino
+            content: Conteúdo em bytes
+            overwrite: Se deve sobrescrever arquivo existente
+            chunk_size: Tamanho do bloco (múltiplo de 320 KiB; padrão UPLOAD_CHUNK_SIZE)
 
-        r = requests.put(url, headers=self._headers(), params=params, data=content, timeout=300)
+        Returns:
+            driveItem criado/atualizado
+        """
+        chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+        if chunk_size % (320 * 1024):
+            raise ValueError("chunk_size deve ser múltiplo de 320 KiB")
+        total = len(content)
+        if not total:
+            return self.upload_small(path, content, overwrite=overwrite)
+
+        body = {"item": {"@microsoft.graph.conflictBehavior": "replace" if overwrite else "fail"}}
+        r = self._request("POST", self._item_url(path, "/createUploadSession"),
+                          operacao="criar_sessao_upload", json=body, timeout=30)
         r.raise_for_status()
-        return r.json()
+        upload_url = r.json()["uploadUrl"]
+
+        pendentes = self._intervalos_pendentes(["0-"], total, chunk_size)
+        retomadas = 0
+        while True:
+            try:
+                for ini, fim in pendentes:
+                    r = self._enviar_bloco(upload_url, content, ini, fim)
+                if r.status_code in (200, 201):
+                    return r.json()
+                # 202 no último bloco: servidor ainda espera intervalos
+                faltantes = r.json().get("nextExpectedRanges") or []
+            except (requests.RequestException, OSError) as e:
+                if retomadas >= UPLOAD_MAX_RETOMADAS:
+                    self._request("DELETE", upload_url, operacao="cancelar_sessao_upload", autenticar=False, timeout=30)
+                    raise
+                print(f"Aviso: falha no upload em blocos ({e}); retomando do último intervalo confirmado")
+                status = self._request("GET", upload_url, operacao="status_sessao_upload", autenticar=False, timeout=30)
+                status.raise_for_status()
+                faltantes = status.json().get("nextExpectedRanges") or []
+
+            if not faltantes:
+                raise RuntimeError(f"Sessão de upload encerrada sem confirmação do item: {path}")
+            retomadas += 1
+            if retomadas > UPLOAD_MAX_RETOMADAS:
+                raise RuntimeError(f"Upload em blocos não concluído após {UPLOAD_MAX_RETOMADAS} retomadas: {path}")
+            pendentes = self._intervalos_pendentes(faltantes, total, chunk_size)
 
     # -------- Funções específicas para dados de VIP --------
     def carregar_dados_vip(self, arquivo: str = None) -> pd.DataFrame:
@@ -365,7 +951,7 @@ class ChurnSPConnector:
             # Tenta baixar arquivo atual
             try:
                 conteudo = self.download(arquivo)
-                self.upload_small(caminho_backup, conteudo, overwrite=False)
+                self.upload(caminho_backup, conteudo, overwrite=False)
                 print("Backup criado com sucesso")
             except FileNotFoundError:
                 print("Arquivo original não existe, pulando backup")
@@ -419,13 +1005,13 @@ class ChurnSPConnector:
         """Salva DataFrame como Excel no SharePoint/OneDrive"""
         bio = io.BytesIO()
         df.to_excel(bio, index=False)
-        return self.upload_small(path, bio.getvalue(), overwrite=overwrite)
+        return self.upload(path, bio.getvalue(), overwrite=overwrite)
 
     def write_csv(self, df: pd.DataFrame, path: str, overwrite: bool = True):
         """Salva DataFrame como CSV no SharePoint/OneDrive"""
         bio = io.BytesIO()
         df.to_csv(bio, index=False)
-        return self.upload_small(path, bio.getvalue(), overwrite=overwrite)
+        return self.upload(path, bio.getvalue(), overwrite=overwrite)
 
     # -------- Funções de diagnóstico --------
     def testar_conexao(self) -> bool:
@@ -447,7 +1033,7 @@ class ChurnSPConnector:
             else:
                 url = f"{GRAPH}/drives/{self._drive_id()}"
 
-            r = requests.get(url, headers=self._headers(), timeout=30)
+            r = self._request("GET", url, operacao="testar_conexao", timeout=30)
             return r.status_code == 200
 
         except Exception as e:
@@ -476,7 +1062,7 @@ class ChurnSPConnector:
                 if rel:
                     url = f"{GRAPH}/drives/{self._drive_id()}/root:/{rel}:/children"
 
-            r = requests.get(url, headers=self._headers(), timeout=30)
+            r = self._request("GET", url, operacao="listar_arquivos", timeout=30)
             r.raise_for_status()
 
             items = r.json().get("value", [])
@@ -485,3 +1071,40 @@ class ChurnSPConnector:
         except Exception as e:
             print(f"Erro ao listar arquivos: {str(e)}")
             return []
+
+
+_connectors = {}
+_connectors_lock = threading.Lock()
+
+
+def obter_connector(config=None) -> ChurnSPConnector:
+    """
+    Retorna o conector do processo para a configuração informada (singleton por
+    tenant/cliente/drive), preservando sessão HTTP, IDs resolvidos e métricas.
+
+    Args:
+        config: Dicionário com configurações (opcional, usa st.secrets por padrão)
+
+    Returns:
+        Instância compartilhada de ChurnSPConnector
+    """
+    if config is None:
+        try:
+            config = st.secrets
+        except:
+            raise RuntimeError("Configurações não encontradas. Use st.secrets ou passe config manualmente.")
+
+    graph_config = config.get("graph", {})
+    onedrive_config = config.get("onedrive", {})
+    chave = (
+        graph_config.get("tenant_id"),
+        graph_config.get("client_id"),
+        graph_config.get("hostname"),
+        graph_config.get("site_path"),
+        graph_config.get("library_name"),
+        onedrive_config.get("user_upn"),
+    )
+    with _connectors_lock:
+        if chave not in _connectors:
+            _connectors[chave] = ChurnSPConnector(config=config)
+        return _connectors[chave]
@@ -52,6 +52,8 @@ REPRESENTATIVES_FILE = "representatives.csv"
 CHAIN_OF_CUSTODIES_FILE = "chainofcustodies.csv"
 PRICES_FILE = "prices.csv"
 CHURN_ANALYSIS_FILE = "churn_analysis_latest.parquet"
+TABELA_MATCH_FILE = "tabela_match_cnpj.parquet"  # Match de CNPJs nossa base x concorrentes
+DATASET_PREPARADO_FILE = "dataset_preparado.feather"  # Saída de preparar_dados publicada pelo gerador (warm start do app)
 
 # Caminhos padrão no SharePoint (ajustáveis via secrets)
 SHAREPOINT_CHURN_FOLDER = os.getenv('SHAREPOINT_CHURN_FOLDER', "Data Analysis/Churn PCLs")
@@ -82,6 +84,15 @@ LOG_LEVEL = os.getenv('LOG_LEVEL', "INFO")
 STREAMLIT_PORT = int(os.getenv('STREAMLIT_PORT', 8502))  # Porta diferente do CTOX
 STREAMLIT_HOST = os.getenv('STREAMLIT_HOST', "0.0.0.0")
 CACHE_TTL = int(os.getenv('CACHE_TTL', 300))  # 5 minutos
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', 4))  # Threads de parse no prefetch de artefatos
+PREFETCH_TIMEOUT = int(os.getenv('PREFETCH_TIMEOUT', 180))  # Espera máxima (s) por um artefato em prefetch
+DELTA_POLL_INTERVAL = int(os.getenv('DELTA_POLL_INTERVAL', 60))  # Segundos entre consultas delta da pasta Churn PCLs
+TABELA_LINHAS_POR_PAGINA = int(os.getenv('TABELA_LINHAS_POR_PAGINA', 100))  # Linhas por página nas tabelas de laboratórios
+BUSCA_LABS_TOP_K = int(os.getenv('BUSCA_LABS_TOP_K', 20))  # Resultados exibidos na busca de laboratórios (Análise Detalhada)
+BUSCA_LABS_SIMILARIDADE_MINIMA = float(os.getenv('BUSCA_LABS_SIMILARIDADE_MINIMA', 0.6))  # Fração mínima dos trigramas da busca presentes no laboratório
+FIGURAS_CACHE_MAX = int(os.getenv('FIGURAS_CACHE_MAX', 64))  # Figuras Plotly (JSON) guardadas no LRU compartilhado entre sessões
+GRAFICO_LIMIAR_WEBGL = int(os.getenv('GRAFICO_LIMIAR_WEBGL', 1000))  # Pontos de linha por figura a partir dos quais o gráfico usa Scattergl (WebGL)
+GRAFICO_MAX_PONTOS_SERIE = int(os.getenv('GRAFICO_MAX_PONTOS_SERIE', 400))  # Pontos por série de linha após o downsampling LTTB
 
 # Configurações de arquivo
 ENCODING = os.getenv('ENCODING', "utf-8-sig")
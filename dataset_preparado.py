@@ -0,0 +1,744 @@
+# ========================================
+# DATASET PREPARADO DO DASHBOARD
+# Sistema de Alertas Churn v2
+# ========================================
+
+"""
+Preparação da tabela de churn para o dashboard (merge VIP, régua de risco diário,
+fallback de preços) e artefato pré-preparado publicado pelo gerador.
+
+O gerador roda preparar_dataset logo após gerar a análise e grava o resultado em
+Arrow IPC/Feather sem compressão, com a versão do schema, a data de referência da
+régua de risco e o SHA-256 de cada arquivo de entrada no metadado. No cold start o
+app usa o artefato quando tudo isso bate com os seus arquivos locais (o to_pandas
+ainda materializa o DataFrame; o ganho é pular a preparação) e, caso contrário,
+prepara a tabela de churn como antes.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.tseries.offsets import BDay
+
+from config_churn import PRICE_CATEGORIES, REDUCAO_ALTO_RISCO, REDUCAO_MEDIO_RISCO, TIMEZONE
+from normalizacao import normalizar_cnpjs
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Versão do layout do dataset preparado (mudar invalida os artefatos publicados)
+VERSAO_SCHEMA = 1
+
+# Chaves do metadado do arquivo Feather
+META_VERSAO = b'versao_schema'
+META_DATA_REFERENCIA = b'data_referencia'
+META_FONTES = b'fontes_sha256'
+
+
+# ========================================
+# RÉGUA DE RISCO DIÁRIO
+# ========================================
+
+class RiskEngine:
+    """Calcula MM7/MM30/MM90, D-1, DOW e classifica o risco diário (nova régua)."""
+
+    @staticmethod
+    def _serie_diaria_from_json(json_str: str) -> pd.Series:
+        """Converte 'Dados_Diarios_2025' (dict 'YYYY-MM' -> {dia:coletas}) em série diária."""
+        if pd.isna(json_str) or str(json_str).strip() in ("", "{}", "null"):
+            return pd.Series(dtype="float")
+        import json
+        try:
+            j = json.loads(json_str)
+        except Exception:
+            return pd.Series(dtype="float")
+        rows = []
+        for ym, dias in j.items():
+            try:
+                y, m = ym.split("-")
+            except Exception:
+                continue
+            for d_str, v in dias.items():
+                try:
+                    d = int(d_str)
+                    rows.append((pd.Timestamp(int(y), int(m), d), int(v)))
+                except Exception:
+                    continue
+        if not rows:
+            return pd.Series(dtype="float")
+        s = pd.Series({d: v for d, v in rows}).sort_index()
+        return s
+
+    @staticmethod
+    def _last_business_day(reference: Optional[pd.Timestamp] = None) -> pd.Timestamp:
+        """Retorna a última data útil (considerando TIMEZONE)."""
+        if reference is None:
+            reference = pd.Timestamp.now(tz=TIMEZONE)
+        else:
+            if reference.tzinfo is None:
+                reference = reference.tz_localize(TIMEZONE)
+            else:
+                reference = reference.tz_convert(TIMEZONE)
+        reference = reference.normalize()
+        reference_naive = reference.tz_localize(None)
+        while reference_naive.weekday() >= 5:
+            reference_naive = (reference_naive - BDay(1))
+        return reference_naive
+
+    @staticmethod
+    def _serie_business_day(s: pd.Series, ref_date: pd.Timestamp) -> pd.Series:
+        """Reindexa série para frequência de dias úteis até ref_date."""
+        if s.empty:
+            return s
+        s = s.sort_index()
+        start = s.index.min()
+        if ref_date < start:
+            ref_date = start
+        idx = pd.bdate_range(start, ref_date)
+        if len(idx) == 0:
+            idx = pd.DatetimeIndex([ref_date])
+        return s.reindex(idx, fill_value=0)
+
+    @staticmethod
+    def _rolling_means(s: pd.Series, ref_date: pd.Timestamp) -> dict:
+        """MM7/MM30/MM90, D-1, média por DOW e contadores auxiliares."""
+        if s.empty:
+            return dict(MM7=0, MM30=0, MM90=0, D1=0, DOW=0, HOJE=0, zeros_consec=0, quedas50_consec=0)
+        if ref_date not in s.index:
+            return dict(MM7=0, MM30=0, MM90=0, D1=0, DOW=0, HOJE=0, zeros_consec=0, quedas50_consec=0)
+
+        hoje = float(s.loc[ref_date])
+        serie_ate_ref = s.loc[:ref_date]
+        if len(serie_ate_ref) > 1:
+            d1 = float(serie_ate_ref.iloc[-2])
+        else:
+            d1 = 0.0
+        mm7 = float(serie_ate_ref.tail(7).mean())
+        mm30 = float(serie_ate_ref.tail(30).mean())
+        mm90 = float(serie_ate_ref.tail(90).mean())
+        dow = int(ref_date.weekday())
+        dow_vals = serie_ate_ref[serie_ate_ref.index.weekday == dow]
+        dow_mean = float(dow_vals.tail(90).mean()) if len(dow_vals) else 0.0
+        zeros_consec = 0
+        for valor in serie_ate_ref[::-1]:
+            if valor == 0:
+                zeros_consec += 1
+            else:
+                break
+
+        def _is_queda50(idx):
+            mm7_local = s.loc[:idx].tail(7).mean()
+            return s.loc[idx] < 0.5 * mm7_local if mm7_local > 0 else False
+
+        ultimos = s.loc[:ref_date].tail(3)
+        quedas50_consec = sum([_is_queda50(idx) for idx in ultimos.index])
+        return dict(MM7=mm7, MM30=mm30, MM90=mm90, D1=d1, DOW=dow_mean, HOJE=hoje,
+                    zeros_consec=zeros_consec, quedas50_consec=quedas50_consec)
+
+    @staticmethod
+    def _to_float(value: Any) -> Optional[float]:
+        """Converte valor para float com tratamento de NaN."""
+        try:
+            if pd.isna(value):
+                return None
+        except TypeError:
+            pass
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def classificar(row: pd.Series) -> dict:
+        """Aplica as regras do anexo e retorna métricas + 'Risco_Diario' e 'Recuperacao'."""
+        s = RiskEngine._serie_diaria_from_json(row.get("Dados_Diarios_2025", "{}"))
+        if s.empty:
+            return {}
+        ref_date = RiskEngine._last_business_day()
+        s = RiskEngine._serie_business_day(s, ref_date)
+        if s.empty:
+            return {}
+        m = RiskEngine._rolling_means(s, ref_date)
+        hoje, d1 = m["HOJE"], m["D1"]
+        mm7, mm30, mm90, dow = m["MM7"], m["MM30"], m["MM90"], m["DOW"]
+
+        def pct(a, b):
+            return (a - b) / b * 100 if b and b != 0 else 0.0
+
+        # Lógica híbrida para Delta D-1: usar MM7 como fallback quando D-1 = 0
+        if d1 > 0:
+            d_vs_d1 = pct(hoje, d1)
+        elif d1 == 0 and hoje == 0:
+            d_vs_d1 = 0.0
+        elif d1 == 0 and hoje > 0:
+            # Fallback: usar MM7 como referência quando D-1 está zerado
+            d_vs_d1 = pct(hoje, mm7) if mm7 > 0 else 0.0
+        else:
+            d_vs_d1 = 0.0
+        
+        d_vs_mm7 = pct(hoje, mm7)
+        d_vs_mm30 = pct(hoje, mm30)
+        d_vs_mm90 = pct(hoje, mm90)
+
+        mm7_br = RiskEngine._to_float(row.get("MM7_BR"))
+        mm7_uf = RiskEngine._to_float(row.get("MM7_UF"))
+        mm7_cidade = RiskEngine._to_float(row.get("MM7_CIDADE"))
+        contexto_mm = [mm for mm in [mm7_br, mm7_uf, mm7_cidade] if mm is not None and mm > 0]
+
+        reducoes = []
+        for mm_ctx in contexto_mm:
+            reducao = 1 - (hoje / mm_ctx) if mm_ctx > 0 else 0
+            reducoes.append(max(0.0, reducao))
+        maior_reducao = max(reducoes) if reducoes else 0.0
+        reducao_zero_absoluto = any(mm_ctx > 0 and hoje == 0 for mm_ctx in contexto_mm)
+
+        risco = "🟢 Normal"
+        limiar_medio = REDUCAO_MEDIO_RISCO
+        limiar_alto = REDUCAO_ALTO_RISCO
+
+        if reducao_zero_absoluto or maior_reducao >= 1.0 or m["zeros_consec"] >= 7 or m["quedas50_consec"] >= 3:
+            risco = "⚫ Crítico"
+        elif maior_reducao >= limiar_alto:
+            risco = "🔴 Alto"
+        elif maior_reducao >= limiar_medio:
+            risco = "🟠 Moderado"
+        elif maior_reducao > 0:
+            risco = "🟡 Atenção"
+        else:
+            risco = "🟢 Normal"
+
+        recuperacao = False
+        ultimos_4 = s.loc[:ref_date].tail(4)
+        if len(ultimos_4) == 4 and hoje >= mm7 and (ultimos_4.iloc[:3].mean() < 0.9 * mm7):
+            recuperacao = True
+        return {
+            "Vol_Hoje": int(hoje), "Vol_D1": int(d1),
+            "MM7": round(mm7, 3), "MM30": round(mm30, 3), "MM90": round(mm90, 3), "DOW_Media": round(dow, 1),
+            "Delta_D1": round(d_vs_d1, 1), "Delta_MM7": round(d_vs_mm7, 1),
+            "Delta_MM30": round(d_vs_mm30, 1), "Delta_MM90": round(d_vs_mm90, 1),
+            "Risco_Diario": risco, "Recuperacao": recuperacao
+        }
+
+
+    @staticmethod
+    def _registros_diarios(serie_json: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Converte a coluna 'Dados_Diarios_2025' em registros planos (lab, data, coletas).
+
+        Mesmas regras de `_serie_diaria_from_json` aplicadas à coluna inteira: datas
+        inexistentes e entradas inválidas são descartadas e, para a mesma data
+        repetida no JSON, prevalece o último valor.
+
+        Returns:
+            (posição do lab int64, data datetime64[D], coletas int64)
+        """
+        # Um registro por (lab, mês) + listas planas de dias/valores; repetidos via np.repeat
+        mes_lab, mes_ano, mes_num, mes_qtd = [], [], [], []
+        dias, valores = [], []
+        for i, json_str in enumerate(serie_json.tolist()):
+            if pd.isna(json_str) or str(json_str).strip() in ("", "{}", "null"):
+                continue
+            try:
+                j = json.loads(json_str)
+            except Exception:
+                continue
+            for ym, dias_mes in j.items():
+                try:
+                    y, m = ym.split("-")
+                    y, m = int(y), int(m)
+                except Exception:
+                    continue
+                try:
+                    ds = [int(d_str) for d_str in dias_mes]
+                    vs = [int(v) for v in dias_mes.values()]
+                except Exception:
+                    # Entrada malformada no mês: converter item a item, descartando os inválidos
+                    ds, vs = [], []
+                    for d_str, v in dias_mes.items():
+                        try:
+                            d, v = int(d_str), int(v)
+                        except Exception:
+                            continue
+                        ds.append(d)
+                        vs.append(v)
+                mes_lab.append(i)
+                mes_ano.append(y)
+                mes_num.append(m)
+                mes_qtd.append(len(ds))
+                dias.extend(ds)
+                valores.extend(vs)
+
+        if not dias:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype='datetime64[D]'), np.zeros(0, dtype=np.int64)
+
+        qtd = np.asarray(mes_qtd, dtype=np.int64)
+        lab = np.repeat(np.asarray(mes_lab, dtype=np.int64), qtd)
+        ano = np.repeat(np.asarray(mes_ano, dtype=np.int64), qtd)
+        mes = np.repeat(np.asarray(mes_num, dtype=np.int64), qtd)
+        dia = np.asarray(dias, dtype=np.int64)
+        valor = np.asarray(valores, dtype=np.int64)
+
+        # Datas válidas (equivalente ao pd.Timestamp(y, m, d) que falha em datas inexistentes)
+        validos = (mes >= 1) & (mes <= 12) & (ano > 1677) & (ano < 2262) & (dia >= 1)
+        inicio_mes = ((np.where(validos, ano, 1970) - 1970) * 12 + np.where(validos, mes, 1) - 1).astype('datetime64[M]')
+        dias_no_mes = ((inicio_mes + 1).astype('datetime64[D]') - inicio_mes.astype('datetime64[D]')).astype(np.int64)
+        validos &= dia <= dias_no_mes
+        lab, valor = lab[validos], valor[validos]
+        data = inicio_mes[validos].astype('datetime64[D]') + (dia[validos] - 1)
+
+        # Mesma data repetida no JSON: prevalece o último valor (como no dict da versão por linha)
+        chave = lab * 1_000_000 + data.astype(np.int64)
+        _, ultimo = np.unique(chave[::-1], return_index=True)
+        manter = len(chave) - 1 - ultimo
+        return lab[manter], data[manter], valor[manter]
+
+    @staticmethod
+    def _matriz_diaria(serie_json: pd.Series, ref_date: pd.Timestamp) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Monta a matriz laboratório × dia útil (até ref_date) a partir de 'Dados_Diarios_2025'.
+
+        Returns:
+            (matriz int64 [n_labs, n_dias], posição do 1º dia útil de cada lab,
+             máscara de labs com série não vazia)
+        """
+        n = len(serie_json)
+        lab, data, valor = RiskEngine._registros_diarios(serie_json)
+        tem_serie = np.zeros(n, dtype=bool)
+        inicio_pos = np.zeros(n, dtype=np.int64)
+        if not len(data):
+            return np.zeros((n, 0), dtype=np.int64), inicio_pos, tem_serie
+
+        # 1º registro de cada lab (inclui fins de semana/datas futuras, como na versão por linha)
+        inicio_lab = np.full(n, np.iinfo(np.int64).max)
+        np.minimum.at(inicio_lab, lab, data.astype(np.int64))
+        tem_serie[lab] = True
+
+        inicio_global = pd.Timestamp(int(inicio_lab[tem_serie].min()), unit='D')
+        dias_uteis = pd.bdate_range(inicio_global, ref_date) if inicio_global <= ref_date else pd.DatetimeIndex([])
+        dias_uteis_d = dias_uteis.values.astype('datetime64[D]')
+        inicio_pos[tem_serie] = np.searchsorted(dias_uteis_d, inicio_lab[tem_serie].astype('datetime64[D]'), side='left')
+
+        matriz = np.zeros((n, len(dias_uteis_d)), dtype=np.int64)
+        pos = np.searchsorted(dias_uteis_d, data, side='left')
+        no_indice = pos < len(dias_uteis_d)
+        no_indice[no_indice] = dias_uteis_d[pos[no_indice]] == data[no_indice]
+        matriz[lab[no_indice], pos[no_indice]] = valor[no_indice]
+        return matriz, inicio_pos, tem_serie
+
+    @staticmethod
+    def classificar_lote(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Versão vetorizada de `classificar` para o DataFrame inteiro.
+
+        Constrói a matriz laboratório × dia útil uma única vez e calcula HOJE, D-1,
+        MM7/30/90, média DOW, zeros consecutivos, quedas de 50% e recuperação com
+        somas acumuladas. Produz exatamente as mesmas colunas/valores de aplicar
+        `classificar` linha a linha (labs sem série ficam com None).
+        """
+        colunas = [
+            "Vol_Hoje", "Vol_D1", "MM7", "MM30", "MM90", "DOW_Media",
+            "Delta_D1", "Delta_MM7", "Delta_MM30", "Delta_MM90",
+            "Risco_Diario", "Recuperacao"
+        ]
+        n = len(df)
+        if "Dados_Diarios_2025" in df.columns:
+            serie_json = df["Dados_Diarios_2025"]
+        else:
+            serie_json = pd.Series(["{}"] * n, index=df.index)
+        ref_date = RiskEngine._last_business_day()
+        matriz, inicio_pos, tem_serie = RiskEngine._matriz_diaria(serie_json, ref_date)
+        total_dias = matriz.shape[1]
+
+        # Tamanho da série de cada lab (dias úteis do 1º registro até ref_date);
+        # labs cujo 1º registro é posterior a ref_date ficam com métricas zeradas
+        tamanho = np.where(tem_serie, total_dias - inicio_pos, 0)
+        tem_ref = tem_serie & (tamanho > 0)
+        tamanho = np.where(tem_ref, tamanho, 0)
+
+        acumulado = np.zeros((n, total_dias + 1), dtype=np.float64)
+        if total_dias:
+            np.cumsum(matriz, axis=1, out=acumulado[:, 1:])
+        linhas = np.arange(n)
+
+        def _valor(deslocamento: int) -> np.ndarray:
+            """Valor na posição ref - deslocamento (0 fora da série do lab)."""
+            if total_dias <= deslocamento:
+                return np.zeros(n)
+            return np.where(tamanho > deslocamento, matriz[:, total_dias - 1 - deslocamento], 0).astype(np.float64)
+
+        def _media_final(janela: int) -> np.ndarray:
+            """Média dos últimos `janela` dias úteis da série de cada lab."""
+            cont = np.minimum(janela, tamanho)
+            soma = acumulado[:, total_dias] - acumulado[linhas, total_dias - cont]
+            return np.divide(soma, cont, out=np.zeros(n), where=cont > 0)
+
+        hoje = _valor(0)
+        d1 = _valor(1)
+        mm7, mm30, mm90 = _media_final(7), _media_final(30), _media_final(90)
+
+        # Média do mesmo dia da semana: no índice de dias úteis ele se repete a cada 5 posições
+        if total_dias:
+            dow_pos = np.arange(total_dias - 1, -1, -5)[:90]
+            dow_cont = np.minimum(np.where(tamanho > 0, (tamanho - 1) // 5 + 1, 0), 90)
+            dow_soma = np.cumsum(matriz[:, dow_pos], axis=1, dtype=np.float64)
+            dow_soma = np.where(dow_cont > 0, dow_soma[linhas, np.maximum(dow_cont - 1, 0)], 0.0)
+            dow = np.divide(dow_soma, dow_cont, out=np.zeros(n), where=dow_cont > 0)
+        else:
+            dow = np.zeros(n)
+
+        # Zeros consecutivos até ref_date (limitados ao tamanho da série)
+        if total_dias:
+            nao_zero = matriz[:, ::-1] != 0
+            zeros_consec = np.where(nao_zero.any(axis=1), nao_zero.argmax(axis=1), total_dias)
+            zeros_consec = np.minimum(zeros_consec, tamanho)
+        else:
+            zeros_consec = np.zeros(n, dtype=np.int64)
+
+        # Quedas de 50% vs MM7 local nos 3 últimos dias úteis
+        quedas50_consec = np.zeros(n, dtype=np.int64)
+        for desloc in range(3):
+            dentro = tamanho > desloc
+            if total_dias <= desloc:
+                continue
+            p = total_dias - 1 - desloc
+            cont = np.minimum(7, tamanho - desloc)
+            soma = acumulado[:, p + 1] - acumulado[linhas, np.clip(p + 1 - cont, 0, None)]
+            mm7_local = np.divide(soma, cont, out=np.zeros(n), where=cont > 0)
+            queda = (mm7_local > 0) & (matriz[:, p] < 0.5 * mm7_local)
+            quedas50_consec += (dentro & queda).astype(np.int64)
+
+        def _pct(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+            return np.divide(a - b, b, out=np.zeros(n), where=b != 0) * 100
+
+        delta_d1 = np.select(
+            [d1 > 0, (d1 == 0) & (hoje == 0), (d1 == 0) & (hoje > 0)],
+            [_pct(hoje, d1), 0.0, np.where(mm7 > 0, _pct(hoje, mm7), 0.0)],
+            default=0.0
+        )
+        delta_mm7, delta_mm30, delta_mm90 = _pct(hoje, mm7), _pct(hoje, mm30), _pct(hoje, mm90)
+
+        # Redução vs MM7 de contexto (BR/UF/Cidade)
+        maior_reducao = np.zeros(n)
+        reducao_zero_absoluto = np.zeros(n, dtype=bool)
+        for col in ["MM7_BR", "MM7_UF", "MM7_CIDADE"]:
+            if col not in df.columns:
+                continue
+            mm_ctx = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64)
+            valido = mm_ctx > 0
+            reducao = np.maximum(0.0, 1 - np.divide(hoje, mm_ctx, out=np.zeros(n), where=valido))
+            maior_reducao = np.where(valido, np.maximum(maior_reducao, reducao), maior_reducao)
+            reducao_zero_absoluto |= valido & (hoje == 0)
+
+        risco = np.select(
+            [
+                reducao_zero_absoluto | (maior_reducao >= 1.0) | (zeros_consec >= 7) | (quedas50_consec >= 3),
+                maior_reducao >= REDUCAO_ALTO_RISCO,
+                maior_reducao >= REDUCAO_MEDIO_RISCO,
+                maior_reducao > 0,
+            ],
+            ["⚫ Crítico", "🔴 Alto", "🟠 Moderado", "🟡 Atenção"],
+            default="🟢 Normal"
+        )
+
+        if total_dias >= 4:
+            media_3_anteriores = (acumulado[:, total_dias - 1] - acumulado[:, total_dias - 4]) / 3
+        else:
+            media_3_anteriores = np.zeros(n)
+        recuperacao = (tamanho >= 4) & (hoje >= mm7) & (media_3_anteriores < 0.9 * mm7)
+
+        # round() do Python (e não np.round) para manter os mesmos valores da versão por linha
+        def _col(valores, conv):
+            return [conv(v) if ok else None for v, ok in zip(valores.tolist(), tem_serie.tolist())]
+
+        dados = {
+            "Vol_Hoje": _col(hoje, int), "Vol_D1": _col(d1, int),
+            "MM7": _col(mm7, lambda v: round(v, 3)), "MM30": _col(mm30, lambda v: round(v, 3)),
+            "MM90": _col(mm90, lambda v: round(v, 3)), "DOW_Media": _col(dow, lambda v: round(v, 1)),
+            "Delta_D1": _col(delta_d1, lambda v: round(v, 1)), "Delta_MM7": _col(delta_mm7, lambda v: round(v, 1)),
+            "Delta_MM30": _col(delta_mm30, lambda v: round(v, 1)), "Delta_MM90": _col(delta_mm90, lambda v: round(v, 1)),
+            "Risco_Diario": _col(risco, str), "Recuperacao": _col(recuperacao, bool),
+        }
+        return pd.DataFrame(dados, index=df.index, columns=colunas)
+
+
+
+# ========================================
+# PREPARAÇÃO
+# ========================================
+
+def preparar_dataset(df: pd.DataFrame,
+                     carregar_vip: Callable[[], Optional[pd.DataFrame]],
+                     carregar_prices: Callable[[], Optional[pd.DataFrame]],
+                     avisar: Callable[[str], Any] = logger.warning) -> pd.DataFrame:
+    """
+    Prepara e limpa os dados carregados - Atualizado para coerência entre telas.
+
+    Args:
+        df: Tabela de churn como lida do CSV publicado pelo gerador
+        carregar_vip: Retorna a matriz CS normalizada (ou None)
+        carregar_prices: Retorna a tabela de preços (chamada só se faltarem colunas de preço)
+        avisar: Destino dos avisos (st.warning no app, logger no gerador)
+    """
+    if df is None or df.empty:
+        return pd.DataFrame()
+    
+    # VALIDAÇÃO: Remover duplicatas baseadas em CNPJ antes de qualquer processamento
+    if 'CNPJ_PCL' in df.columns:
+        # Criar CNPJ_Normalizado temporariamente para deduplicação se ainda não existir
+        if 'CNPJ_Normalizado' not in df.columns:
+            df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ_PCL'])
+        # Remover duplicatas mantendo o primeiro registro
+        df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
+    elif 'CNPJ_Normalizado' in df.columns:
+        # Se já existe CNPJ_Normalizado mas não CNPJ_PCL, usar CNPJ_Normalizado
+        df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
+    
+    # Removido bloco de debug da sidebar para manter interface limpa
+    # Garantir tipos de dados corretos
+    if 'Data_Analise' in df.columns:
+        df['Data_Analise'] = pd.to_datetime(df['Data_Analise'], errors='coerce')
+    # Calcular volume total se não existir (até o mês atual)
+    try:
+        # Função inline para evitar dependência circular
+        meses_ordem = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+        ano_atual = pd.Timestamp.today().year
+        limite_mes = pd.Timestamp.today().month if 2025 == ano_atual else 12
+        meses_limite = meses_ordem[:limite_mes]
+        sufixo = str(2025)[-2:]
+        meses_2025_dyn = [m for m in meses_limite if f'N_Coletas_{m}_{sufixo}' in df.columns]
+    except Exception:
+        meses_2025_dyn = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out']
+    colunas_meses = [f'N_Coletas_{mes}_25' for mes in meses_2025_dyn]
+    if 'Volume_Total_2025' not in df.columns:
+        df['Volume_Total_2025'] = df[colunas_meses].sum(axis=1, skipna=True) if colunas_meses else 0
+    # Adicionar coluna CNPJ normalizado para match com dados VIP
+    if 'CNPJ_PCL' in df.columns:
+        df['CNPJ_Normalizado'] = normalizar_cnpjs(df['CNPJ_PCL'])
+    # Filtro Active == True para coerência
+    if 'Active' in df.columns:
+        df = df[df['Active'] == True]
+
+    # 2. INTEGRAÇÃO GLOBAL VIP (Para uso nas abas que mostram tudo)
+    try:
+        df_vip = carregar_vip()
+        
+        if df_vip is not None and not df_vip.empty:
+            if 'CNPJ_Normalizado' not in df_vip.columns:
+                 df_vip['CNPJ_Normalizado'] = normalizar_cnpjs(df_vip['CNPJ'])
+            
+            # Garantir que não há duplicatas no df_vip antes do merge
+            df_vip = df_vip.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
+            
+            # Colunas para trazer
+            cols_vip = ['CNPJ_Normalizado', 'Rede', 'Ranking', 'Ranking Rede']
+            cols_vip = [c for c in cols_vip if c in df_vip.columns]
+            
+            # Merge mantendo TODOS os laboratórios (Left Join)
+            df = df.merge(df_vip[cols_vip], on='CNPJ_Normalizado', how='left', suffixes=('', '_vip'))
+            
+            # Remover duplicatas após merge (caso o df original já tivesse duplicatas)
+            df = df.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
+            
+            # Consolidar Rede
+            if 'Rede' not in df.columns and 'Rede_vip' in df.columns:
+                df['Rede'] = df['Rede_vip']
+            elif 'Rede' in df.columns and 'Rede_vip' in df.columns:
+                df['Rede'] = df['Rede'].fillna(df['Rede_vip'])
+            
+            # Criar flags
+            df['VIP'] = np.where(df['Ranking'].notna(), 'Sim', 'Não')
+            df['Rede'] = df['Rede'].fillna('-')
+        else:
+            df['VIP'] = 'Não'
+            df['Rede'] = '-'
+    except Exception as e:
+        # Log erro silencioso para não travar app
+        print(f"Erro integração VIP: {e}")
+        df['VIP'] = 'Não'
+        df['Rede'] = '-'
+
+    # === Nova régua de risco diário ===
+    colunas_novas = [
+        "Vol_Hoje", "Vol_D1", "MM7", "MM30", "MM90", "DOW_Media",
+        "Delta_D1", "Delta_MM7", "Delta_MM30", "Delta_MM90",
+        "Risco_Diario", "Recuperacao"
+    ]
+    try:
+        df_risk = RiskEngine.classificar_lote(df)
+        for c in colunas_novas:
+            df[c] = df_risk.get(c)
+    except Exception:
+        for c in colunas_novas:
+            if c not in df.columns:
+                df[c] = None
+    # Opcional: preservar a coluna antiga para auditoria
+    if 'Status_Risco' in df.columns and 'Risco_Diario' in df.columns:
+        df.rename(columns={'Status_Risco': 'Status_Risco_Legado'}, inplace=True)
+
+    # Normalizar colunas de recoletas
+    recoleta_cols = [c for c in df.columns if c.startswith('Recoletas_')]
+    for col in recoleta_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+    for col in ['Total_Recoletas_2024', 'Total_Recoletas_2025']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+
+    # Garantir colunas de preço mesmo quando não presentes no arquivo (fallback SharePoint)
+    price_cols_expected: List[str] = []
+    price_prefixes: List[str] = []
+    for cfg in PRICE_CATEGORIES.values():
+        prefix = cfg['prefix']
+        price_prefixes.append(prefix)
+        price_cols_expected.extend([
+            f'Preco_{prefix}_Total',
+            f'Preco_{prefix}_Coleta',
+            f'Preco_{prefix}_Exame'
+        ])
+    extra_price_cols = ['Voucher_Commission', 'Data_Preco_Atualizacao']
+    precisa_precos = any(col not in df.columns for col in price_cols_expected) or any(
+        col not in df.columns for col in extra_price_cols
+    )
+    if precisa_precos:
+        df_prices_extra = carregar_prices()
+        if df_prices_extra is not None and not df_prices_extra.empty and '_laboratory' in df_prices_extra.columns:
+            df_prices_extra = df_prices_extra.copy()
+            df_prices_extra['_laboratory'] = df_prices_extra['_laboratory'].astype(str)
+            merge_col = None
+            for candidate in ['_id', 'Laboratory_ID', 'LaboratoryId', 'LaboratoryID', 'Lab_ID', 'LabId', 'id']:
+                if candidate in df.columns:
+                    merge_col = candidate
+                    df[merge_col] = df[merge_col].astype(str)
+                    break
+            if merge_col:
+                lookup = df_prices_extra.set_index('_laboratory')
+                mapping_cache = {}
+                for col in price_cols_expected + extra_price_cols:
+                    if col in lookup.columns:
+                        mapping_cache[col] = lookup[col].to_dict()
+                for col, mapping in mapping_cache.items():
+                    if col not in df.columns:
+                        df[col] = np.nan
+                    df[col] = df[col].fillna(df[merge_col].map(mapping))
+            else:
+                avisar("⚠️ Não foi possível vincular preços aos laboratórios (ID ausente).")
+
+    for col in price_cols_expected:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    if 'Voucher_Commission' in df.columns:
+        df['Voucher_Commission'] = pd.to_numeric(df['Voucher_Commission'], errors='coerce')
+
+    if 'Data_Preco_Atualizacao' in df.columns:
+        df['Data_Preco_Atualizacao'] = pd.to_datetime(df['Data_Preco_Atualizacao'], errors='coerce', utc=True)
+        try:
+            df['Data_Preco_Atualizacao'] = df['Data_Preco_Atualizacao'].dt.tz_convert(TIMEZONE)
+        except Exception:
+            pass
+
+    return df
+
+
+# ========================================
+# ARTEFATO PRÉ-PREPARADO (ARROW IPC / FEATHER)
+# ========================================
+
+def sha256_bytes(conteudo: bytes) -> str:
+    """SHA-256 de um conteúdo em memória."""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def data_referencia() -> str:
+    """Dia útil de referência da régua de risco (o dataset preparado só vale para ele)."""
+    return RiskEngine._last_business_day().strftime('%Y-%m-%d')
+
+
+def salvar_dataset_preparado(df: pd.DataFrame, caminho: str, fontes: Dict[str, Optional[str]]) -> str:
+    """
+    Grava o dataset preparado em Feather (Arrow IPC) sem compressão, de forma atômica.
+
+    Args:
+        df: Saída de preparar_dataset
+        caminho: Arquivo de destino
+        fontes: Nome do arquivo de entrada -> SHA-256 do conteúdo usado na preparação
+                (None para fonte consultada que não existia)
+
+    Returns:
+        Caminho gravado
+    """
+    tabela = pa.Table.from_pandas(df, preserve_index=True)
+    metadados = dict(tabela.schema.metadata or {})
+    metadados[META_VERSAO] = str(VERSAO_SCHEMA).encode()
+    metadados[META_DATA_REFERENCIA] = data_referencia().encode()
+    metadados[META_FONTES] = json.dumps(fontes, sort_keys=True).encode()
+    tabela = tabela.replace_schema_metadata(metadados)
+
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    feather.write_feather(tabela, tmp, compression='uncompressed')
+    os.replace(tmp, caminho)
+    return caminho
+
+
+def carregar_dataset_preparado(caminho: str,
+                               hash_fonte: Callable[[str], Optional[str]]) -> Optional[pd.DataFrame]:
+    """
+    Lê o artefato pré-preparado se ele valer para os arquivos atuais.
+
+    O arquivo é aberto via memory-map (metadado e buffers Arrow sem cópia nem
+    descompactação), mas o to_pandas copia as colunas para memória do pandas: o
+    ganho é pular a preparação, não evitar a materialização do DataFrame.
+
+    O artefato é descartado (retorna None) quando a versão do schema é outra, quando
+    foi preparado para outro dia útil de referência ou quando o SHA-256 de alguma
+    fonte gravada difere de hash_fonte(nome) - o arquivo local equivalente do app.
+    Fonte gravada como None (ausente no gerador) exige hash_fonte(nome) None.
+    """
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with pa.memory_map(caminho, 'r') as fonte:
+            tabela = pa.ipc.open_file(fonte).read_all()
+            metadados = tabela.schema.metadata or {}
+            if metadados.get(META_VERSAO) != str(VERSAO_SCHEMA).encode():
+                return None
+            if metadados.get(META_DATA_REFERENCIA) != data_referencia().encode():
+                return None
+            fontes = json.loads(metadados.get(META_FONTES, b'{}'))
+            if not fontes or any(hash_fonte(nome) != sha for nome, sha in fontes.items()):
+                # sha None (fonte ausente no gerador) também precisa estar ausente aqui
+                return None
+            # Inteiros com nulos voltam como objetos (int/None), como saem da régua de risco
+            df = tabela.to_pandas(integer_object_nulls=True)
+    except Exception as e:
+        logger.warning(f"Dataset preparado inválido em {caminho} (ignorado): {e}")
+        return None
+    return _restaurar_tipos_object(df, tabela.schema.pandas_metadata or {})
+
+
+def _restaurar_tipos_object(df: pd.DataFrame, pandas_metadata: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Devolve às colunas que eram object no DataFrame original o dtype object, com
+    nulos como NaN (o Arrow não distingue None de NaN, e NaN é o que o read_csv gera).
+    """
+    colunas_object = [
+        c['name'] for c in pandas_metadata.get('columns', [])
+        if c.get('numpy_type') == 'object' and c.get('name') in df.columns
+    ]
+    for col in colunas_object:
+        serie = df[col] if df[col].dtype == object else df[col].astype(object)
+        if serie.isna().any():
+            serie = serie.where(serie.notna(), np.nan)
+        df[col] = serie
+    return df
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 import json
+from io import BytesIO
 from typing import Dict, List, Optional, Tuple, Any
 try:
     import tomllib  # Python 3.11+
@@ -17,12 +18,16 @@ except Exception:  # pragma: no cover
     tomllib = None
 
 try:
-    from churn_sp_connector import ChurnSPConnector
+    from churn_sp_connector import ChurnSPConnector, obter_connector
 except Exception:
     ChurnSPConnector = None
+    obter_connector = None
 
 # Importar configurações
 from config_churn import *
+from match_concorrentes import obter_tabela_match
+from dataset_preparado import preparar_dataset, salvar_dataset_preparado, sha256_bytes
+from normalizacao import normalizar_cnpjs
 
 # Configurações de log
 logger = logging.getLogger(__name__)
@@ -882,249 +887,132 @@ def calcular_wow_iso(base_df: pd.DataFrame, df_gatherings_2025: pd.DataFrame, uf
     return df_wow_result.reindex(base_df.index, fill_value=0)
 
 
-def integrar_dados_gralab(base_df: pd.DataFrame) -> pd.DataFrame:
+# Relatórios locais dos scrapers de concorrentes (nome na tabela de match -> pasta em Automations)
+RELATORIOS_CONCORRENTES = {
+    'gralab': os.path.join("cunha", "relatorio_completo_laboratorios_gralab.xlsx"),
+    'sodre': os.path.join("sodre", "relatorio_completo_laboratorios_sodre.xlsx"),
+    'db': os.path.join("db", "relatorio_completo_laboratorios_db.xlsx"),
+}
+
+
+def _coluna_cnpj_base(base_df: pd.DataFrame) -> Optional[str]:
+    """Coluna de CNPJ da base de laboratórios (CNPJ_PCL ou cnpj)."""
+    for coluna in ('CNPJ_PCL', 'cnpj'):
+        if coluna in base_df.columns:
+            return coluna
+    return None
+
+
+def obter_tabela_match_cnpj(base_df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """
+    Tabela de match de CNPJs entre a base e os concorrentes (match_concorrentes).
+
+    Só é remontada quando a base de CNPJs ou algum relatório de concorrente muda;
+    caso contrário é lida de OUTPUT_DIR/TABELA_MATCH_FILE.
+    """
+    coluna_cnpj = _coluna_cnpj_base(base_df)
+    if coluna_cnpj is None:
+        logger.warning("Coluna CNPJ não encontrada no base_df. Tabela de match não montada.")
+        logger.warning(f"Colunas disponíveis: {list(base_df.columns)[:10]}")
+        return None
+    arquivos = {
+        nome: os.path.join(OUTPUT_DIR, "Automations", relativo)
+        for nome, relativo in RELATORIOS_CONCORRENTES.items()
+    }
+    for nome, arquivo in arquivos.items():
+        if not os.path.exists(arquivo):
+            logger.warning(f"Arquivo {nome} não encontrado: {arquivo}")
+    try:
+        return obter_tabela_match(
+            base_df[coluna_cnpj], arquivos, os.path.join(OUTPUT_DIR, TABELA_MATCH_FILE)
+        )
+    except Exception as e:
+        logger.error(f"Erro ao montar tabela de match de CNPJs: {e}")
+        return None
+
+
+def _integrar_concorrente(base_df: pd.DataFrame, tabela_match: Optional[pd.DataFrame],
+                          nome: str, rotulo: str, tipo_padrao: str = '') -> pd.DataFrame:
+    """
+    Marca os laboratórios com movimentação recente no concorrente (últimos
+    GRALAB_JANELA_DIAS dias), a partir da tabela de match.
+
+    A leitura antiga do Gralab exigia uma coluna 'Data' que o scraper não grava
+    (ele usa 'Data Entrada'/'Tipo Movimentação'), então Apareceu_Gralab nunca
+    ligava. Pela tabela de match o sinal passa a funcionar e aparece no motivo
+    exibido pelo app.
+
+    Returns:
+        DataFrame com colunas Apareceu_<rotulo>, <rotulo>_Data, <rotulo>_Tipo
+    """
+    base_df = base_df.copy()
+    base_df[f'Apareceu_{rotulo}'] = False
+    base_df[f'{rotulo}_Data'] = pd.NaT
+    base_df[f'{rotulo}_Tipo'] = ''
+
+    coluna_data = f'mov_data_{nome}'
+    if tabela_match is None or coluna_data not in tabela_match.columns:
+        logger.warning(f"Sem movimentações do {rotulo} na tabela de match")
+        return base_df
+
+    coluna_cnpj = _coluna_cnpj_base(base_df)
+    if coluna_cnpj is None:
+        return base_df
+    base_df['CNPJ_Normalizado'] = normalizar_cnpjs(base_df[coluna_cnpj], vazio_se_zerado=True)
+
+    hoje = datetime.now()
+    janela_dias = GRALAB_JANELA_DIAS if 'GRALAB_JANELA_DIAS' in globals() else 14
+    datas = tabela_match[coluna_data]
+    recentes = tabela_match.loc[datas.notna() & ((hoje - datas).dt.days <= janela_dias)]
+    logger.info(f"CNPJs únicos no {rotulo} (últimos {janela_dias} dias): {len(recentes)}")
+    if recentes.empty:
+        return base_df
+
+    data = base_df['CNPJ_Normalizado'].map(recentes[coluna_data])
+    apareceu = data.notna()
+    tipo = base_df['CNPJ_Normalizado'].map(recentes[f'mov_tipo_{nome}']).fillna('').astype(str)
+    if tipo_padrao:
+        tipo = tipo.mask(apareceu & (tipo == ''), tipo_padrao)
+
+    base_df[f'Apareceu_{rotulo}'] = apareceu
+    base_df[f'{rotulo}_Data'] = data
+    base_df[f'{rotulo}_Tipo'] = tipo.where(apareceu, '')
+    logger.debug(f"Integração {rotulo} concluída: {int(apareceu.sum())} laboratórios com sinal de concorrência")
+    return base_df
+
+
+def integrar_dados_gralab(base_df: pd.DataFrame, tabela_match: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Integra dados de concorrência do Gralab (últimos 7-14 dias).
     
     Args:
         base_df: DataFrame com dados dos laboratórios
+        tabela_match: Tabela de match de CNPJs (montada aqui se não informada)
         
     Returns:
         DataFrame com colunas Apareceu_Gralab, Gralab_Data, Gralab_Tipo
     """
     logger.debug("Integrando dados de concorrência do Gralab")
-    
-    # Inicializar colunas
-    base_df = base_df.copy()
-    base_df['Apareceu_Gralab'] = False
-    base_df['Gralab_Data'] = pd.NaT
-    base_df['Gralab_Tipo'] = ''
-    
-    # Verificar se arquivo existe
-    gralab_excel = os.path.join(OUTPUT_DIR, "Automations", "cunha", "relatorio_completo_laboratorios_gralab.xlsx")
-    
-    if not os.path.exists(gralab_excel):
-        logger.warning(f"Arquivo Gralab não encontrado: {gralab_excel}")
-        return base_df
-    
-    try:
-        # Ler aba EntradaSaida
-        df_entrada_saida = pd.read_excel(gralab_excel, sheet_name='EntradaSaida', engine='openpyxl')
-        logger.info(f"Dados Gralab carregados: {len(df_entrada_saida)} registros")
-        
-        # Verificar colunas necessárias
-        if 'CNPJ' not in df_entrada_saida.columns or 'Data' not in df_entrada_saida.columns:
-            logger.error("Colunas esperadas não encontradas no arquivo Gralab")
-            return base_df
-        
-        # Filtrar últimos N dias
-        df_entrada_saida['Data'] = pd.to_datetime(df_entrada_saida['Data'], errors='coerce')
-        hoje = datetime.now()
-        janela_dias = GRALAB_JANELA_DIAS if 'GRALAB_JANELA_DIAS' in globals() else 14
-        
-        df_recente = df_entrada_saida[
-            (df_entrada_saida['Data'].notna()) &
-            ((hoje - df_entrada_saida['Data']).dt.days <= janela_dias)
-        ].copy()
-        
-        logger.info(f"Registros Gralab recentes (últimos {janela_dias} dias): {len(df_recente)}")
-        
-        if df_recente.empty:
-            return base_df
-        
-        # Normalizar CNPJ
-        def normalizar_cnpj(cnpj):
-            if pd.isna(cnpj):
-                return ''
-            cnpj_str = str(cnpj).strip()
-            # Remover caracteres não numéricos e garantir 14 dígitos
-            cnpj_limpo = ''.join(filter(str.isdigit, cnpj_str))
-            if len(cnpj_limpo) == 0:
-                return ''
-            # Garantir 14 dígitos (preencher com zeros à esquerda se necessário)
-            return cnpj_limpo.zfill(14)[:14]
-        
-        # Normalizar CNPJs em ambos os DataFrames
-        df_recente['CNPJ_Normalizado'] = df_recente['CNPJ'].apply(normalizar_cnpj)
-        # Verificar se CNPJ_PCL existe, caso contrário tentar outras colunas
-        if 'CNPJ_PCL' in base_df.columns:
-            base_df['CNPJ_Normalizado'] = base_df['CNPJ_PCL'].apply(normalizar_cnpj)
-        elif 'cnpj' in base_df.columns:
-            base_df['CNPJ_Normalizado'] = base_df['cnpj'].apply(normalizar_cnpj)
-        else:
-            logger.warning("Coluna CNPJ não encontrada no base_df. Tentando colunas disponíveis...")
-            logger.warning(f"Colunas disponíveis: {list(base_df.columns)[:10]}")
-            return base_df
-        
-        # Remover CNPJs vazios ou inválidos
-        df_recente = df_recente[df_recente['CNPJ_Normalizado'] != ''].copy()
-        
-        logger.info(f"CNPJs normalizados - Gralab: {len(df_recente)}, Base: {base_df['CNPJ_Normalizado'].notna().sum()}")
-        
-        # Pegar registro mais recente por CNPJ
-        df_recente = df_recente.sort_values('Data', ascending=False)
-        df_recente_unique = df_recente.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-        
-        logger.info(f"CNPJs únicos no Gralab (últimos {janela_dias} dias): {len(df_recente_unique)}")
-        
-        # Merge usando merge do pandas para melhor performance
-        base_df_merged = base_df.merge(
-            df_recente_unique[['CNPJ_Normalizado', 'Data', 'Tipo']].rename(columns={'Data': 'Gralab_Data', 'Tipo': 'Gralab_Tipo'}),
-            on='CNPJ_Normalizado',
-            how='left'
-        )
-        
-        # Atualizar flags
-        base_df_merged['Apareceu_Gralab'] = base_df_merged['Gralab_Data'].notna()
-        
-        # Se Gralab_Tipo não existir na merge, criar coluna vazia
-        if 'Gralab_Tipo' not in base_df_merged.columns:
-            base_df_merged['Gralab_Tipo'] = ''
-        else:
-            base_df_merged['Gralab_Tipo'] = base_df_merged['Gralab_Tipo'].fillna('')
-        
-        qtd_com_gralab = base_df_merged['Apareceu_Gralab'].sum()
-        logger.debug(f"Integração Gralab concluída: {qtd_com_gralab} laboratórios com sinal de concorrência")
-        
-        # Log de exemplo para debug
-        if qtd_com_gralab > 0:
-            exemplo = base_df_merged[base_df_merged['Apareceu_Gralab']].head(1)
-            if not exemplo.empty:
-                logger.debug(f"Exemplo de match Gralab: CNPJ={exemplo.iloc[0].get('CNPJ_PCL', 'N/A')}, Data={exemplo.iloc[0].get('Gralab_Data', 'N/A')}")
-        
-        return base_df_merged
-        
-    except Exception as e:
-        logger.error(f"Erro ao integrar dados Gralab: {e}")
-    
-    return base_df
+    if tabela_match is None:
+        tabela_match = obter_tabela_match_cnpj(base_df)
+    return _integrar_concorrente(base_df, tabela_match, 'gralab', 'Gralab')
 
 
-def integrar_dados_sodre(base_df: pd.DataFrame) -> pd.DataFrame:
+def integrar_dados_sodre(base_df: pd.DataFrame, tabela_match: Optional[pd.DataFrame] = None) -> pd.DataFrame:
     """
     Integra dados de concorrência do Sodre (últimos 7-14 dias).
     
     Args:
         base_df: DataFrame com dados dos laboratórios
+        tabela_match: Tabela de match de CNPJs (montada aqui se não informada)
         
     Returns:
         DataFrame com colunas Apareceu_Sodre, Sodre_Data, Sodre_Tipo
     """
     logger.debug("Integrando dados de concorrência do Sodre")
-    
-    # Inicializar colunas
-    base_df = base_df.copy()
-    base_df['Apareceu_Sodre'] = False
-    base_df['Sodre_Data'] = pd.NaT
-    base_df['Sodre_Tipo'] = ''
-    
-    # Verificar se arquivo existe
-    sodre_excel = os.path.join(OUTPUT_DIR, "Automations", "sodre", "relatorio_completo_laboratorios_sodre.xlsx")
-    
-    if not os.path.exists(sodre_excel):
-        logger.warning(f"Arquivo Sodre não encontrado: {sodre_excel}")
-        return base_df
-    
-    try:
-        # Ler aba EntradaSaida
-        df_entrada_saida = pd.read_excel(sodre_excel, sheet_name='EntradaSaida', engine='openpyxl')
-        logger.info(f"Dados Sodre carregados: {len(df_entrada_saida)} registros")
-        
-        # Verificar colunas necessárias
-        if 'CNPJ' not in df_entrada_saida.columns or 'Data Entrada' not in df_entrada_saida.columns:
-            logger.error("Colunas esperadas não encontradas no arquivo Sodre")
-            return base_df
-        
-        # Filtrar últimos N dias (usar Data Entrada)
-        df_entrada_saida['Data'] = pd.to_datetime(df_entrada_saida['Data Entrada'], errors='coerce')
-        hoje = datetime.now()
-        janela_dias = GRALAB_JANELA_DIAS if 'GRALAB_JANELA_DIAS' in globals() else 14
-        
-        df_recente = df_entrada_saida[
-            (df_entrada_saida['Data'].notna()) &
-            ((hoje - df_entrada_saida['Data']).dt.days <= janela_dias)
-        ].copy()
-        
-        logger.info(f"Registros Sodre recentes (últimos {janela_dias} dias): {len(df_recente)}")
-        
-        if df_recente.empty:
-            return base_df
-        
-        # Normalizar CNPJ
-        def normalizar_cnpj(cnpj):
-            if pd.isna(cnpj):
-                return ''
-            cnpj_str = str(cnpj).strip()
-            # Remover caracteres não numéricos e garantir 14 dígitos
-            cnpj_limpo = ''.join(filter(str.isdigit, cnpj_str))
-            if len(cnpj_limpo) == 0:
-                return ''
-            # Garantir 14 dígitos (preencher com zeros à esquerda se necessário)
-            return cnpj_limpo.zfill(14)[:14]
-        
-        # Normalizar CNPJs em ambos os DataFrames
-        df_recente['CNPJ_Normalizado'] = df_recente['CNPJ'].apply(normalizar_cnpj)
-        # Verificar se CNPJ_PCL existe, caso contrário tentar outras colunas
-        if 'CNPJ_PCL' in base_df.columns:
-            base_df['CNPJ_Normalizado'] = base_df['CNPJ_PCL'].apply(normalizar_cnpj)
-        elif 'cnpj' in base_df.columns:
-            base_df['CNPJ_Normalizado'] = base_df['cnpj'].apply(normalizar_cnpj)
-        else:
-            logger.warning("Coluna CNPJ não encontrada no base_df. Tentando colunas disponíveis...")
-            logger.warning(f"Colunas disponíveis: {list(base_df.columns)[:10]}")
-            return base_df
-        
-        # Remover CNPJs vazios ou inválidos
-        df_recente = df_recente[df_recente['CNPJ_Normalizado'] != ''].copy()
-        
-        logger.info(f"CNPJs normalizados - Sodre: {len(df_recente)}, Base: {base_df['CNPJ_Normalizado'].notna().sum()}")
-        
-        # Pegar registro mais recente por CNPJ
-        df_recente = df_recente.sort_values('Data', ascending=False)
-        df_recente_unique = df_recente.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
-        
-        # Pegar também a coluna 'Tipo Movimentação' se existir
-        if 'Tipo Movimentação' in df_recente_unique.columns:
-            tipo_col = 'Tipo Movimentação'
-        elif 'Tipo' in df_recente_unique.columns:
-            tipo_col = 'Tipo'
-        else:
-            df_recente_unique['Tipo'] = 'Credenciamento'  # Valor padrão
-            tipo_col = 'Tipo'
-        
-        logger.info(f"CNPJs únicos no Sodre (últimos {janela_dias} dias): {len(df_recente_unique)}")
-        
-        # Merge usando merge do pandas para melhor performance
-        base_df_merged = base_df.merge(
-            df_recente_unique[['CNPJ_Normalizado', 'Data', tipo_col]].rename(columns={'Data': 'Sodre_Data', tipo_col: 'Sodre_Tipo'}),
-            on='CNPJ_Normalizado',
-            how='left'
-        )
-        
-        # Atualizar flags
-        base_df_merged['Apareceu_Sodre'] = base_df_merged['Sodre_Data'].notna()
-        
-        # Se Sodre_Tipo não existir na merge, criar coluna vazia
-        if 'Sodre_Tipo' not in base_df_merged.columns:
-            base_df_merged['Sodre_Tipo'] = ''
-        else:
-            base_df_merged['Sodre_Tipo'] = base_df_merged['Sodre_Tipo'].fillna('')
-        
-        qtd_com_sodre = base_df_merged['Apareceu_Sodre'].sum()
-        logger.debug(f"Integração Sodre concluída: {qtd_com_sodre} laboratórios com sinal de concorrência")
-        
-        # Log de exemplo para debug
-        if qtd_com_sodre > 0:
-            exemplo = base_df_merged[base_df_merged['Apareceu_Sodre']].head(1)
-            if not exemplo.empty:
-                logger.debug(f"Exemplo de match Sodre: CNPJ={exemplo.iloc[0].get('CNPJ_PCL', 'N/A')}, Data={exemplo.iloc[0].get('Sodre_Data', 'N/A')}")
-        
-        return base_df_merged
-        
-    except Exception as e:
-        logger.error(f"Erro ao integrar dados Sodre: {e}")
-    
-    return base_df
+    if tabela_match is None:
+        tabela_match = obter_tabela_match_cnpj(base_df)
+    return _integrar_concorrente(base_df, tabela_match, 'sodre', 'Sodre', tipo_padrao='Credenciamento')
 
 
 def classificar_risco_v2(row: pd.Series) -> Tuple[str, str]:
@@ -1170,6 +1058,60 @@ def classificar_risco_v2(row: pd.Series) -> Tuple[str, str]:
     return 'Normal', 'Volume dentro do esperado'
 
 
+def _ler_csv_fonte(nome_arquivo: str, fontes: Dict[str, Optional[str]], **kwargs) -> Optional[pd.DataFrame]:
+    """
+    Lê um CSV de OUTPUT_DIR registrando o SHA-256 do conteúdo em `fontes`.
+
+    Arquivo ausente fica registrado como None: o artefato foi preparado sem ele e
+    só vale num app que também não o tem.
+    """
+    caminho = os.path.join(OUTPUT_DIR, nome_arquivo)
+    if not os.path.exists(caminho):
+        fontes[nome_arquivo] = None
+        return None
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    fontes[nome_arquivo] = sha256_bytes(conteudo)
+    return pd.read_csv(BytesIO(conteudo), **kwargs)
+
+def publicar_dataset_preparado(conteudo_csv: bytes, nome_csv: str) -> Optional[str]:
+    """
+    Gera o dataset preparado do dashboard (saída de preparar_dados) em Feather.
+
+    Reproduz o caminho do app: lê os mesmos bytes do CSV publicado e usa a matriz VIP
+    e a tabela de preços de OUTPUT_DIR (os mesmos arquivos que o app baixa). O
+    SHA-256 de cada fonte consultada (None se ela não existia) vai no metadado para
+    o app só usar o artefato quando ele corresponde aos seus arquivos.
+
+    Returns:
+        Caminho do arquivo gerado, ou None se a preparação falhar
+    """
+    try:
+        inicio = time.time()
+        fontes = {nome_csv: sha256_bytes(conteudo_csv)}
+
+        def carregar_vip() -> Optional[pd.DataFrame]:
+            df_vip = _ler_csv_fonte(VIP_CSV_FILE, fontes, encoding='utf-8-sig', dtype={'CNPJ': 'string'})
+            if df_vip is None or 'CNPJ' not in df_vip.columns:
+                return None
+            df_vip['CNPJ'] = df_vip['CNPJ'].astype(str)
+            df_vip['CNPJ_Normalizado'] = normalizar_cnpjs(df_vip['CNPJ'])
+            return df_vip.drop_duplicates(subset=['CNPJ_Normalizado'], keep='first')
+
+        def carregar_prices() -> Optional[pd.DataFrame]:
+            return _ler_csv_fonte(PRICES_FILE, fontes, encoding=ENCODING, low_memory=False)
+
+        df_raw = pd.read_csv(BytesIO(conteudo_csv), encoding=ENCODING, low_memory=False)
+        # Mesmo modo Copy-on-Write do app
+        with pd.option_context('mode.copy_on_write', True):
+            df = preparar_dataset(df_raw, carregar_vip, carregar_prices)
+        caminho = salvar_dataset_preparado(df, os.path.join(OUTPUT_DIR, DATASET_PREPARADO_FILE), fontes)
+        logger.info(f"Dataset preparado gerado em {time.time() - inicio:.1f}s: {caminho}")
+        return caminho
+    except Exception as e:
+        logger.warning(f"Falha ao gerar dataset preparado (ignorado): {e}")
+        return None
+
 def calcular_metricas_churn():
     """Calcula métricas de churn com agregações vetorizadas (rápidas)."""
     
@@ -1882,11 +1824,12 @@ def calcular_metricas_churn():
                 coluna_dias_uteis='Dias_Sem_Coleta_Uteis'
             )
             
-            # 5. Integrar dados de concorrência (Gralab)
-            base = integrar_dados_gralab(base)
+            # 5. Integrar dados de concorrência (Gralab e Sodre) a partir da tabela de match
+            tabela_match = obter_tabela_match_cnpj(base)
+            base = integrar_dados_gralab(base, tabela_match)
             
             # 5b. Integrar dados de concorrência (Sodre)
-            base = integrar_dados_sodre(base)
+            base = integrar_dados_sodre(base, tabela_match)
             
             # 6. Aplicar classificação de risco v2 (binária)
             risco_v2_results = base.apply(classificar_risco_v2, axis=1)
@@ -2100,6 +2043,11 @@ def calcular_metricas_churn():
         df_churn.to_csv(arquivo_csv, index=False, encoding=ENCODING)
         logger.info(f"Análise de churn salva: {arquivo_latest}")
         
+    # Bytes exatos do CSV publicado (o dataset preparado é amarrado ao SHA-256 deles)
+    buffer_csv = BytesIO()
+    df_churn.to_csv(buffer_csv, index=False)
+    conteudo_csv = buffer_csv.getvalue()
+
     # Tentar upload para SharePoint usando secrets locais (se disponível)
     try:
         if tomllib is not None and ChurnSPConnector is not None:
@@ -2111,13 +2059,26 @@ def calcular_metricas_churn():
                 files_cfg = secrets_cfg.get('files', {})
                 arquivo_remoto = files_cfg.get('arquivo')
                 if arquivo_remoto:
-                    connector = ChurnSPConnector(config={
+                    connector = obter_connector({
                         'graph': secrets_cfg.get('graph', {}),
                         'onedrive': secrets_cfg.get('onedrive', {}),
                         'files': secrets_cfg.get('files', {}),
                         'output_dir': secrets_cfg.get('output_dir', OUTPUT_DIR)
                     })
-                    connector.write_csv(df_churn, arquivo_remoto, overwrite=True)
+                    # Dataset preparado vai antes do CSV: quando o app detectar a versão
+                    # nova, o artefato correspondente já está publicado
+                    caminho_preparado = publicar_dataset_preparado(conteudo_csv, os.path.basename(arquivo_remoto))
+                    if caminho_preparado:
+                        try:
+                            remote_dir = os.path.dirname(arquivo_remoto)
+                            remote_preparado = f"{remote_dir}/{DATASET_PREPARADO_FILE}" if remote_dir else DATASET_PREPARADO_FILE
+                            with open(caminho_preparado, 'rb') as f:
+                                connector.upload(remote_preparado.replace("\\", "/"), f.read(), overwrite=True)
+                            logger.info(f"Dataset preparado enviado ao SharePoint: {remote_preparado}")
+                        except Exception as e:
+                            logger.warning(f"Falha ao enviar dataset preparado ao SharePoint (ignorado): {e}")
+
+                    connector.upload(arquivo_remoto, conteudo_csv, overwrite=True)
                     logger.info("Arquivo de churn enviado ao SharePoint com sucesso.")
 
                     # Upload também o metadados de fechamento (essencial para o app)
@@ -2130,7 +2091,7 @@ def calcular_metricas_churn():
                         with open(meta_path, 'rb') as f:
                             meta_content = f.read()
                         
-                        connector.upload_small(remote_meta_path, meta_content, overwrite=True)
+                        connector.upload(remote_meta_path, meta_content, overwrite=True)
                         logger.info(f"Metadados enviados ao SharePoint: {remote_meta_path}")
     except Exception as e:
         logger.warning(f"Falha ao enviar arquivo ao SharePoint (ignorado): {e}")
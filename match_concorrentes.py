@@ -0,0 +1,305 @@
+# ========================================
+# TABELA DE MATCH DE CNPJ COM CONCORRENTES
+# Sistema de Alertas Churn v2
+# ========================================
+
+"""
+Tabela única de correspondência de CNPJs entre a nossa base e os concorrentes
+(Gralab, Sodre, DB Toxicológico).
+
+Uma linha por CNPJ normalizado (índice), com presença em cada base, datas de
+movimentação/visibilidade em cada concorrente e preços praticados. É montada
+apenas quando uma das fontes muda (assinatura gravada no metadado do Parquet) e
+consumida pelo gerador (sinais de concorrência) e pelo app (análise de concorrente).
+"""
+
+import os
+import hashlib
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from normalizacao import normalizar_cnpjs
+
+logger = logging.getLogger(__name__)
+
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+CONCORRENTES = ('gralab', 'sodre', 'db')
+
+# Abas dos relatórios dos scrapers (aba -> sufixo do sidecar Parquet)
+ABAS_RELATORIO = {
+    'Dados Completos': 'dados_completos',
+    'EntradaSaida': 'entrada_saida',
+}
+
+# Colunas de preço da aba 'Dados Completos' -> prefixo na tabela de match
+COLUNAS_PRECO = {
+    'Preço CNH': 'preco_cnh',
+    'Preço Concurso': 'preco_concurso',
+    'Preço CLT': 'preco_clt',
+}
+
+# Versão do layout da tabela (entra na assinatura: mudar invalida os Parquets gravados)
+VERSAO_TABELA = 1
+
+
+# ========================================
+# LEITURA
+# ========================================
+
+def carregar_relatorio_concorrente(caminho_excel: str) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Lê as abas de ABAS_RELATORIO de um relatório de concorrente local.
+
+    Usa os sidecars Parquet publicados pelos scrapers quando o hash do Excel de
+    origem confere; as demais abas são lidas do Excel com CNPJ_Normalizado.
+
+    Returns:
+        Dicionário aba -> DataFrame ou None se o arquivo não existir
+    """
+    if not caminho_excel or not os.path.exists(caminho_excel):
+        return None
+
+    fonte_sha256 = hash_arquivo(caminho_excel)
+    base = os.path.splitext(caminho_excel)[0]
+    abas = {}
+    for aba, sufixo in ABAS_RELATORIO.items():
+        caminho = f"{base}_{sufixo}.parquet"
+        if not os.path.exists(caminho):
+            continue
+        try:
+            import pyarrow.parquet as pq
+            metadata = pq.read_schema(caminho).metadata or {}
+            if metadata.get(b'fonte_sha256', b'').decode() == fonte_sha256:
+                abas[aba] = pd.read_parquet(caminho)
+        except Exception as e:
+            logger.warning(f"Sidecar Parquet inválido ({os.path.basename(caminho)}): {e}")
+
+    faltantes = [aba for aba in ABAS_RELATORIO if aba not in abas]
+    if faltantes:
+        with pd.ExcelFile(caminho_excel, engine='openpyxl') as xls:
+            for aba in faltantes:
+                if aba not in xls.sheet_names:
+                    continue
+                df = xls.parse(aba)
+                coluna_cnpj = next((c for c in df.columns if str(c).upper() == 'CNPJ'), None)
+                if coluna_cnpj:
+                    df['CNPJ_Normalizado'] = normalizar_cnpjs(df[coluna_cnpj], vazio_se_zerado=True)
+                abas[aba] = df
+    return abas
+
+
+_HASH_ARQUIVOS: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def hash_arquivo(caminho: str) -> Optional[str]:
+    """SHA-256 do arquivo (None se não existe), recalculado apenas quando tamanho/mtime mudam."""
+    try:
+        st_arq = os.stat(caminho)
+    except OSError:
+        return None
+    assinatura = (st_arq.st_size, st_arq.st_mtime_ns)
+    memo = _HASH_ARQUIVOS.get(caminho)
+    if memo and memo[0] == assinatura:
+        return memo[1]
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    _HASH_ARQUIVOS[caminho] = (assinatura, h.hexdigest())
+    return _HASH_ARQUIVOS[caminho][1]
+
+
+# ========================================
+# CONSTRUÇÃO DA TABELA
+# ========================================
+
+def _primeira_coluna(df: pd.DataFrame, candidatas: Iterable[str]) -> Optional[str]:
+    return next((c for c in candidatas if c in df.columns), None)
+
+
+def _colunas_concorrente(dados: Dict[str, pd.DataFrame], nome: str) -> pd.DataFrame:
+    """Colunas da tabela de match vindas de um concorrente, indexadas por CNPJ."""
+    partes = []
+
+    completos = dados.get('Dados Completos')
+    if completos is not None and 'CNPJ_Normalizado' in completos.columns:
+        cnpjs = normalizar_cnpjs(completos['CNPJ_Normalizado'], vazio_se_zerado=True)
+        validos = completos.loc[cnpjs != ''].assign(_cnpj=cnpjs[cnpjs != ''])
+        # Primeira ocorrência do CNPJ (mesma linha exibida pelo app)
+        validos = validos.drop_duplicates('_cnpj').set_index('_cnpj')
+        bloco = pd.DataFrame({f'in_{nome}': True}, index=validos.index)
+        for coluna, prefixo in COLUNAS_PRECO.items():
+            if coluna in validos.columns:
+                bloco[f'{prefixo}_{nome}'] = pd.to_numeric(validos[coluna], errors='coerce')
+        partes.append(bloco)
+
+    movimentos = dados.get('EntradaSaida')
+    if movimentos is not None and 'CNPJ_Normalizado' in movimentos.columns:
+        # O scraper do Gralab grava 'Data Entrada'/'Tipo Movimentação' (não 'Data'/'Tipo');
+        # aceitar os dois nomes é o que faz o sinal do Gralab aparecer no gerador.
+        col_data = _primeira_coluna(movimentos, ('Data', 'Data Entrada'))
+        if col_data:
+            cnpjs = normalizar_cnpjs(movimentos['CNPJ_Normalizado'], vazio_se_zerado=True)
+            mov = pd.DataFrame({
+                '_cnpj': cnpjs,
+                'data': pd.to_datetime(movimentos[col_data], errors='coerce'),
+            })
+            col_tipo = _primeira_coluna(movimentos, ('Tipo Movimentação', 'Tipo'))
+            mov['tipo'] = movimentos[col_tipo].fillna('').astype(str) if col_tipo else ''
+            datas_vistas = [mov['data']]
+            for extra in ('Data Saída', 'Última Verificação'):
+                if extra in movimentos.columns:
+                    datas_vistas.append(pd.to_datetime(movimentos[extra], errors='coerce'))
+            mov['vista'] = pd.concat(datas_vistas, axis=1).max(axis=1)
+            mov = mov[(mov['_cnpj'] != '') & mov['data'].notna()]
+
+            # Movimentação mais recente por CNPJ (mesmo critério do gerador)
+            ultima = mov.sort_values('data', ascending=False, kind='mergesort').drop_duplicates('_cnpj')
+            agrupado = mov.groupby('_cnpj')
+            partes.append(pd.DataFrame({
+                f'mov_data_{nome}': ultima.set_index('_cnpj')['data'],
+                f'mov_tipo_{nome}': ultima.set_index('_cnpj')['tipo'],
+                f'first_seen_{nome}': agrupado['data'].min(),
+                f'last_seen_{nome}': agrupado['vista'].max(),
+            }))
+
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, axis=1)
+
+
+def construir_tabela_match(cnpjs_nossos: pd.Series,
+                           concorrentes: Dict[str, Optional[Dict[str, pd.DataFrame]]]) -> pd.DataFrame:
+    """
+    Monta a tabela de match (índice 'cnpj', ordenado e único).
+
+    Args:
+        cnpjs_nossos: CNPJs da nossa base (qualquer formatação)
+        concorrentes: nome do concorrente -> abas do relatório (None se indisponível)
+
+    Returns:
+        DataFrame com in_ours, in_<concorrente>, first_seen/last_seen (geral e por
+        concorrente), mov_data/mov_tipo por concorrente e preços por concorrente
+    """
+    nossos = pd.Index(normalizar_cnpjs(pd.Series(cnpjs_nossos), vazio_se_zerado=True)).unique()
+    nossos = nossos[nossos != '']
+
+    blocos = [_colunas_concorrente(dados, nome) for nome, dados in concorrentes.items() if dados]
+    blocos = [b for b in blocos if not b.empty]
+    indice = nossos
+    for bloco in blocos:
+        indice = indice.union(bloco.index)
+    indice = pd.Index(indice, name='cnpj').sort_values()
+
+    tabela = pd.DataFrame(index=indice)
+    tabela['in_ours'] = indice.isin(nossos)
+    for bloco in blocos:
+        tabela = tabela.join(bloco)
+    for nome in CONCORRENTES:
+        coluna = f'in_{nome}'
+        tabela[coluna] = tabela[coluna].eq(True) if coluna in tabela else False
+
+    firsts = [c for c in tabela.columns if c.startswith('first_seen_')]
+    lasts = [c for c in tabela.columns if c.startswith('last_seen_')]
+    tabela['first_seen'] = tabela[firsts].min(axis=1) if firsts else pd.NaT
+    tabela['last_seen'] = tabela[lasts].max(axis=1) if lasts else pd.NaT
+    return tabela
+
+
+# ========================================
+# PERSISTÊNCIA
+# ========================================
+
+def assinatura_match(cnpjs_nossos: pd.Series, arquivos: Dict[str, Optional[str]]) -> str:
+    """
+    Assinatura das fontes da tabela: CNPJs da nossa base + conteúdo de cada relatório.
+
+    Args:
+        cnpjs_nossos: CNPJs da nossa base
+        arquivos: nome do concorrente -> caminho local do Excel (None se indisponível)
+    """
+    h = hashlib.sha256(f"v{VERSAO_TABELA}".encode())
+    nossos = np.sort(normalizar_cnpjs(pd.Series(cnpjs_nossos), vazio_se_zerado=True).unique())
+    h.update("\n".join(nossos).encode())
+    for nome in sorted(arquivos):
+        caminho = arquivos[nome]
+        h.update(f"|{nome}:{(hash_arquivo(caminho) if caminho else None) or '-'}".encode())
+    return h.hexdigest()[:16]
+
+
+def carregar_tabela_match(caminho: str, assinatura: str) -> Optional[pd.DataFrame]:
+    """Tabela gravada em disco, se existir e tiver sido montada com a mesma assinatura."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(caminho).metadata or {}
+        if metadata.get(b'assinatura', b'').decode() != assinatura:
+            return None
+        return pd.read_parquet(caminho)
+    except Exception as e:
+        logger.warning(f"Tabela de match inválida ({caminho}): {e}")
+        return None
+
+
+def salvar_tabela_match(tabela: pd.DataFrame, caminho: str, assinatura: str) -> None:
+    """Grava a tabela em Parquet (escrita atômica) com a assinatura no metadado."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow = pa.Table.from_pandas(tabela, preserve_index=True)
+    arrow = arrow.replace_schema_metadata({
+        **(arrow.schema.metadata or {}),
+        b'assinatura': assinatura.encode(),
+    })
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    pq.write_table(arrow, tmp)
+    os.replace(tmp, caminho)
+
+
+def obter_tabela_match(cnpjs_nossos: pd.Series,
+                       arquivos: Dict[str, Optional[str]],
+                       caminho: str,
+                       carregar_dados: Optional[Callable[[str, str], Optional[Dict[str, pd.DataFrame]]]] = None
+                       ) -> pd.DataFrame:
+    """
+    Tabela de match atualizada: reaproveita a gravada em disco quando nenhuma fonte
+    mudou; caso contrário monta de novo e grava.
+
+    Args:
+        cnpjs_nossos: CNPJs da nossa base
+        arquivos: nome do concorrente -> caminho local do Excel
+        caminho: Parquet onde a tabela é persistida
+        carregar_dados: função (nome, caminho do Excel) -> abas do concorrente; por
+            padrão lê o Excel/sidecars locais com carregar_relatorio_concorrente
+    """
+    assinatura = assinatura_match(cnpjs_nossos, arquivos)
+    tabela = carregar_tabela_match(caminho, assinatura)
+    if tabela is not None:
+        return tabela
+
+    concorrentes = {}
+    for nome, arquivo in arquivos.items():
+        try:
+            if carregar_dados is not None:
+                concorrentes[nome] = carregar_dados(nome, arquivo)
+            else:
+                concorrentes[nome] = carregar_relatorio_concorrente(arquivo)
+        except Exception as e:
+            logger.warning(f"Falha ao carregar relatório {nome}: {e}")
+            concorrentes[nome] = None
+    tabela = construir_tabela_match(cnpjs_nossos, concorrentes)
+    try:
+        salvar_tabela_match(tabela, caminho, assinatura)
+    except Exception as e:
+        logger.warning(f"Falha ao gravar tabela de match ({caminho}): {e}")
+    logger.info(f"Tabela de match de CNPJs montada: {len(tabela)} CNPJs ({assinatura})")
+    return tabela
@@ -0,0 +1,154 @@
+"""
+Cache persistente de tokens MSAL compartilhado entre processos
+Usado pelo ChurnSPConnector (gerador e downloads do app) para o token app-only
+(client credentials); o login Microsoft dos usuários usa cache em memória
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import msal
+
+TOKEN_CACHE_PATH = os.getenv(
+    'MSAL_TOKEN_CACHE_PATH',
+    os.path.join(tempfile.gettempdir(), "churn_msal_token_cache.json")
+)
+LOCK_TIMEOUT = 10      # segundos esperando o lock do arquivo
+LOCK_STALE_AFTER = 30  # lock mais antigo que isso é considerado abandonado
+
+
+class ArquivoTokenCache(msal.SerializableTokenCache):
+    """
+    SerializableTokenCache do MSAL gravado em arquivo, com lock entre processos.
+
+    Uso:
+        cache = obter_token_cache()
+        with cache.sincronizado():
+            app.acquire_token_for_client(scopes=[...])
+
+    Dentro do bloco o estado é recarregado do disco (se outro processo gravou) e,
+    ao sair, persistido de forma atômica caso o MSAL tenha alterado o cache. O lock
+    do arquivo só é mantido durante a leitura e a gravação, nunca durante a
+    chamada de rede do MSAL.
+    """
+
+    def __init__(self, path: str = TOKEN_CACHE_PATH):
+        super().__init__()
+        self.path = path
+        self._lock_path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._mtime_carregado = None
+
+    @contextmanager
+    def _lock_arquivo(self):
+        """Lock exclusivo via arquivo .lock (O_EXCL funciona em Windows e Linux)"""
+        inicio = time.time()
+        while True:
+            try:
+                fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self._lock_path) > LOCK_STALE_AFTER:
+                        os.remove(self._lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() - inicio > LOCK_TIMEOUT:
+                    raise TimeoutError(f"Timeout aguardando lock do cache de tokens: {self._lock_path}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            try:
+                os.remove(self._lock_path)
+            except OSError:
+                pass
+
+    def recarregar(self):
+        """Recarrega o cache do disco se o arquivo mudou desde a última leitura"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime_carregado:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.deserialize(f.read())
+            self._mtime_carregado = mtime
+        except (OSError, ValueError):
+            pass
+
+    def _mesclar_com_disco(self):
+        """
+        Incorpora ao cache as entradas gravadas por outro processo desde a última
+        leitura (as deste processo prevalecem em caso de mesma chave)
+        """
+        try:
+            if os.path.getmtime(self.path) == self._mtime_carregado:
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                disco = json.loads(f.read() or "{}")
+        except (OSError, ValueError):
+            return
+        atual = json.loads(self.serialize())
+        for secao, entradas in disco.items():
+            if isinstance(entradas, dict):
+                entradas.update(atual.get(secao) or {})
+        for secao, entradas in atual.items():
+            disco.setdefault(secao, entradas)
+        self.deserialize(json.dumps(disco))
+        self.has_state_changed = True
+
+    def persistir(self):
+        """Grava o cache em disco (atômico, permissão restrita) se houve alteração"""
+        if not self.has_state_changed:
+            return
+        self._mesclar_com_disco()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".tmp_msal_")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.serialize())
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.has_state_changed = False
+        self._mtime_carregado = os.path.getmtime(self.path)
+
+    @contextmanager
+    def sincronizado(self):
+        """Bloco com o cache sincronizado com o disco (recarrega antes, persiste depois)"""
+        # O lock de thread cobre o bloco inteiro (evita buscas de token duplicadas no
+        # processo); o de arquivo só a leitura e a gravação, para que uma chamada lenta
+        # ao Azure AD não estoure o LOCK_TIMEOUT de outros processos.
+        with self._thread_lock:
+            with self._lock_arquivo():
+                self.recarregar()
+            try:
+                yield self
+            finally:
+                with self._lock_arquivo():
+                    self.persistir()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def obter_token_cache(path: str = None) -> ArquivoTokenCache:
+    """Retorna o cache de tokens do processo (um por arquivo)"""
+    path = path or TOKEN_CACHE_PATH
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ArquivoTokenCache(path)
+        return _caches[path]
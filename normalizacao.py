@@ -0,0 +1,209 @@
+# ========================================
+# NORMALIZAÇÃO DE CNPJ, NOMES E CIDADES
+# Sistema de Alertas Churn v2
+# ========================================
+
+"""
+Normalização compartilhada de CNPJs, nomes, cidades e termos de busca (app, gerador, VIP e matriz CS).
+
+As versões para Series aplicam kernels vetorizados (str.replace com regex) apenas
+sobre os valores distintos ainda não vistos e remontam a coluna pelos códigos do
+factorize. Cada valor bruto já normalizado fica numa tabela internada bruto ->
+normalizado por processo: colunas repetidas (CNPJ_PCL a cada carga, matriz VIP,
+laboratories) não passam de novo pelo kernel e compartilham as mesmas strings.
+"""
+
+import sys
+import threading
+from typing import Any, Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Entradas por tabela internada (ao estourar, a tabela é descartada e recomeça)
+LIMITE_TABELA = 500_000
+
+_TIPOS_NUMERICOS = (int, float, np.integer, np.floating)
+
+
+# ========================================
+# KERNELS VETORIZADOS
+# ========================================
+
+def _texto_bruto(valor: Any) -> str:
+    """Texto do valor; numéricos (CNPJ lido do Excel/CSV como número) sem sufixo '.0'."""
+    if isinstance(valor, _TIPOS_NUMERICOS):
+        try:
+            return str(int(valor))
+        except (TypeError, ValueError, OverflowError):
+            return str(valor)
+    return str(valor)
+
+
+def _kernel_cnpj(valores: pd.Series) -> pd.Series:
+    """Só dígitos, 14 posições (zeros à esquerda; excedente mantém os últimos 14). '' continua ''."""
+    digitos = valores.str.replace(r'\D', '', regex=True)
+    return digitos.str.zfill(14).str[-14:].where(valores != '', '')
+
+
+def _kernel_digitos(valores: pd.Series) -> pd.Series:
+    """Só os dígitos, sem completar posições."""
+    return valores.str.replace(r'\D', '', regex=True)
+
+
+def _sem_acentos_maiusculo(valores: pd.Series) -> pd.Series:
+    return valores.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii').str.upper()
+
+
+def _kernel_nome(valores: pd.Series) -> pd.Series:
+    """Sem acentos, maiúsculo, espaços colapsados."""
+    return _sem_acentos_maiusculo(valores).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+
+def _kernel_cidade(valores: pd.Series) -> pd.Series:
+    """Chave de cidade: sem acentos, maiúscula, pontuação vira espaço, espaços colapsados."""
+    return (
+        _sem_acentos_maiusculo(valores)
+        .str.replace(r'[^A-Z0-9]+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+# ========================================
+# TABELA INTERNADA BRUTO -> NORMALIZADO
+# ========================================
+
+class TabelaNormalizacao:
+    """
+    Cache bruto -> normalizado de um kernel, com as saídas internadas (sys.intern).
+
+    Nulos (None/NaN/pd.NA) normalizam para ''. O kernel recebe uma Series de str
+    com os valores distintos que ainda não estão na tabela.
+    """
+
+    def __init__(self, kernel: Callable[[pd.Series], pd.Series], limite: int = LIMITE_TABELA):
+        self._kernel = kernel
+        self._limite = limite
+        self._tabela: Dict[Any, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tabela)
+
+    def _calcular(self, brutos: list) -> Dict[Any, str]:
+        textos = pd.Series([_texto_bruto(v) for v in brutos], dtype=object)
+        normalizados = self._kernel(textos).tolist()
+        novos = {bruto: sys.intern(norm) for bruto, norm in zip(brutos, normalizados)}
+        with self._lock:
+            if len(self._tabela) + len(novos) > self._limite:
+                # Troca (e não clear) para não invalidar leituras em andamento em outras threads
+                self._tabela = {}
+            self._tabela.update(novos)
+        return novos
+
+    def valor(self, bruto: Any) -> str:
+        """Normaliza um valor escalar."""
+        try:
+            if pd.isna(bruto):
+                return ''
+        except (TypeError, ValueError):
+            pass
+        try:
+            return self._tabela[bruto]
+        except KeyError:
+            return self._calcular([bruto])[bruto]
+        except TypeError:
+            # Não hashável: normaliza sem guardar
+            return self._kernel(pd.Series([_texto_bruto(bruto)], dtype=object)).iloc[0]
+
+    def serie(self, serie: pd.Series) -> pd.Series:
+        """Normaliza uma coluna inteira (kernel só sobre os valores distintos não vistos)."""
+        codigos, unicos = pd.factorize(serie)
+        unicos = list(unicos)
+        tabela = self._tabela
+        faltantes = [u for u in unicos if u not in tabela]
+        novos = self._calcular(faltantes) if faltantes else {}
+        valores = np.empty(len(unicos) + 1, dtype=object)
+        for i, u in enumerate(unicos):
+            valores[i] = novos[u] if u in novos else tabela[u]
+        valores[-1] = ''  # código -1 do factorize (nulos)
+        return pd.Series(valores[codigos], index=serie.index, name=serie.name, dtype=object)
+
+
+_CNPJS = TabelaNormalizacao(_kernel_cnpj)
+_DIGITOS = TabelaNormalizacao(_kernel_digitos)
+_NOMES = TabelaNormalizacao(_kernel_nome)
+_CIDADES = TabelaNormalizacao(_kernel_cidade)
+_TERMOS = TabelaNormalizacao(_kernel_cidade)
+
+
+# ========================================
+# API
+# ========================================
+
+def normalizar_cnpj(cnpj: Any) -> str:
+    """
+    Remove formatação do CNPJ (pontos, traços, barras) e garante 14 dígitos.
+
+    Nulo ou '' vira ''; numéricos são lidos sem o sufixo '.0'.
+    """
+    return _CNPJS.valor(cnpj)
+
+
+def normalizar_cnpjs(serie: pd.Series, vazio_se_zerado: bool = False) -> pd.Series:
+    """
+    Versão vetorizada de normalizar_cnpj para uma coluna.
+
+    Args:
+        serie: Coluna de CNPJs (str, numérica ou mista)
+        vazio_se_zerado: Se True, CNPJs sem dígitos significativos (só zeros) viram ''
+    """
+    cnpjs = _CNPJS.serie(serie)
+    if vazio_se_zerado:
+        cnpjs = cnpjs.mask(cnpjs == '00000000000000', '')
+    return cnpjs
+
+
+def somente_digitos(valor: Any) -> str:
+    """Só os dígitos do valor ('' para nulo)."""
+    return _DIGITOS.valor(valor)
+
+
+def somente_digitos_serie(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de somente_digitos."""
+    return _DIGITOS.serie(serie)
+
+
+def normalizar_nome(nome: Any) -> str:
+    """Nome sem acentos, maiúsculo e com espaços colapsados ('' para nulo)."""
+    return _NOMES.valor(nome)
+
+
+def normalizar_nomes(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de normalizar_nome."""
+    return _NOMES.serie(serie)
+
+
+def normalizar_cidade(cidade: Any) -> str:
+    """Chave de cidade: sem acentos, maiúscula, sem pontuação ('' para nulo)."""
+    return _CIDADES.valor(cidade)
+
+
+def normalizar_cidades(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de normalizar_cidade."""
+    return _CIDADES.serie(serie)
+
+
+def normalizar_termo(texto: Any) -> str:
+    """Texto para busca textual: mesmo tratamento da chave de cidade ('' para nulo)."""
+    return _TERMOS.valor(texto)
+
+
+def normalizar_termos(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de normalizar_termo."""
+    return _TERMOS.serie(serie)
@@ -21,6 +21,8 @@ from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import re
 
+from normalizacao import normalizar_cnpj, normalizar_cnpjs
+
 # Configurações de log
 logging.basicConfig(
     level=logging.INFO,
@@ -76,27 +78,7 @@ class MatrizCSNormalizer:
         Returns:
             CNPJ apenas com números (14 dígitos, com zeros à esquerda se necessário)
         """
-        if pd.isna(cnpj) or cnpj == '':
-            return ''
-        
-        # Converter numéricos para string sem decimais (evita sufixo '.0')
-        if isinstance(cnpj, (int, float)):
-            try:
-                cnpj = str(int(cnpj))
-            except Exception:
-                cnpj = str(cnpj)
-
-        # Remove tudo exceto dígitos
-        cnpj_limpo = ''.join(filter(str.isdigit, str(cnpj)))
-        
-        # Garantir que tenha exatamente 14 dígitos, preenchendo com zeros à esquerda se necessário
-        if len(cnpj_limpo) < 14:
-            cnpj_limpo = cnpj_limpo.zfill(14)
-        elif len(cnpj_limpo) > 14:
-            # Se tiver mais de 14 dígitos, pegar apenas os últimos 14
-            cnpj_limpo = cnpj_limpo[-14:]
-        
-        return cnpj_limpo
+        return normalizar_cnpj(cnpj)
     
     def normalizar_texto(self, texto: str) -> str:
         """
@@ -242,7 +224,7 @@ class MatrizCSNormalizer:
         # Normalizar CNPJ
         if 'CNPJ' in df_normalizado.columns:
             logger.info("Normalizando CNPJs...")
-            df_normalizado['CNPJ'] = df_normalizado['CNPJ'].apply(self.normalizar_cnpj)
+            df_normalizado['CNPJ'] = normalizar_cnpjs(df_normalizado['CNPJ'])
             self.normalizacoes_realizadas.append("CNPJ: Removida pontuação")
         
         # Normalizar Ranking Rede
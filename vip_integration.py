@@ -16,6 +16,8 @@ from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime
 import re
 
+from normalizacao import normalizar_cnpj, normalizar_cnpjs
+
 # Configurações de log
 logger = logging.getLogger(__name__)
 
@@ -71,22 +73,7 @@ class VIPIntegration:
         """
         Normaliza CNPJ removendo pontuação e garantindo 14 dígitos.
         """
-        if pd.isna(cnpj) or cnpj == '':
-            return ''
-        # Converter numéricos para string sem decimais (evita sufixo '.0')
-        if isinstance(cnpj, (int, float)):
-            try:
-                cnpj = str(int(cnpj))
-            except Exception:
-                cnpj = str(cnpj)
-        # Remove tudo exceto dígitos
-        cnpj_limpo = ''.join(filter(str.isdigit, str(cnpj)))
-        # Garantir 14 dígitos
-        if len(cnpj_limpo) < 14:
-            cnpj_limpo = cnpj_limpo.zfill(14)
-        elif len(cnpj_limpo) > 14:
-            cnpj_limpo = cnpj_limpo[-14:]
-        return cnpj_limpo
+        return normalizar_cnpj(cnpj)
     
     def validar_cnpj(self, cnpj: str) -> Tuple[bool, str]:
         """
@@ -131,7 +118,7 @@ class VIPIntegration:
         
         # Buscar no DataFrame de laboratórios
         match = self.df_laboratorios[
-            self.df_laboratorios['CNPJ_PCL'].apply(self.normalizar_cnpj) == cnpj_normalizado
+            normalizar_cnpjs(self.df_laboratorios['CNPJ_PCL']) == cnpj_normalizado
         ]
         
         if not match.empty:
@@ -182,7 +169,7 @@ class VIPIntegration:
         
         # Buscar no DataFrame VIP
         match = self.df_vip[
-            self.df_vip['CNPJ'].apply(self.normalizar_cnpj) == cnpj_normalizado
+            normalizar_cnpjs(self.df_vip['CNPJ']) == cnpj_normalizado
         ]
         
         return not match.empty
@@ -203,7 +190,7 @@ class VIPIntegration:
         # Obter CNPJs que já são VIP
         cnpjs_vip = set()
         if self.df_vip is not None and not self.df_vip.empty:
-            cnpjs_vip = set(self.df_vip['CNPJ'].apply(self.normalizar_cnpj))
+            cnpjs_vip = set(normalizar_cnpjs(self.df_vip['CNPJ']))
         
         # Filtrar laboratórios que não são VIP
         sugestoes = []
@@ -248,8 +235,8 @@ class VIPIntegration:
         
         # Calcular laboratórios não VIP
         if self.df_laboratorios is not None and self.df_vip is not None:
-            cnpjs_vip = set(self.df_vip['CNPJ'].apply(self.normalizar_cnpj))
-            cnpjs_laboratorios = set(self.df_laboratorios['CNPJ_PCL'].apply(self.normalizar_cnpj))
+            cnpjs_vip = set(normalizar_cnpjs(self.df_vip['CNPJ']))
+            cnpjs_laboratorios = set(normalizar_cnpjs(self.df_laboratorios['CNPJ_PCL']))
             
             stats['laboratorios_nao_vip'] = len(cnpjs_laboratorios - cnpjs_vip)
             